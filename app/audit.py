@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import date, datetime, timezone
+from typing import Dict, Any, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS recommendations ("
+    " id INTEGER PRIMARY KEY, ts REAL NOT NULL, endpoint TEXT NOT NULL, kb_version TEXT NOT NULL,"
+    " flock_type TEXT, feed TEXT, recipe TEXT, facts TEXT NOT NULL, fired TEXT NOT NULL)",
+    # One row per fired rule, so fire rates are an indexed GROUP BY instead of a JSON scan
+    "CREATE TABLE IF NOT EXISTS rule_fires ("
+    " recommendation_id INTEGER NOT NULL, ts REAL NOT NULL, kb_version TEXT NOT NULL, rule TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS recommendations_ts ON recommendations (ts)",
+    "CREATE INDEX IF NOT EXISTS recommendations_type_ts ON recommendations (flock_type, ts)",
+    "CREATE INDEX IF NOT EXISTS recommendations_version_ts ON recommendations (kb_version, ts)",
+    "CREATE INDEX IF NOT EXISTS rule_fires_ts ON rule_fires (ts, rule)",
+    "CREATE INDEX IF NOT EXISTS rule_fires_rule_ts ON rule_fires (rule, ts)",
+)
+WEEK = "strftime('%Y-W%W', ts, 'unixepoch')"
+
+
+def _epoch(day: Optional[date]) -> Optional[float]:
+    if day is None:
+        return None
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+
+
+class AuditLog:
+    """Every recommendation issued, with its facts, fired rules, recipe and knowledge-base version
+
+    record() only appends a tuple to an in-memory list; a background thread
+    writes the list to SQLite (WAL) in one transaction per batch. When the
+    writer falls too far behind, new records are dropped and counted rather
+    than slowing requests down. Reads use their own connections, so analytics
+    never wait on the request path.
+    """
+
+    def __init__(self, path: Optional[str], batch_size: int = 500, interval: float = 1.0,
+                 max_pending: int = 100_000):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.written = self.dropped = self.failed_batches = 0
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_env(cls) -> "AuditLog":
+        """FEED_AUDIT_PATH (SQLite file; unset disables), FEED_AUDIT_BATCH, FEED_AUDIT_INTERVAL, FEED_AUDIT_QUEUE"""
+        return cls(os.environ.get("FEED_AUDIT_PATH") or None, int(os.environ.get("FEED_AUDIT_BATCH", "500")),
+                   float(os.environ.get("FEED_AUDIT_INTERVAL", "1.0")),
+                   int(os.environ.get("FEED_AUDIT_QUEUE", "100000")))
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def record(self, endpoint: str, kb, facts: Dict[str, Any], fired: Sequence[str],
+               recommendations: List[Dict[str, Any]]) -> None:
+        """Queue one recommendation; fired are rule names"""
+        if self.path is not None:
+            self._append([self._row(endpoint, kb, facts, fired, recommendations)])
+
+    def record_many(self, endpoint: str, kb, facts_list: List[Dict[str, Any]], fired: List[Sequence[str]],
+                    results: List[Dict[str, Any]]) -> None:
+        """Queue a batch of /recommend-shaped results with the fired rule names of each row"""
+        if self.path is not None and facts_list:
+            self._append([self._row(endpoint, kb, facts, names, result["recommendations"])
+                          for facts, names, result in zip(facts_list, fired, results)])
+
+    @staticmethod
+    def _row(endpoint: str, kb, facts, fired, recommendations) -> tuple:
+        feed = next((rec["Recommend"] for rec in recommendations if "Recommend" in rec), None)
+        return (time.time(), endpoint, kb.version, facts, fired, feed, kb.recipe_name(feed) if feed else None)
+
+    def _append(self, rows: List[tuple]) -> None:
+        with self._lock:
+            room = self.max_pending - len(self._pending)
+            if room < len(rows):
+                self.dropped += len(rows) - max(room, 0)
+                rows = rows[:max(room, 0)]
+            self._pending.extend(rows)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            conn.execute(statement)
+        return conn
+
+    def flush(self) -> int:
+        """Write everything queued so far in one transaction; returns the number of rows written"""
+        with self._write_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            try:
+                self._insert(rows)
+            except sqlite3.Error:
+                self.failed_batches += 1
+                with self._lock:
+                    # Retried with the next batch, unless that would overflow the queue
+                    keep = max(self.max_pending - len(self._pending), 0)
+                    self.dropped += len(rows) - min(keep, len(rows))
+                    self._pending[:0] = rows[:keep]
+                raise
+            self.written += len(rows)
+            return len(rows)
+
+    def _insert(self, rows: List[tuple]) -> None:
+        if self._conn is None:
+            self._conn = self._connect()
+        conn = self._conn
+        try:
+            # BEGIN IMMEDIATE takes the write lock first, so ids picked from MAX(id)
+            # stay unique when several workers share the file
+            conn.execute("BEGIN IMMEDIATE")
+            first = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM recommendations").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO recommendations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(first + n, ts, endpoint, version, facts.get("Type"), feed, recipe, json.dumps(facts),
+                  json.dumps(list(fired))) for n, (ts, endpoint, version, facts, fired, feed, recipe) in enumerate(rows)])
+            conn.executemany(
+                "INSERT INTO rule_fires VALUES (?, ?, ?, ?)",
+                [(first + n, row[0], row[2], rule) for n, row in enumerate(rows) for rule in row[4]])
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def start(self) -> None:
+        """Start the background writer (once per process, after any fork)"""
+        if self.path is None or self._writer is not None:
+            return
+        self._stop.clear()
+
+        def _write():
+            while not self._stop.is_set():
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except sqlite3.Error:
+                    logger.exception("Audit log write failed; batch kept for the next attempt")
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception("Audit log final write failed")
+
+        self._writer = threading.Thread(target=_write, name="audit-writer", daemon=True)
+        self._writer.start()
+
+    def stop(self) -> None:
+        """Flush what is queued and stop the writer"""
+        if self._writer is not None:
+            self._stop.set()
+            self._wake.set()
+            self._writer.join()
+            self._writer = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {"enabled": self.enabled, "path": self.path, "pending": pending, "written": self.written,
+                "dropped": self.dropped, "failed_batches": self.failed_batches}
+
+    def _query(self, sql: str, params: Sequence[Any]) -> List[sqlite3.Row]:
+        if not os.path.exists(self.path):
+            return []
+        with closing(self._connect(readonly=True)) as conn:
+            conn.row_factory = sqlite3.Row
+            return conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _where(since: Optional[date], until: Optional[date], kb_version: Optional[str]):
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(_epoch(since))
+        if until is not None:
+            clauses.append("ts < ?")  # until is exclusive: whole days up to it
+            params.append(_epoch(until))
+        if kb_version is not None:
+            clauses.append("kb_version = ?")
+            params.append(kb_version)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def rule_fire_rates(self, since: Optional[date] = None, until: Optional[date] = None,
+                        kb_version: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Per week and rule: fires, recommendations issued that week and the share that fired the rule"""
+        where, params = self._where(since, until, kb_version)
+        rows = self._query(
+            f"SELECT f.week, f.rule, f.fires, t.total FROM"
+            f" (SELECT {WEEK} AS week, rule, COUNT(*) AS fires FROM rule_fires{where} GROUP BY week, rule) f"
+            f" JOIN (SELECT {WEEK} AS week, COUNT(*) AS total FROM recommendations{where} GROUP BY week) t"
+            f" USING (week) ORDER BY f.week, f.fires DESC, f.rule", params + params)
+        return [{"week": r["week"], "rule": r["rule"], "fires": r["fires"], "recommendations": r["total"],
+                 "rate": round(r["fires"] / r["total"], 4)} for r in rows]
+
+    def recommendations_by_type(self, since: Optional[date] = None, until: Optional[date] = None,
+                                kb_version: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Recommendations issued per flock Type, and how they split over the recommended feeds"""
+        where, params = self._where(since, until, kb_version)
+        rows = self._query(f"SELECT flock_type, feed, COUNT(*) AS n FROM recommendations{where}"
+                           f" GROUP BY flock_type, feed ORDER BY flock_type, n DESC", params)
+        out: Dict[Any, Dict[str, Any]] = {}
+        for r in rows:
+            entry = out.setdefault(r["flock_type"], {"type": r["flock_type"], "recommendations": 0, "feeds": {}})
+            entry["recommendations"] += r["n"]
+            entry["feeds"][r["feed"] if r["feed"] is not None else "none"] = r["n"]
+        return list(out.values())
+
+
+AUDIT = AuditLog.from_env()
@@ -0,0 +1,203 @@
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from app.facts import CODES, FlockFacts, fact_array
+from app.rule_index import RuleIndex, RANGE, LT, parse_percent
+
+
+class FactColumns:
+    """Columnar view of a batch of fact dicts, one array per fact key used by the rules
+
+    With typed facts (array, from app.facts.fact_array) the FeedQuery fields are
+    taken straight from the structured array: enum codes, ages and percentages
+    need no per-row conversion. Other keys still come from the dicts.
+    """
+
+    def __init__(self, facts_list: List[Dict[str, Any]], index: RuleIndex, array: Optional[np.ndarray] = None):
+        self.size = len(facts_list)
+        self.present: Dict[str, np.ndarray] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        self.code_of: Dict[str, Dict[Any, int]] = {}
+        self.numbers: Dict[str, np.ndarray] = {}
+        self.percents: Dict[str, np.ndarray] = {}
+        # Rows the columns cannot represent (unhashable or unorderable facts)
+        self.irregular = np.zeros(self.size, dtype=bool)
+        typed = set(array.dtype.names) if array is not None else set()
+
+        keys = index.exact_keys | index.range_keys | index.threshold_keys
+        for key in keys:
+            if key in typed:
+                self.present[key] = np.ones(self.size, dtype=bool)  # every typed row has every field
+            else:
+                self.present[key] = np.fromiter((key in f for f in facts_list), dtype=bool, count=self.size)
+
+        for key in index.exact_keys:
+            if key in typed and key in CODES:
+                self.codes[key] = array[key].astype(np.int32)
+                self.code_of[key] = CODES[key]
+                continue
+            # Type, FeedCost, Health ... become small integer codes
+            code_of: Dict[Any, int] = {}
+            codes = np.full(self.size, -1, dtype=np.int32)
+            for row, f in enumerate(facts_list):
+                if key in f:
+                    try:
+                        codes[row] = code_of.setdefault(f[key], len(code_of))
+                    except TypeError:
+                        self.irregular[row] = True
+            self.codes[key] = codes
+            self.code_of[key] = code_of
+
+        for key in index.range_keys:
+            if key in typed and not np.isnan(array[key]).any():
+                self.numbers[key] = array[key].astype(float)
+                continue
+            # e.g. Age_Weeks
+            values = np.full(self.size, np.nan)
+            for row, f in enumerate(facts_list):
+                if key in f:
+                    value = f[key]
+                    if type(value) in (int, float, bool) and value == value:
+                        values[row] = value
+                    else:
+                        self.irregular[row] = True
+            self.numbers[key] = values
+
+        for key in index.threshold_keys:
+            if key in typed:
+                self.percents[key] = array[key].astype(float)  # already a number, NaN when missing
+                continue
+            # e.g. EggProduction "45%" -> 45.0, NaN when it does not parse
+            parsed = (parse_percent(f[key]) if key in f else None for f in facts_list)
+            self.percents[key] = np.fromiter((np.nan if p is None else p for p in parsed),
+                                             dtype=float, count=self.size)
+
+
+def _condition_mask(columns: FactColumns, check: tuple) -> np.ndarray:
+    kind, key, a, b = check
+    present = columns.present[key]
+    if kind == RANGE:
+        values = columns.numbers.get(key)
+        if values is None:
+            return np.zeros(columns.size, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            return present & (a <= values) & (values <= b)
+    if kind == LT:
+        if a is None:
+            return np.zeros(columns.size, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            return present & (columns.percents[key] < a)
+    try:
+        code = columns.code_of[key].get(a)
+    except TypeError:
+        code = None  # an unhashable rule value never equals a hashable fact
+    if code is None:
+        return np.zeros(columns.size, dtype=bool)
+    return present & (columns.codes[key] == code)
+
+
+def rule_masks(columns: FactColumns, index: RuleIndex) -> List[np.ndarray]:
+    """One boolean mask over the batch per rule, in RULES order"""
+    cache: Dict[tuple, np.ndarray] = {}
+    everyone = np.ones(columns.size, dtype=bool)
+    masks = []
+    for checks in index.compiled:
+        mask = everyone
+        for check in checks:
+            # Rules sharing a condition (e.g. Type == "Layer") share its mask
+            try:
+                cond = cache.get(check)
+            except TypeError:
+                cond = None
+            if cond is None:
+                try:
+                    cond = _condition_mask(columns, check)
+                except TypeError:
+                    # Non-numeric range bounds; leave every row to the scalar path
+                    cond = np.zeros(columns.size, dtype=bool)
+                    columns.irregular[:] = True
+                try:
+                    cache[check] = cond
+                except TypeError:
+                    pass
+            mask = mask & cond
+            if not mask.any():
+                break
+        masks.append(mask)
+    return masks
+
+
+def evaluate_batch(facts_list: List[Dict[str, Any]], index: RuleIndex, get_recipe,
+                   observe=None, array: Optional[np.ndarray] = None,
+                   fired: Optional[List[List[int]]] = None) -> List[Dict[str, Any]]:
+    """Vectorized equivalent of calling /recommend once per fact dict
+
+    array is the same batch as typed facts (app.facts.fact_array), when the
+    caller has it. observe(masks), if given, sees the per-rule masks (for rule
+    hit counters). fired, if given, gets the fired rule ids of every row (for
+    the audit log).
+    """
+    n = len(facts_list)
+    if n == 0:
+        return []
+    columns = FactColumns(facts_list, index, array)
+    masks = rule_masks(columns, index)
+    if observe is not None:
+        observe(masks)
+
+    # (row, rule) pairs of every firing, ordered by row and then by RULES position
+    rows = [np.flatnonzero(mask) for mask in masks]
+    rule_ids = [np.full(len(r), i, dtype=np.int64) for i, r in enumerate(rows)]
+    rows_all = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    rules_all = np.concatenate(rule_ids) if rule_ids else np.empty(0, dtype=np.int64)
+    order = np.argsort(rows_all, kind="stable")
+    rows_all, rules_all = rows_all[order], rules_all[order]
+    starts = np.searchsorted(rows_all, np.arange(n + 1))
+
+    # First rule carrying a "Recommend" decides the recipe, as in /recommend
+    thens = [rule.get("then", {}) for rule in index.rules]
+    recommends = np.fromiter(("Recommend" in t for t in thens), dtype=bool, count=len(thens))
+    first_rec = np.full(n, -1, dtype=np.int64)
+    if len(rules_all):
+        hit = recommends[rules_all]
+        hit_rows, first = np.unique(rows_all[hit], return_index=True)
+        first_rec[hit_rows] = rules_all[hit][first]
+
+    # One recipe lookup per distinct feed type in the batch
+    recipes: Dict[Any, Dict[str, Any]] = {}
+    for rule_id in np.unique(first_rec[first_rec >= 0]).tolist():
+        feed_type = thens[rule_id]["Recommend"]
+        if feed_type not in recipes:
+            recipes[feed_type] = get_recipe(feed_type) if feed_type else {}
+
+    irregular = columns.irregular
+    rules_list = rules_all.tolist()
+    starts_list = starts.tolist()
+    first_list = first_rec.tolist()
+    results = []
+    for row, facts in enumerate(facts_list):
+        if irregular[row]:
+            # Facts the columns cannot hold go through the scalar engine
+            ids = index.match_ids(facts)
+            recommendations = [thens[i] for i in ids]
+            feed_type = next((rec["Recommend"] for rec in recommendations if "Recommend" in rec), None)
+            recipe = get_recipe(feed_type) if feed_type else {}
+        else:
+            ids = rules_list[starts_list[row]:starts_list[row + 1]]
+            recommendations = [thens[i] for i in ids]
+            rule_id = first_list[row]
+            recipe = recipes[thens[rule_id]["Recommend"]] if rule_id >= 0 else {}
+        if fired is not None:
+            fired.append(ids)
+        results.append({"facts": facts, "recommendations": recommendations, "recipe": recipe})
+    return results
+
+
+def evaluate_records(records: List[FlockFacts], index: RuleIndex, get_recipe, observe=None,
+                     fired: Optional[List[List[int]]] = None) -> List[Dict[str, Any]]:
+    """evaluate_batch for typed facts (FeedQuery.record()), columns taken from one structured array"""
+    if not records:
+        return []
+    return evaluate_batch([record.as_facts() for record in records], index, get_recipe, observe,
+                          fact_array(records), fired)
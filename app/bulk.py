@@ -0,0 +1,266 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from typing import Dict, Any, AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.audit import AUDIT
+from app.data_models import FeedQuery
+from app.facts import FlockFacts
+
+CHUNK_SIZE = 1000            # rows per evaluate_batch call
+MAX_LINE_BYTES = 1 << 20     # one CSV record or NDJSON object
+FORMATS = ("csv", "ndjson")
+
+
+class BulkInputError(ValueError):
+    """The upload cannot be read any further (bad encoding, oversized record)"""
+
+
+def format_for(content_type: Optional[str]) -> Optional[str]:
+    """csv / ndjson from a Content-Type header, None to sniff the first line"""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json"):
+        return "ndjson"
+    return None
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in e.errors())
+
+
+class RecordParser:
+    """Turns input lines into numbered typed facts one line at a time, keeping at most one record in memory
+
+    CSV needs a header row; a quoted field may span lines, so lines are joined
+    until the record has an even number of quote characters.
+    """
+
+    def __init__(self, fmt: Optional[str] = None):
+        if fmt is not None and fmt not in FORMATS:
+            raise BulkInputError(f"format must be one of {FORMATS}")
+        self.fmt = fmt
+        self.header: Optional[List[str]] = None
+        self.rows = 0
+        self._pending: List[str] = []
+        self._quotes = 0
+
+    def feed(self, line: str) -> Optional[Tuple[int, Any]]:
+        """(row number, FlockFacts or error message) once a record is complete, else None"""
+        if not self.rows and self.header is None and not self._pending:
+            line = line.lstrip("\ufeff")  # byte-order mark from spreadsheet exports
+        line = line.rstrip("\r\n")
+        if self.fmt is None:
+            if not line.strip():
+                return None
+            self.fmt = "ndjson" if line.lstrip().startswith("{") else "csv"
+        if self.fmt == "ndjson":
+            return self._ndjson(line)
+        return self._csv(line)
+
+    def finish(self) -> Optional[Tuple[int, Any]]:
+        """Flush a CSV record left open by an unbalanced quote at end of input"""
+        if not self._pending:
+            return None
+        self._pending = []
+        self.rows += 1
+        return self.rows, "unterminated quoted field"
+
+    def _ndjson(self, line: str) -> Optional[Tuple[int, Any]]:
+        if not line.strip():
+            return None
+        self.rows += 1
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            return self.rows, f"invalid JSON: {e.msg}"
+        if not isinstance(row, dict):
+            return self.rows, "each line must be a JSON object"
+        return self.rows, self._facts(row)
+
+    def _csv(self, line: str) -> Optional[Tuple[int, Any]]:
+        self._pending.append(line)
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            return None  # newline inside a quoted field
+        text = "\n".join(self._pending)
+        self._pending, self._quotes = [], 0
+        if not text.strip():
+            return None
+        fields = next(csv.reader([text]))
+        if self.header is None:
+            self.header = [name.strip() for name in fields]
+            return None
+        self.rows += 1
+        if len(fields) != len(self.header):
+            return self.rows, f"expected {len(self.header)} fields, got {len(fields)}"
+        # Empty cells are missing values, like an omitted key in JSON
+        row = {name: value.strip() for name, value in zip(self.header, fields) if value.strip() != ""}
+        return self.rows, self._facts(row)
+
+    @staticmethod
+    def _facts(row: Dict[str, Any]) -> Any:
+        try:
+            return FeedQuery(**row).record()
+        except ValidationError as e:
+            return _validation_message(e)
+        except TypeError as e:  # non-string JSON keys
+            return str(e)
+
+
+def score_chunk(chunk: List[Tuple[int, Any]], kb) -> List[Dict[str, Any]]:
+    """Evaluate the valid rows of a chunk in one evaluate_batch call; errors keep their place"""
+    from app.batch import evaluate_records
+    from app.metrics import batch_observer
+    from app.recipe_matrix import add_analysis
+
+    valid = [facts for _, facts in chunk if isinstance(facts, FlockFacts)]
+    fired = [] if AUDIT.enabled else None
+    scored = evaluate_records(valid, kb.rule_index, kb.get_recipe, observe=batch_observer(kb, "bulk"), fired=fired)
+    if fired is not None:
+        AUDIT.record_many("bulk", kb, [r["facts"] for r in scored],
+                          [[kb.rules[i]["name"] for i in ids] for ids in fired], scored)
+    results = iter(add_analysis(scored, kb))
+    out = []
+    for row, facts in chunk:
+        if isinstance(facts, FlockFacts):
+            out.append({"row": row, **next(results)})
+        else:
+            out.append({"row": row, "error": facts})
+    return out
+
+
+def encode(result: Dict[str, Any]) -> bytes:
+    return (json.dumps(result) + "\n").encode()
+
+
+def iter_records(lines: Iterable[str], fmt: Optional[str] = None) -> Iterator[Tuple[int, Any]]:
+    parser = RecordParser(fmt)
+    for line in lines:
+        record = parser.feed(line)
+        if record is not None:
+            yield record
+    record = parser.finish()
+    if record is not None:
+        yield record
+
+
+def score_lines(lines: Iterable[str], kb, fmt: Optional[str] = None,
+                chunk_size: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Results for every record of a line iterator, produced chunk by chunk"""
+    chunk: List[Tuple[int, Any]] = []
+    for record in iter_records(lines, fmt):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield from score_chunk(chunk, kb)
+            chunk = []
+    if chunk:
+        yield from score_chunk(chunk, kb)
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split an async byte stream into text lines without buffering more than one line"""
+    buffer = b""
+    async for data in chunks:
+        buffer += data
+        if b"\n" not in data:
+            if len(buffer) > MAX_LINE_BYTES:
+                raise BulkInputError(f"record longer than {MAX_LINE_BYTES} bytes")
+            continue
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield _decode(line)
+    if buffer:
+        yield _decode(buffer)
+
+
+def _decode(line: bytes) -> str:
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise BulkInputError(f"input is not UTF-8: {e.reason}") from e
+
+
+async def stream_scores(chunks: AsyncIterator[bytes], kb, fmt: Optional[str] = None,
+                        chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """NDJSON result lines for an uploaded body, one write per chunk; rule evaluation runs off the event loop"""
+    from starlette.concurrency import run_in_threadpool
+
+    async def _scored(chunk):
+        return b"".join(encode(result) for result in await run_in_threadpool(score_chunk, chunk, kb))
+
+    parser = RecordParser(fmt)
+    chunk: List[Tuple[int, Any]] = []
+    try:
+        async for line in aiter_lines(chunks):
+            record = parser.feed(line)
+            if record is None:
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield await _scored(chunk)
+                chunk = []
+        record = parser.finish()
+        if record is not None:
+            chunk.append(record)
+    except BulkInputError as e:
+        # Headers are long gone; report the failure in-band after the rows read so far
+        yield await _scored(chunk) + encode({"row": None, "error": str(e)})
+        return
+    if chunk:
+        yield await _scored(chunk)
+
+
+def upload_stream_response(body: AsyncIterator[bytes], **kwargs):
+    """StreamingResponse whose body generator is still reading the request
+
+    Starlette normally listens for a client disconnect on `receive` while it
+    streams (ASGI spec < 2.4), which would swallow the upload's body messages;
+    here the generator owns `receive` and sees a disconnect as ClientDisconnect.
+    """
+    from starlette.responses import StreamingResponse
+
+    class _UploadStreamingResponse(StreamingResponse):
+        async def __call__(self, scope, receive, send):
+            await self.stream_response(send)
+
+    return _UploadStreamingResponse(body, **kwargs)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.compiled_kb import get_knowledge_base
+
+    parser = argparse.ArgumentParser(description="Score a flock registry (CSV or NDJSON) to NDJSON")
+    parser.add_argument("input", help="CSV/NDJSON file, or - for stdin")
+    parser.add_argument("-o", "--output", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: detect)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    sink = sys.stdout if not args.output else open(args.output, "w", encoding="utf-8")
+    kb = get_knowledge_base()
+    rows = errors = 0
+    start = time.perf_counter()
+    try:
+        for result in score_lines(source, kb, args.format, args.chunk_size):
+            sink.write(json.dumps(result) + "\n")
+            rows += 1
+            errors += "error" in result
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    print(f"{rows} rows ({errors} errors) in {time.perf_counter() - start:.2f}s, "
+          f"knowledge base {kb.version}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class SQLiteBackend:
+    """Cache entries in a local SQLite file so several uvicorn workers share warm entries"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._connection()  # a bad path fails at start-up, not on the first request
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY, version TEXT NOT NULL, value TEXT NOT NULL, expires REAL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Drop the connection (e.g. before forking workers); the next call opens a new one"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connection().execute("SELECT value, expires FROM response_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, version: str, value: Any, ttl: Optional[float]) -> None:
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._connection().execute("INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?)",
+                               (key, version, json.dumps(value), expires))
+
+    def prune(self, version: str) -> None:
+        """Drop entries written for other knowledge-base versions and expired ones"""
+        with self._lock:
+            self._connection().execute("DELETE FROM response_cache WHERE version != ? OR expires < ?", (version, time.time()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM response_cache")
+
+
+class ResponseCache:
+    """Bounded LRU/TTL cache of /recommend results, tagged with the knowledge-base version"""
+
+    def __init__(self, version: str, max_entries: int = 4096, ttl: Optional[float] = None,
+                 backend: Optional[SQLiteBackend] = None):
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.shared_hits = 0
+        if backend is not None:
+            backend.prune(version)
+
+    @classmethod
+    def from_env(cls, version: str) -> "ResponseCache":
+        """FEED_CACHE_SIZE (0 disables), FEED_CACHE_TTL seconds and FEED_CACHE_PATH (SQLite file)"""
+        path = os.environ.get("FEED_CACHE_PATH")
+        ttl = float(os.environ.get("FEED_CACHE_TTL", "0")) or None
+        return cls(version, int(os.environ.get("FEED_CACHE_SIZE", "4096")), ttl,
+                   SQLiteBackend(path) if path else None)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def set_version(self, version: str) -> None:
+        """A new knowledge base makes every existing entry stale"""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._entries.clear()
+        if self.backend is not None:
+            self.backend.prune(version)
+
+    def get(self, key: tuple) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        if self.backend is not None:
+            value = self.backend.get(self._shared_key(key))
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: tuple, value: Any) -> None:
+        if not self.enabled:
+            return
+        self._store(key, value)
+        if self.backend is not None:
+            self.backend.put(self._shared_key(key), self.version, value, self.ttl)
+
+    def _store(self, key: tuple, value: Any) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _shared_key(self, key: tuple) -> str:
+        return f"{self.version}:{key!r}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "shared_hits": self.shared_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "backend": self.backend.path if self.backend is not None else None,
+            }
@@ -0,0 +1,143 @@
+import os
+import pickle
+import sys
+import tempfile
+from typing import Dict, Any, Optional
+
+from app.kb_loader import KnowledgeBase, load_knowledge_base, name_key, source_digest
+from app.rule_index import RuleIndex
+
+SNAPSHOT_FORMAT = 4
+
+
+class CompiledKnowledgeBase:
+    """Everything the engines need at request time, compiled once from a KnowledgeBase.
+
+    Instances are never modified after construction; a reload builds a new one
+    and swaps it in, so a request that started on this one can finish on it.
+    """
+
+    def __init__(self, source: KnowledgeBase, base: Optional["CompiledKnowledgeBase"] = None):
+        self.source = source
+        self.version = source.release
+        self.rules = source.RULES
+        # A tenant overlay (app.tenants) is compiled over the shared release `base`: sections
+        # it leaves alone are the base's objects, and so is everything compiled from them.
+        # rules_version / recipes_version name the release those parts come from, for the
+        # per-release tables other modules keep (metrics slots, recipe matrices)
+        same_rules = base is not None and source.RULES is base.rules
+        same_recipes = base is not None and source.RECIPE_FRAMES is base.source.RECIPE_FRAMES
+        self.rules_version = base.rules_version if same_rules else self.version
+        self.recipes_version = (base.recipes_version if same_recipes
+                                and source.INGREDIENT_FRAMES is base.source.INGREDIENT_FRAMES else self.version)
+        self.rule_index = base.rule_index if same_rules else RuleIndex(source.RULES)
+        if same_recipes:
+            self.recipe_names: Dict[str, str] = base.recipe_names
+        else:
+            # Target_Type -> first recipe for it (same pick as a scan of RECIPE_FRAMES), then the
+            # feed names in each recipe's Feeds, so a rule's "Recommend" finds the recipe that makes it
+            self.recipe_names = {}
+            for name, recipe in source.RECIPE_FRAMES.items():
+                self.recipe_names.setdefault(name_key(recipe["Target_Type"]), name)
+            for name, recipe in source.RECIPE_FRAMES.items():
+                for feed in recipe.get("Feeds", ()):
+                    self.recipe_names.setdefault(name_key(feed), name)
+        self._base = base  # overlays never change the fuzzy sections
+        self._fuzzy_engines = None
+        self._fuzzy_blob: Optional[bytes] = None
+
+    def recipe_name(self, feed_type: str) -> Optional[str]:
+        return self.recipe_names.get(name_key(feed_type))
+
+    def get_recipe(self, feed_type: str) -> Dict[str, Any]:
+        name = self.recipe_name(feed_type)
+        return self.source.RECIPE_FRAMES[name] if name is not None else {}
+
+    @property
+    def fuzzy_engines(self) -> Dict[str, Any]:
+        """Compiled fuzzy rule bases; NumPy is only imported the first time this is used"""
+        if self._base is not None:
+            return self._base.fuzzy_engines
+        if self._fuzzy_engines is None:
+            if self._fuzzy_blob is not None:
+                self._fuzzy_engines = pickle.loads(self._fuzzy_blob)
+                self._fuzzy_blob = None
+            else:
+                from app.fuzzy_engine import compile_fuzzy_rules
+                self._fuzzy_engines = compile_fuzzy_rules(self.source.FUZZY_RULES, self.source.FUZZY_SETS)
+        return self._fuzzy_engines
+
+    def save(self, path: str) -> None:
+        """Publish a snapshot atomically (temp file + rename) so readers never see half a file"""
+        state = dict(self.__dict__)
+        state["_fuzzy_blob"] = pickle.dumps(self.fuzzy_engines, protocol=pickle.HIGHEST_PROTOCOL)
+        state["_fuzzy_engines"] = None
+        payload = {"format": SNAPSHOT_FORMAT, "version": self.version, "state": state}
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".kb-snapshot-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledKnowledgeBase":
+        """Read a snapshot written by save(); only use snapshots this deployment produced"""
+        with open(path, "rb") as f:
+            # Unpickling builds ordinary objects, so each process that loads holds its own copy;
+            # the gain is skipping YAML parsing, validation and index compilation. Workers share
+            # one copy only under app.serve, which loads before it forks
+            payload = pickle.loads(f.read())
+        if payload.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported knowledge-base snapshot format in {path}")
+        kb = cls.__new__(cls)
+        kb.__dict__.update(payload["state"])
+        return kb
+
+
+def load_compiled(snapshot_path: Optional[str] = None, directory: Optional[str] = None) -> CompiledKnowledgeBase:
+    """Compiled knowledge base, from the snapshot when it was built from the current files.
+
+    A missing or stale snapshot is rebuilt from the knowledge-base files and written
+    back, so the first process to start pays for compilation and the rest just load it.
+    Raises KnowledgeBaseError when the files do not validate.
+    """
+    if snapshot_path:
+        try:
+            kb = CompiledKnowledgeBase.load(snapshot_path)
+            # Digest only: a current snapshot needs no YAML parsing or validation
+            if kb.source.digest == source_digest(directory):
+                return kb
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+    kb = CompiledKnowledgeBase(load_knowledge_base(directory))
+    if snapshot_path:
+        try:
+            kb.save(snapshot_path)
+        except OSError:
+            pass  # read-only deployments still start, just without the snapshot
+    return kb
+
+
+_STORE = None
+
+
+def get_knowledge_base() -> CompiledKnowledgeBase:
+    """The knowledge base currently being served (see app.kb_store for reloads)"""
+    global _STORE
+    if _STORE is None:
+        from app.kb_store import STORE
+        _STORE = STORE
+    return _STORE.current
+
+
+if __name__ == "__main__":
+    # python -m app.compiled_kb snapshot.pkl  -> precompile for FEED_KB_SNAPSHOT
+    target = sys.argv[1] if len(sys.argv) > 1 else "kb_snapshot.pkl"
+    compiled = CompiledKnowledgeBase(load_knowledge_base())
+    compiled.save(target)
+    print(f"Wrote knowledge-base snapshot {compiled.version} to {target}")
@@ -0,0 +1,52 @@
+from typing import Dict, Any, List, Optional
+from app.compiled_kb import get_knowledge_base
+
+
+def apply_rules(facts: Dict[str, Any], rules: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Evaluate all rules against provided facts and return applicable recommendations (reference path)"""
+    results = []
+    for rule in rules if rules is not None else get_knowledge_base().rules:
+        conditions = rule.get("if", {})
+        match = True
+
+        for key, value in conditions.items():
+            if key == "Any":  # global rules
+                continue
+            if key not in facts:
+                match = False
+                break
+            fact_value = facts[key]
+            if isinstance(value, tuple):  # age ranges
+                if not (value[0] <= fact_value <= value[1]):
+                    match = False
+                    break
+            elif isinstance(value, str) and value.startswith("<"):
+                # e.g. "<50%"
+                try:
+                    threshold = float(value.strip("<%"))
+                    fact_num = float(str(fact_value).strip("%"))
+                    if not fact_num < threshold:
+                        match = False
+                        break
+                except:
+                    match = False
+                    break
+            else:
+                if fact_value != value:
+                    match = False
+                    break
+
+        if match:
+            results.append(rule.get("then", {}))
+
+    return results
+
+
+def match_rules(facts: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Same result as apply_rules, but only rules reachable through the compiled rule index are checked"""
+    return get_knowledge_base().rule_index.match(facts)
+
+
+def get_feed_recipe(feed_type: str) -> Dict[str, Any]:
+    """Fetch matching recipe by feed type"""
+    return get_knowledge_base().get_recipe(feed_type)
@@ -1,9 +1,87 @@
-from pydantic import BaseModel
-from typing import Optional
+from datetime import date
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Optional, Dict, List, Any, Tuple, Union
+
+from app import facts
 
 class FeedQuery(BaseModel):
-    Type: str
+    # Validated into canonical values (see app.facts); .dict() gives the plain strings the rules test
+    model_config = ConfigDict(use_enum_values=True)
+    Type: facts.FlockType                       # aliases such as "Pullets / Growers" accepted
     Age_Weeks: float
-    EggProduction: Optional[str] = None
-    FeedCost: Optional[str] = None
-    Health: Optional[str] = None
\ No newline at end of file
+    EggProduction: Optional[float] = None       # percent; "45%" and "45" accepted
+    FeedCost: Optional[facts.FeedCost] = None
+    Health: Optional[facts.Health] = None
+
+    @field_validator("Type", "FeedCost", "Health", mode="before")
+    @classmethod
+    def _choice(cls, value, info):
+        return facts.parse_choice(facts.FACT_ENUMS[info.field_name], value)
+
+    @field_validator("EggProduction", mode="before")
+    @classmethod
+    def _percent(cls, value):
+        return facts.parse_production(value)
+
+    def record(self) -> facts.FlockFacts:
+        return facts.FlockFacts(facts.FlockType(self.Type), self.Age_Weeks, self.EggProduction,
+                                facts.FeedCost(self.FeedCost) if self.FeedCost is not None else None,
+                                facts.Health(self.Health) if self.Health is not None else None)
+
+
+class FuzzyBatchQuery(BaseModel):
+    rule_base: str = "Broiler"            # key of FUZZY_RULES
+    inputs: Dict[str, List[float]]        # e.g. {"age": [...], "protein": [...]}
+    tnorm: str = "min"                    # "min" or "product"
+    defuzzify: bool = False               # also return centroid suitability
+
+
+class FormulationQuery(BaseModel):
+    Target_DCP: str                             # e.g. "16-18%"
+    Batch_kg: float = Field(70.0, gt=0)
+    Target_Type: Optional[str] = None           # picks the calcium range from CHICKEN_FRAMES
+    Calcium: Optional[str] = None               # e.g. "0.9-1.2%", overrides Target_Type
+    Prices: Optional[Dict[str, float]] = None   # Price_per_kg overrides
+    Ingredients: Optional[List[str]] = None     # restrict to these INGREDIENT_FRAMES
+
+
+class PriceUpdate(BaseModel):
+    Prices: Dict[str, float] = {}
+
+
+class FlockSpec(BaseModel):
+    Type: str                                   # e.g. "Layer", "Broiler Starter"
+    Age_Weeks: float = Field(ge=0)
+    Birds: int = Field(ge=0)
+
+
+class ProjectionQuery(BaseModel):
+    Flocks: List[FlockSpec]
+    Horizon_Weeks: float = Field(76, gt=0, le=76)
+    Start_Date: Optional[date] = None           # defaults to today
+    Granularity: str = "day"                    # "day" or "week"
+    Stock: Dict[str, float] = {}                # kg on hand per feed (recipe) or ingredient
+    Lead_Time_Days: int = Field(7, ge=0)
+
+
+class ChainQuery(BaseModel):
+    Facts: FeedQuery
+    # What-if steps, each applied to the previous state, e.g. [{"Age_Weeks": 21}, {"EggProduction": "40%"}]
+    Changes: List[Dict[str, Any]] = Field([], max_length=1000)
+
+
+class SweepQuery(BaseModel):
+    Facts: Dict[str, Optional[Union[str, float, bool]]] = {}   # held fixed, e.g. {"Type": "Layer", "FeedCost": "High"}
+    Axes: List[str] = Field(["Age_Weeks"], min_length=1, max_length=3)   # first one is the primary axis
+    Ranges: Dict[str, Tuple[float, float]] = {}                # clip numeric axes, e.g. {"Age_Weeks": [0, 76]}
+    Points: List[Dict[str, Any]] = Field([], max_length=10000)  # point lookups, e.g. [{"Age_Weeks": 30}]
+
+    @field_validator("Facts")
+    @classmethod
+    def _canonical_facts(cls, value):
+        return facts.canonical_facts(value)
+
+    @field_validator("Points")
+    @classmethod
+    def _canonical_points(cls, value):
+        return [facts.canonical_facts(point) for point in value]
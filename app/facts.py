@@ -0,0 +1,157 @@
+"""Typed flock facts, validated once at the API boundary.
+
+Type, FeedCost and Health are enum-coded, with their values being the names the
+RULES test. UI labels, CHICKEN_FRAMES keys and other spellings go through
+TYPE_ALIASES, so "Pullets / Growers" and "Broiler_starter" reach the rules as
+"Grower" and "Broiler Starter". EggProduction is a number (percent), so "45%",
+"45" and 45 are the same fact and no engine has to parse it again.
+
+A flock's facts are a FlockFacts tuple; a batch of them packs into a NumPy
+structured array (fact_array) that app.batch reads column by column.
+"""
+import math
+from enum import Enum
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Type
+
+from app.kb_loader import name_key
+
+
+class FlockType(str, Enum):
+    CHICK = "Chick"
+    GROWER = "Grower"
+    LAYER = "Layer"
+    BROILER_STARTER = "Broiler Starter"
+    BROILER_GROWER = "Broiler Grower"
+    BROILER_FINISHER = "Broiler Finisher"
+
+
+class FeedCost(str, Enum):
+    HIGH = "High"
+    LOW = "Low"
+
+
+class Health(str, Enum):
+    HEALTHY = "Healthy"
+    SICK = "Sick"
+
+
+# Other names for a flock type, matched like ingredient names (case, spacing and "_" ignored)
+TYPE_ALIASES: Dict[str, FlockType] = {
+    "Chicks": FlockType.CHICK,
+    "Pullets / Growers": FlockType.GROWER,      # CHICKEN_FRAMES and the dashboard
+    "Pullets": FlockType.GROWER,
+    "Pullet": FlockType.GROWER,
+    "Growers": FlockType.GROWER,
+    "Layers": FlockType.LAYER,
+    "Broiler Starters": FlockType.BROILER_STARTER,
+    "Broiler Growers": FlockType.BROILER_GROWER,
+    "Broiler Finishers": FlockType.BROILER_FINISHER,
+}
+
+# Fact name -> enum of the values the rules may test
+FACT_ENUMS: Dict[str, Type[Enum]] = {"Type": FlockType, "FeedCost": FeedCost, "Health": Health}
+
+
+def _key(value: str) -> str:
+    return name_key(value.replace("_", " "))
+
+
+_LOOKUP: Dict[Type[Enum], Dict[str, Enum]] = {
+    enum: {_key(member.value): member for member in enum} for enum in FACT_ENUMS.values()
+}
+for _alias, _member in TYPE_ALIASES.items():
+    _LOOKUP[FlockType].setdefault(_key(_alias), _member)
+
+
+def parse_choice(enum: Type[Enum], value: Any) -> Optional[Enum]:
+    """Enum member for a value, its name in any case or spacing, or an alias; blank is None"""
+    if value is None or isinstance(value, enum):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f"expected one of {', '.join(m.value for m in enum)}")
+    if not value.strip():
+        return None
+    member = _LOOKUP[enum].get(_key(value))
+    if member is None:
+        raise ValueError(f"unknown value {value!r}; expected one of {', '.join(m.value for m in enum)}")
+    return member
+
+
+def parse_production(value: Any) -> Optional[float]:
+    """Egg production as a percentage: "45%", "45" and 45 are all 45.0; blank is None"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError("expected a percentage such as 45 or \"45%\"")
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return None
+        try:
+            value = float(text[:-1] if text.endswith("%") else text)
+        except ValueError:
+            raise ValueError(f"expected a percentage such as 45 or \"45%\", got {text!r}")
+    number = float(value)
+    if not math.isfinite(number) or not 0 <= number <= 100:
+        raise ValueError("must be between 0 and 100")
+    return number
+
+
+def canonical_facts(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Partial facts with the typed ones (Type, FeedCost, Health, EggProduction) canonicalized,
+    other keys as given; raises ValueError naming the bad fact"""
+    out = dict(values)
+    for name, value in values.items():
+        try:
+            if name in FACT_ENUMS:
+                member = parse_choice(FACT_ENUMS[name], value)
+                out[name] = member.value if member is not None else None
+            elif name == "EggProduction":
+                out[name] = parse_production(value)
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}")
+    return out
+
+
+class FlockFacts(NamedTuple):
+    """One flock's validated facts"""
+    type: FlockType
+    age_weeks: float
+    egg_production: Optional[float] = None
+    feed_cost: Optional[FeedCost] = None
+    health: Optional[Health] = None
+
+    def as_facts(self) -> Dict[str, Any]:
+        """The named facts the rules test, with plain values (as FeedQuery.dict())"""
+        return {
+            "Type": self.type.value,
+            "Age_Weeks": self.age_weeks,
+            "EggProduction": self.egg_production,
+            "FeedCost": self.feed_cost.value if self.feed_cost is not None else None,
+            "Health": self.health.value if self.health is not None else None,
+        }
+
+
+# Integer code of every enum value in a structured array; -1 is a missing fact
+CODES: Dict[str, Dict[Optional[str], int]] = {
+    name: {None: -1, **{member.value: i for i, member in enumerate(enum)}} for name, enum in FACT_ENUMS.items()
+}
+
+
+def fact_dtype():
+    import numpy as np
+
+    return np.dtype([("Type", "i1"), ("Age_Weeks", "f8"), ("EggProduction", "f8"),
+                     ("FeedCost", "i1"), ("Health", "i1")])
+
+
+def fact_array(records: Sequence[FlockFacts]):
+    """Structured array of a batch: enum codes, ages, and production with NaN when missing"""
+    import numpy as np
+
+    types, costs, health = CODES["Type"], CODES["FeedCost"], CODES["Health"]
+    nan = math.nan
+    rows = [(types[r.type.value], r.age_weeks, nan if r.egg_production is None else r.egg_production,
+             costs[r.feed_cost.value if r.feed_cost is not None else None],
+             health[r.health.value if r.health is not None else None]) for r in records]
+    return np.array(rows, dtype=fact_dtype())
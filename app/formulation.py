@@ -0,0 +1,241 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.compiled_kb import get_knowledge_base
+from app.kb_loader import KnowledgeBase, parse_range
+
+TOL = 1e-9
+
+
+class InfeasibleFormulation(ValueError):
+    """No mix of the available ingredients meets the targets"""
+
+
+def calcium_target(target_type: Optional[str], source: Optional[KnowledgeBase] = None) -> str:
+    """Calcium range for a chicken type, from its CHICKEN_FRAMES calcium requirement"""
+    source = source or get_knowledge_base().source
+    level = source.CHICKEN_FRAMES.get(target_type or "", {}).get("Calcium_Requirement", "Normal")
+    return source.CALCIUM_REQUIREMENTS.get(level, source.CALCIUM_REQUIREMENTS["Normal"])
+
+
+def pearson_square(target_cp: float, low_cp: float, high_cp: float) -> Tuple[float, float]:
+    """Pearson Square: fractions of a low- and a high-protein ingredient that give target_cp"""
+    if not low_cp < target_cp < high_cp:
+        raise InfeasibleFormulation("Target protein must lie between the two ingredients")
+    low_parts = high_cp - target_cp
+    high_parts = target_cp - low_cp
+    total = low_parts + high_parts
+    return low_parts / total, high_parts / total
+
+
+def _simplex(A: np.ndarray, b: np.ndarray, c: np.ndarray, basis: List[int], max_iter: int = 500) -> List[int]:
+    """Revised simplex (Bland's rule) from a primal feasible basis; returns the optimal basis"""
+    basis = list(basis)
+    for _ in range(max_iter):
+        B_inv = np.linalg.inv(A[:, basis])
+        x_B = B_inv @ b
+        reduced = c - (c[basis] @ B_inv) @ A
+        reduced[basis] = 0.0
+        entering = np.flatnonzero(reduced < -TOL)
+        if entering.size == 0:
+            return basis
+        j = int(entering[0])
+        d = B_inv @ A[:, j]
+        rows = np.flatnonzero(d > TOL)
+        if rows.size == 0:
+            raise InfeasibleFormulation("Formulation is unbounded")
+        ratios = x_B[rows] / d[rows]
+        best = ratios.min()
+        ties = rows[ratios <= best + TOL]
+        leaving = min(ties, key=lambda r: basis[r])
+        basis[leaving] = j
+    raise InfeasibleFormulation("Simplex did not converge")
+
+
+class FormulationProblem:
+    """Constraint matrix for one target: x are ingredient fractions of the batch
+
+        sum(x) = 1
+        CP_lo <= CP . x <= CP_hi
+        Ca_lo <= Ca . x <= Ca_hi
+        Min_Inclusion <= x_i <= Max_Inclusion
+
+    written in standard form A z = b, z >= 0 with slack columns.
+    """
+
+    def __init__(self, ingredients: List[str], cp_range: Tuple[float, float], ca_range: Tuple[float, float],
+                 ingredient_frames: Dict[str, Dict[str, Any]]):
+        self.ingredients = ingredients
+        frames = [ingredient_frames[name] for name in ingredients]
+        cp = np.array([f.get("CP%", 0.0) for f in frames], dtype=float)
+        ca = np.array([f.get("Ca%", 0.0) for f in frames], dtype=float)
+        lo = np.array([f.get("Min_Inclusion%", 0.0) for f in frames], dtype=float) / 100
+        hi = np.array([f.get("Max_Inclusion%", 100.0) for f in frames], dtype=float) / 100
+        k = len(ingredients)
+
+        rows, rhs, slacks = [np.ones(k)], [1.0], [0]
+        for coef, (low, high) in ((cp, cp_range), (ca, ca_range)):
+            rows += [coef, coef]
+            rhs += [low, high]
+            slacks += [-1, 1]
+        for i in range(k):
+            unit = np.eye(k)[i]
+            if hi[i] < 1:
+                rows.append(unit)
+                rhs.append(hi[i])
+                slacks.append(1)
+            if lo[i] > 0:
+                rows.append(unit)
+                rhs.append(lo[i])
+                slacks.append(-1)
+
+        m = len(rows)
+        n_slack = sum(1 for s in slacks if s)
+        A = np.zeros((m, k + n_slack))
+        A[:, :k] = np.array(rows)
+        col = k
+        for r, sign in enumerate(slacks):
+            if sign:
+                A[r, col] = sign
+                col += 1
+        self.A, self.b, self.k = A, np.array(rhs), k
+
+    def phase_one(self) -> Tuple[List[int], List[int]]:
+        """Find a feasible basis with artificial variables; returns (kept rows, basis)"""
+        A, b = self.A, self.b
+        m, n = A.shape
+        A1 = np.hstack([A, np.eye(m)])
+        c1 = np.concatenate([np.zeros(n), np.ones(m)])
+        basis = _simplex(A1, b, c1, list(range(n, n + m)))
+        x_B = np.linalg.solve(A1[:, basis], b)
+        if c1[basis] @ x_B > 1e-7:
+            raise InfeasibleFormulation("No ingredient mix meets the protein, calcium and inclusion limits")
+
+        # Pivot leftover (zero-level) artificials out, dropping rows that are redundant
+        keep = list(range(m))
+        for r in range(m):
+            if basis[r] < n:
+                continue
+            row = np.linalg.inv(A1[:, basis])[r] @ A
+            candidates = [j for j in np.flatnonzero(np.abs(row) > 1e-7) if j not in basis]
+            if candidates:
+                basis[r] = int(candidates[0])
+            else:
+                keep.remove(r)
+        return keep, [basis[r] for r in keep]
+
+    def solve(self, prices: np.ndarray, warm: Optional[Tuple[List[int], List[int]]] = None):
+        """Least-cost fractions; warm is (rows, basis) from a previous solve of this problem"""
+        cost = np.concatenate([prices, np.zeros(self.A.shape[1] - self.k)])
+        warm_started = False
+        if warm is not None:
+            rows, basis = warm
+            try:
+                # Prices do not move the feasible region, so the old basis is still primal feasible
+                x_B = np.linalg.solve(self.A[rows][:, basis], self.b[rows])
+                warm_started = bool((x_B >= -1e-9).all())
+            except np.linalg.LinAlgError:
+                warm_started = False
+        if not warm_started:
+            rows, basis = self.phase_one()
+        A, b = self.A[rows], self.b[rows]
+        basis = _simplex(A, b, cost, basis)
+        z = np.zeros(self.A.shape[1])
+        z[basis] = np.linalg.solve(A[:, basis], b)
+        x = np.clip(z[:self.k], 0.0, None)
+        return x, (rows, basis), warm_started
+
+
+class Formulator:
+    """Least-cost formulation with solutions cached by target and price vector"""
+
+    def __init__(self, max_solutions: int = 1024):
+        self.max_solutions = max_solutions
+        self._problems: Dict[tuple, FormulationProblem] = {}
+        self._bases: Dict[tuple, Tuple[List[int], List[int]]] = {}
+        self._solutions: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        # Guards the three dicts; the solve itself runs outside it (threadpool callers share one Formulator)
+        self._lock = threading.Lock()
+
+    def formulate(self, target_dcp: str, batch_kg: float = 70.0, calcium: Optional[str] = None,
+                  target_type: Optional[str] = None, prices: Optional[Dict[str, float]] = None,
+                  ingredients: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Cheapest batch meeting the protein target, calcium range and inclusion limits"""
+        kb = get_knowledge_base()
+        frames = kb.source.INGREDIENT_FRAMES
+        names = tuple(ingredients or frames.keys())
+        unknown = [name for name in names if name not in frames]
+        if unknown:
+            raise InfeasibleFormulation(f"Unknown ingredients: {', '.join(unknown)}")
+        prices = prices or {}
+        price_vector = tuple(float(prices.get(name, frames[name]["Price_per_kg"])) for name in names)
+        cp_range = parse_range(target_dcp)
+        ca_range = parse_range(calcium or calcium_target(target_type, kb.source))
+        # A reloaded knowledge base may change nutrient values or limits behind the same names
+        problem_key = (kb.version, names, cp_range, ca_range)
+
+        solution_key = (problem_key, price_vector)
+        with self._lock:
+            cached = self._solutions.get(solution_key)
+            if cached is not None:
+                self._solutions.move_to_end(solution_key)
+            problem = self._problems.get(problem_key)
+            warm = self._bases.get(problem_key)
+        if cached is not None:
+            return self._scaled(cached, batch_kg, cached=True)
+
+        if problem is None:
+            problem = FormulationProblem(list(names), cp_range, ca_range, frames)
+            with self._lock:
+                problem = self._problems.setdefault(problem_key, problem)
+        x, basis, warm_started = problem.solve(np.array(price_vector), warm)
+
+        cp = np.array([frames[n].get("CP%", 0.0) for n in names])
+        ca = np.array([frames[n].get("Ca%", 0.0) for n in names])
+        solution = {
+            "target_dcp": target_dcp,
+            "fractions": {name: float(f) for name, f in zip(names, x) if f > 1e-9},
+            "cost_per_kg": float(np.dot(x, price_vector)),
+            "CP%": float(cp @ x),
+            "Ca%": float(ca @ x),
+            "warm_start": warm_started,
+        }
+        with self._lock:
+            self._bases[problem_key] = basis
+            self._solutions[solution_key] = solution
+            self._solutions.move_to_end(solution_key)
+            if len(self._solutions) > self.max_solutions:
+                self._solutions.popitem(last=False)
+        return self._scaled(solution, batch_kg, cached=False)
+
+    @staticmethod
+    def _scaled(solution: Dict[str, Any], batch_kg: float, cached: bool) -> Dict[str, Any]:
+        return {
+            "target_dcp": solution["target_dcp"],
+            "batch_kg": batch_kg,
+            "Ingredients": {name: round(f * batch_kg, 2) for name, f in solution["fractions"].items()},
+            "cost": round(solution["cost_per_kg"] * batch_kg, 2),
+            "cost_per_kg": round(solution["cost_per_kg"], 2),
+            "CP%": round(solution["CP%"], 2),
+            "Ca%": round(solution["Ca%"], 2),
+            "warm_start": solution["warm_start"],
+            "cached": cached,
+        }
+
+    def reformulate_recipes(self, prices: Optional[Dict[str, float]] = None) -> Dict[str, Dict[str, Any]]:
+        """Re-optimize every RECIPE_FRAMES target at the given prices"""
+        results = {}
+        for name, recipe in get_knowledge_base().source.RECIPE_FRAMES.items():
+            batch_kg = round(sum(recipe["Ingredients"].values()), 2)
+            try:
+                results[name] = self.formulate(recipe["Target_DCP"], batch_kg,
+                                               target_type=recipe["Target_Type"], prices=prices)
+            except InfeasibleFormulation as e:
+                results[name] = {"error": str(e)}
+        return results
+
+
+FORMULATOR = Formulator()
@@ -0,0 +1,319 @@
+"""Forward-chaining engine with an agenda and incremental re-evaluation.
+
+The rule network is compiled once per knowledge-base release and shared; each
+Session holds its own working memory. Every distinct condition is one alpha
+node whose truth is kept for the current facts, and every rule counts how many
+of its conditions hold. Changing a fact only re-tests the alpha nodes on that
+fact whose outcome can differ between the old and the new value (hash bucket
+for exact matches, bound search for ranges and thresholds), so sliding
+Age_Weeks in a what-if view touches a handful of rules, not the whole base.
+
+Conflict resolution: priority (1 first, rules without one last), then
+specificity (more conditions first), then position in the knowledge base.
+Rules may "assert" facts; a derived fact is supported by the rules that assert
+it and is withdrawn when the last of them stops matching.
+"""
+import heapq
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.compiled_kb import get_knowledge_base
+from app.kb_store import STORE
+from app.rule_index import EQ, RANGE, LT, compile_conditions, parse_percent, _is_hashable, _is_number
+
+MISSING = object()
+MAX_FIRINGS = 10000   # per run; a rule set that keeps undoing itself is an error, not a hang
+
+
+class ChainingError(RuntimeError):
+    """The rules did not reach a fixed point (they keep retracting each other's facts)"""
+
+
+def _test(check: tuple, value: Any) -> bool:
+    """One condition against one fact value, with the same outcome as apply_rules"""
+    if value is MISSING:
+        return False
+    kind, _, a, b = check
+    try:
+        if kind == RANGE:
+            return a <= value <= b
+        if kind == LT:
+            number = parse_percent(value)
+            return a is not None and number is not None and number < a
+        return value == a
+    except TypeError:  # e.g. a string against a numeric range
+        return False
+
+
+def _between(points: List[Any], nodes: List[int], low: Any, high: Any) -> List[int]:
+    """Nodes whose sorted point lies in [low, high]"""
+    return nodes[bisect_left(points, low):bisect_right(points, high)]
+
+
+class _KeyNodes:
+    """Alpha nodes testing one fact key, indexed so a value change finds the nodes that may flip"""
+
+    def __init__(self, checks: List[Tuple[int, tuple]]):
+        self.equal: Dict[Any, List[int]] = {}
+        self.all_equal: List[int] = []
+        self.always: List[int] = []            # re-tested on every change of the key
+        range_points, threshold_points, self.ranges, self.thresholds = [], [], [], []
+        for node, (kind, _, a, b) in checks:
+            if kind == EQ:
+                self.all_equal.append(node)
+                if _is_hashable(a):
+                    self.equal.setdefault(a, []).append(node)
+                else:
+                    self.always.append(node)
+            elif kind == RANGE and _is_number(a) and _is_number(b):
+                self.ranges.append(node)
+                range_points += [(a, node), (b, node)]
+            elif kind == LT and _is_number(a):
+                self.thresholds.append(node)
+                threshold_points.append((a, node))
+            elif kind != LT:  # an LT without a usable threshold never holds
+                self.always.append(node)
+        range_points.sort(key=lambda p: p[0])
+        threshold_points.sort(key=lambda p: p[0])
+        self.range_points = [p for p, _ in range_points]
+        self.range_nodes = [n for _, n in range_points]
+        self.threshold_points = [p for p, _ in threshold_points]
+        self.threshold_nodes = [n for _, n in threshold_points]
+
+    def affected(self, old: Any, new: Any) -> List[int]:
+        """Superset of the nodes whose truth can differ between old and new"""
+        out = list(self.always)
+        if self.all_equal:
+            if (old is MISSING or _is_hashable(old)) and (new is MISSING or _is_hashable(new)):
+                out += self.equal.get(old, ()) if old is not MISSING else ()
+                out += self.equal.get(new, ()) if new is not MISSING else ()
+            else:
+                out += self.all_equal
+        if self.ranges:
+            # A closed range flips only if one of its bounds lies between the two values
+            if _is_number(old) and _is_number(new):
+                out += _between(self.range_points, self.range_nodes, min(old, new), max(old, new))
+            else:
+                out += self.ranges
+        if self.thresholds:
+            p_old = parse_percent(old) if old is not MISSING else None
+            p_new = parse_percent(new) if new is not MISSING else None
+            if p_old is not None and p_new is not None and p_old == p_old and p_new == p_new:
+                out += _between(self.threshold_points, self.threshold_nodes, min(p_old, p_new), max(p_old, p_new))
+            else:
+                out += self.thresholds
+        return out
+
+
+class RuleNetwork:
+    """DERIVED_RULES followed by RULES, compiled into shared alpha nodes; immutable once built"""
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = rules
+        self.names = [rule.get("name") for rule in rules]
+        self.asserts = [tuple((rule.get("assert") or {}).items()) for rule in rules]
+        self.thens = [rule.get("then", {}) for rule in rules]
+        self.checks: List[tuple] = []             # alpha node -> (kind, key, a, b)
+        self.rule_nodes: List[Tuple[int, ...]] = []
+        self.node_rules: List[List[int]] = []
+        node_of: Dict[Any, int] = {}
+        for rule_id, rule in enumerate(rules):
+            nodes = []
+            for check in compile_conditions(rule.get("if", {})):
+                try:
+                    node = node_of.get(check)
+                except TypeError:  # unhashable rule value: a node of its own
+                    node = None
+                if node is None:
+                    node = len(self.checks)
+                    self.checks.append(check)
+                    self.node_rules.append([])
+                    try:
+                        node_of[check] = node
+                    except TypeError:
+                        pass
+                if node not in nodes:
+                    nodes.append(node)
+                    self.node_rules[node].append(rule_id)
+            self.rule_nodes.append(tuple(nodes))
+        self.sizes = [len(nodes) for nodes in self.rule_nodes]
+        self.salience = [(rule.get("priority") if rule.get("priority") is not None else float("inf"),
+                          -self.sizes[i], i) for i, rule in enumerate(rules)]
+        by_key: Dict[str, List[Tuple[int, tuple]]] = {}
+        for node, check in enumerate(self.checks):
+            by_key.setdefault(check[1], []).append((node, check))
+        self.keys = {key: _KeyNodes(checks) for key, checks in by_key.items()}
+        self.unconditional = [i for i, size in enumerate(self.sizes) if size == 0]
+
+
+_NETWORKS: Dict[str, RuleNetwork] = {}
+
+
+def rule_network(kb=None) -> RuleNetwork:
+    """Network for a knowledge-base release, built on first use"""
+    kb = kb or get_knowledge_base()
+    network = _NETWORKS.get(kb.version)
+    if network is None:
+        network = _NETWORKS[kb.version] = RuleNetwork(kb.source.DERIVED_RULES + kb.source.RULES)
+    return network
+
+
+def forget(version: str) -> None:
+    """Drop the network of a release no longer served (an evicted tenant)"""
+    _NETWORKS.pop(version, None)
+
+
+def _drop_replaced(kb) -> None:
+    """After a reload, drop the networks of every earlier release, tenant overlays included"""
+    for version in list(_NETWORKS):
+        if version != kb.version:
+            forget(version)
+
+
+STORE.add_listener(_drop_replaced)
+
+
+class Session:
+    """Working memory of one flock over a shared RuleNetwork.
+
+    As long as derived facts only add to the given ones (as in the shipped rules),
+    the state after any sequence of update() calls is the same as a new Session
+    built from the final facts; only the work done to get there differs.
+    """
+
+    def __init__(self, network: RuleNetwork, facts: Optional[Dict[str, Any]] = None):
+        self.network = network
+        self.given: Dict[str, Any] = {}
+        self.values: Dict[str, Any] = {}                  # given facts overlaid with derived ones
+        self.support: Dict[str, Dict[int, Any]] = {}      # derived key -> {rule id: value}
+        self.node_state = bytearray(len(network.checks))
+        self.satisfied = [0] * len(network.rules)
+        self.fired: Dict[int, bool] = {}
+        self.agenda: List[tuple] = []
+        self.tests = 0                                    # alpha tests so far, for benchmarks
+        self.firings = 0
+        for rule_id in network.unconditional:
+            self._activate(rule_id)
+        self.update(facts or {})
+
+    # Working memory -------------------------------------------------------
+
+    def update(self, changes: Dict[str, Any]) -> None:
+        """Set (or with MISSING, remove) given facts and run the agenda to quiescence"""
+        for key, value in changes.items():
+            if value is MISSING:
+                self.given.pop(key, None)
+            else:
+                self.given[key] = value
+            self._refresh(key)
+        self.run()
+
+    def retract(self, key: str) -> None:
+        self.update({key: MISSING})
+
+    def _refresh(self, key: str) -> None:
+        """Recompute a key's effective value; the best-ranked supporting rule wins over given facts"""
+        supporters = self.support.get(key)
+        if supporters:
+            salience = self.network.salience
+            new = supporters[min(supporters, key=lambda r: salience[r])]
+        else:
+            new = self.given.get(key, MISSING)
+        old = self.values.get(key, MISSING)
+        if new is old or (type(new) is type(old) and new == old):
+            return
+        if new is MISSING:
+            del self.values[key]
+        else:
+            self.values[key] = new
+        nodes = self.network.keys.get(key)
+        if nodes is not None:
+            self._propagate(nodes.affected(old, new), new)
+
+    def _propagate(self, candidates: List[int], value: Any) -> None:
+        network, state, satisfied, sizes = self.network, self.node_state, self.satisfied, self.network.sizes
+        dropped = []
+        for node in candidates:
+            self.tests += 1
+            now = _test(network.checks[node], value)
+            if now == state[node]:
+                continue
+            state[node] = now
+            for rule_id in network.node_rules[node]:
+                if now:
+                    satisfied[rule_id] += 1
+                    if satisfied[rule_id] == sizes[rule_id]:
+                        self._activate(rule_id)
+                else:
+                    if satisfied[rule_id] == sizes[rule_id]:
+                        dropped.append(rule_id)
+                    satisfied[rule_id] -= 1
+        # Retractions change other facts, so they wait until this key is fully propagated
+        for rule_id in dropped:
+            if not self._active(rule_id):
+                self._deactivate(rule_id)
+
+    # Agenda -----------------------------------------------------------------
+
+    def _activate(self, rule_id: int) -> None:
+        heapq.heappush(self.agenda, self.network.salience[rule_id])
+
+    def _deactivate(self, rule_id: int) -> None:
+        # Stale agenda entries are skipped when popped; a fired rule takes its facts back
+        if self.fired.pop(rule_id, None):
+            for key, _ in self.network.asserts[rule_id]:
+                supporters = self.support[key]
+                del supporters[rule_id]
+                if not supporters:
+                    del self.support[key]
+                self._refresh(key)
+
+    def _active(self, rule_id: int) -> bool:
+        return self.satisfied[rule_id] == self.network.sizes[rule_id]
+
+    def run(self) -> None:
+        """Fire activations best first until none are left"""
+        fired_now = 0
+        while self.agenda:
+            rule_id = heapq.heappop(self.agenda)[2]
+            if rule_id in self.fired or not self._active(rule_id):
+                continue
+            fired_now += 1
+            if fired_now > MAX_FIRINGS:
+                raise ChainingError(f"no fixed point after {MAX_FIRINGS} firings "
+                                    f"(last rule {self.network.names[rule_id]})")
+            self.fired[rule_id] = True
+            self.firings += 1
+            for key, value in self.network.asserts[rule_id]:
+                self.support.setdefault(key, {})[rule_id] = value
+                self._refresh(key)
+
+    # Results ----------------------------------------------------------------
+
+    def fired_ids(self) -> List[int]:
+        """Rules that hold for the current facts, in agenda order"""
+        salience = self.network.salience
+        return sorted(self.fired, key=lambda r: salience[r])
+
+    def derived(self) -> Dict[str, Any]:
+        return {key: self.values[key] for key in self.support}
+
+    def conclusions(self) -> List[Dict[str, Any]]:
+        thens = self.network.thens
+        return [thens[r] for r in self.fired_ids() if thens[r]]
+
+    def result(self, get_recipe=None) -> Dict[str, Any]:
+        """JSON-ready state: facts, derived facts, fired rules and the winning recommendation"""
+        fired = self.fired_ids()
+        thens = self.network.thens
+        recommendations = [thens[r] for r in fired if thens[r]]
+        decision = next((r for r in fired if "Recommend" in thens[r]), None)
+        feed_type = thens[decision]["Recommend"] if decision is not None else None
+        return {
+            "facts": dict(self.given),
+            "derived": self.derived(),
+            "fired": [self.network.names[r] for r in fired],
+            "recommendations": recommendations,
+            "decided_by": self.network.names[decision] if decision is not None else None,
+            "recipe": (get_recipe(feed_type) if get_recipe and feed_type else {}),
+        }
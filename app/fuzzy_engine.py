@@ -0,0 +1,216 @@
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from app.compiled_kb import get_knowledge_base
+
+TNORMS = ("min", "product")
+
+
+def triangular_membership(x: float, a: float, b: float, c: float) -> float:
+    """Triangular membership function"""
+    if a <= x <= b:
+        return (x - a) / (b - a) if b != a else 1.0
+    elif b <= x <= c:
+        return (c - x) / (c - b) if c != b else 1.0
+    return 0.0
+
+
+def fuzzify(value: float, fuzzy_sets: Dict[str, tuple]) -> Dict[str, float]:
+    """Return membership degrees of a value across fuzzy sets"""
+    memberships = {}
+    for label, (a, b, c) in fuzzy_sets.items():
+        memberships[label] = round(triangular_membership(value, a, b, c), 2)
+    return memberships
+
+
+def triangular(x, a: float, b: float, c: float) -> np.ndarray:
+    """Vectorized triangular membership, same branches as triangular_membership"""
+    x = np.asarray(x, dtype=float)
+    rising = (x - a) / (b - a) if b != a else np.ones_like(x)
+    falling = (c - x) / (c - b) if c != b else np.ones_like(x)
+    left = (a <= x) & (x <= b)
+    right = (b <= x) & (x <= c)
+    return np.where(left, rising, np.where(right, falling, 0.0))
+
+
+def fuzzify_array(values, fuzzy_sets: Dict[str, tuple]) -> Dict[str, np.ndarray]:
+    """Membership degrees of every value across fuzzy sets, one array per label"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {label: triangular(values, a, b, c) for label, (a, b, c) in fuzzy_sets.items()}
+
+
+def _tnorm(degrees: List[np.ndarray], tnorm: str) -> np.ndarray:
+    if tnorm == "min":
+        return np.minimum.reduce(degrees)
+    if tnorm == "product":
+        return np.multiply.reduce(degrees)
+    raise ValueError(f"Unknown t-norm: {tnorm}")
+
+
+def centroid(universe: np.ndarray, aggregated: np.ndarray) -> np.ndarray:
+    """Centroid of aggregated output memberships (last axis), NaN where nothing fired"""
+    total = aggregated.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, (aggregated * universe).sum(axis=-1) / total, np.nan)
+
+
+class FuzzyRuleBase:
+    """A declarative rule base from FUZZY_RULES, evaluated over whole arrays of inputs"""
+
+    def __init__(self, spec: Dict[str, Any], fuzzy_sets: Dict[str, Dict[str, tuple]], resolution: int = 101):
+        self.inputs = {name: fuzzy_sets[group] for name, group in spec["inputs"].items()}
+        self.defaults = spec.get("defaults", {})
+        self.rules = spec["rules"]
+        self.adjustments = spec.get("adjustments", [])
+        self.options = list(dict.fromkeys(rule["then"] for rule in self.rules))
+        self.option_of = [self.options.index(rule["then"]) for rule in self.rules]
+
+        output_sets = fuzzy_sets[spec.get("output", "Suitability")]
+        lo = min(a for a, _, _ in output_sets.values())
+        hi = max(c for _, _, c in output_sets.values())
+        self.universe = np.linspace(lo, hi, resolution)
+        self.output = fuzzify_array(self.universe, output_sets)
+
+    def _values(self, inputs: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        values = {}
+        for name in self.inputs:
+            value = inputs.get(name)
+            if value is None:
+                value = self.defaults.get(name, np.nan)
+            values[name] = np.asarray(value, dtype=float)
+        shape = np.broadcast_shapes(*(v.shape for v in values.values()))
+        return {name: np.broadcast_to(v, shape) for name, v in values.items()}
+
+    def fuzzify(self, inputs: Dict[str, Any]) -> Dict[str, Dict[str, np.ndarray]]:
+        """Fuzzify every input variable in one call each"""
+        values = self._values(inputs)
+        return {name: fuzzify_array(values[name], sets) for name, sets in self.inputs.items()}
+
+    def _strength(self, antecedents: Dict[str, str], memberships, tnorm: str) -> np.ndarray:
+        return _tnorm([memberships[name][label] for name, label in antecedents.items()], tnorm)
+
+    def evaluate(self, inputs: Dict[str, Any], tnorm: str = "min", defuzzify: bool = False,
+                 chunk_size: int = 65536) -> Dict[str, Any]:
+        """Score every option for every sample; arrays are aligned with the inputs"""
+        memberships = self.fuzzify(inputs)
+        strengths = [self._strength(rule["if"], memberships, tnorm) for rule in self.rules]
+        shape = strengths[0].shape if strengths else ()
+
+        scores = np.full((len(self.options),) + shape, -np.inf)
+        for rule, option, strength in zip(self.rules, self.option_of, strengths):
+            score = np.where(strength > 0, rule["base"] + rule["gain"] * strength, -np.inf)
+            np.maximum(scores[option], score, out=scores[option])
+
+        adjust_strengths = [self._strength(adj["if"], memberships, tnorm) for adj in self.adjustments]
+        offset = np.zeros(shape)
+        for adj, strength in zip(self.adjustments, adjust_strengths):
+            offset = offset + np.where(strength > 0, adj["offset"], 0.0)
+        scores = scores + offset
+
+        fired = np.isfinite(scores)
+        best = np.where(fired.any(axis=0), scores.argmax(axis=0), -1)
+        result = {
+            "memberships": memberships,
+            "options": self.options,
+            "scores": np.where(fired, scores, np.nan),
+            "recommended": best,
+            "score": np.where(best >= 0, scores.max(axis=0), np.nan),
+        }
+        if defuzzify:
+            result["suitability"] = self._suitability(strengths, adjust_strengths, best, tnorm, chunk_size)
+        return result
+
+    def _suitability(self, strengths, adjust_strengths, best, tnorm: str, chunk_size: int) -> np.ndarray:
+        """Centroid suitability of the recommended option (rule plus adjustment outputs)"""
+        flat_best = best.reshape(-1)
+        flat_rules = [s.reshape(-1) for s in strengths]
+        flat_adjust = [s.reshape(-1) for s in adjust_strengths]
+        out = np.full(flat_best.shape, np.nan)
+        for start in range(0, flat_best.size, chunk_size):
+            stop = start + chunk_size
+            aggregated = np.zeros((len(flat_best[start:stop]), self.universe.size))
+            parts = [(rule["suitability"], s[start:stop] * (flat_best[start:stop] == option))
+                     for rule, option, s in zip(self.rules, self.option_of, flat_rules)]
+            parts += [(adj["suitability"], s[start:stop]) for adj, s in zip(self.adjustments, flat_adjust)]
+            for label, strength in parts:
+                mu = self.output[label]
+                if tnorm == "min":
+                    implied = np.minimum(strength[:, None], mu[None, :])
+                else:
+                    implied = strength[:, None] * mu[None, :]
+                np.maximum(aggregated, implied, out=aggregated)
+            out[start:stop] = np.where(flat_best[start:stop] >= 0, centroid(self.universe, aggregated), np.nan)
+        return out.reshape(best.shape)
+
+    def recommend(self, inputs: Dict[str, float], decimals: Optional[int] = 2) -> Dict[str, Any]:
+        """Single-bird result in the fuzzy_recommend_* format, rounded at each step like before"""
+        memberships = {}
+        for name, degrees in self.fuzzify(inputs).items():
+            memberships[name] = {label: round(float(v), decimals) if decimals is not None else float(v)
+                                 for label, v in degrees.items()}
+
+        def _round(value):
+            return round(value, decimals) if decimals is not None else value
+
+        options = []
+        for rule in self.rules:
+            strength = min(memberships[name][label] for name, label in rule["if"].items())
+            if strength > 0:
+                options.append((rule["then"], _round(rule["base"] + rule["gain"] * strength)))
+        for adj in self.adjustments:
+            if min(memberships[name][label] for name, label in adj["if"].items()) > 0:
+                options = [(f, _round(s + adj["offset"])) for f, s in options]
+
+        if not options:
+            return {"error": "No fuzzy match found"}
+        result = {f"{name}_membership": degrees for name, degrees in memberships.items()}
+        result["options"] = options
+        result["recommended"] = max(options, key=lambda x: x[1])
+        return result
+
+
+def compile_fuzzy_rules(fuzzy_rules: Dict[str, Any], fuzzy_sets: Dict[str, Dict[str, tuple]]) -> Dict[str, FuzzyRuleBase]:
+    """Compile every rule base in FUZZY_RULES"""
+    return {name: FuzzyRuleBase(spec, fuzzy_sets) for name, spec in fuzzy_rules.items()}
+
+
+def fuzzy_engines() -> Dict[str, FuzzyRuleBase]:
+    """Compiled rule bases of the current knowledge base"""
+    return get_knowledge_base().fuzzy_engines
+
+
+def batch_response(engine: FuzzyRuleBase, result: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-ready view of evaluate() output, NaN as null"""
+    def _floats(values):
+        values = np.atleast_1d(values)
+        return np.where(np.isnan(values), None, values).tolist()
+
+    options = engine.options
+    response = {
+        "options": options,
+        "recommended": [options[i] if i >= 0 else None for i in np.atleast_1d(result["recommended"]).tolist()],
+        "score": _floats(result["score"]),
+    }
+    if "suitability" in result:
+        response["suitability"] = _floats(result["suitability"])
+    return response
+
+
+def fuzzy_recommend_feed(age_weeks: float, protein: float = None, cost: float = None):
+    """Fuzzy evaluation of feed suitability (rule base: FUZZY_RULES["Feed"])"""
+    return fuzzy_engines()["Feed"].recommend({"age": age_weeks})
+
+
+def fuzzy_recommend_broiler(age_weeks: float, protein: float = 22.0):
+    """Fuzzy recommendation for broiler feed phases (rule base: FUZZY_RULES["Broiler"])"""
+    return fuzzy_engines()["Broiler"].recommend({"age": age_weeks, "protein": protein})
+
+
+if __name__ == "__main__":
+    print(fuzzy_recommend_feed(7))   # 7-week chick
+    print(fuzzy_recommend_feed(10))  # 10-week grower
+    print(fuzzy_recommend_feed(25))  # 25-week layer
+    print(fuzzy_recommend_broiler(1))   # 1 week old chick
+    print(fuzzy_recommend_broiler(2.5)) # 2.5 weeks old
+    print(fuzzy_recommend_broiler(5))   # 5 weeks old
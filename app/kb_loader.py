@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_KB_DIR = os.path.join(os.path.dirname(__file__), "knowledge")
+MANIFEST = "manifest.yaml"
+SECTIONS = ("SEMANTICS", "CHICKEN_FRAMES", "LIFECYCLES", "INGREDIENT_FRAMES", "CALCIUM_REQUIREMENTS",
+            "RECIPE_FRAMES", "RULES", "DERIVED_RULES", "FUZZY_SETS", "FUZZY_RULES")
+# Sections a knowledge-base directory may leave out
+OPTIONAL_SECTIONS = {"DERIVED_RULES": []}
+
+
+class KnowledgeBaseError(ValueError):
+    """The knowledge-base files are missing, unreadable or fail validation"""
+
+
+class KnowledgeBase:
+    """Validated knowledge-base sections, as the same plain dicts/lists the engines always used"""
+
+    def __init__(self, sections: Dict[str, Any], version: str, digest: str):
+        self.sections = sections
+        self.version = version
+        self.digest = digest
+        for name in SECTIONS:
+            setattr(self, name, sections[name])
+
+    @property
+    def release(self) -> str:
+        """Manifest version plus content digest, e.g. 1.0.0-3f2a9c0d41be"""
+        return f"{self.version}-{self.digest}"
+
+
+def name_key(name: str) -> str:
+    """Lookup key for ingredient, feed and recipe names: case and spacing do not matter"""
+    return " ".join(str(name).lower().split())
+
+
+def parse_range(text: str) -> Tuple[float, float]:
+    """Parse "16-18%" into (16.0, 18.0) and "20%" into (20.0, 20.0)"""
+    parts = str(text).strip().rstrip("%").split("-")
+    lo, hi = float(parts[0]), float(parts[-1])
+    return (lo, hi) if lo <= hi else (hi, lo)
+
+
+def source_files(directory: str) -> List[str]:
+    """Knowledge-base files in a directory, manifest first"""
+    names = sorted(n for n in os.listdir(directory) if n.endswith((".yaml", ".yml", ".json")))
+    names.sort(key=lambda n: n != MANIFEST)
+    return [os.path.join(directory, n) for n in names]
+
+
+def source_signature(directory: str) -> Tuple:
+    """Cheap change detector: (name, mtime, size) of every source file"""
+    signature = []
+    for path in source_files(directory):
+        st = os.stat(path)
+        signature.append((os.path.basename(path), st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+def kb_directory(directory: Optional[str] = None) -> str:
+    """FEED_KB_DIR, or the knowledge directory shipped with the app"""
+    return directory or os.environ.get("FEED_KB_DIR", DEFAULT_KB_DIR)
+
+
+def _read_sources(directory: str) -> Tuple[List[Tuple[str, bytes]], str]:
+    """Raw bytes of every source file plus their combined content digest"""
+    digest = hashlib.sha1()
+    files = []
+    for path in source_files(directory):
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest.update(os.path.basename(path).encode() + b"\0" + raw)
+        files.append((path, raw))
+    return files, digest.hexdigest()[:12]
+
+
+def source_digest(directory: Optional[str] = None) -> str:
+    """Content digest of the knowledge-base files, without parsing or validating them"""
+    return _read_sources(kb_directory(directory))[1]
+
+
+def _normalize(sections: Dict[str, Any]) -> Dict[str, Any]:
+    """YAML has no tuples: restore (low, high) rule ranges and (a, b, c) fuzzy sets"""
+    for rule in sections["RULES"] + sections["DERIVED_RULES"]:
+        conditions = rule.get("if", {})
+        for key, value in conditions.items():
+            if isinstance(value, list):
+                conditions[key] = tuple(value)
+    for group in sections["FUZZY_SETS"].values():
+        for label, params in group.items():
+            group[label] = tuple(params)
+    return sections
+
+
+def load_knowledge_base(directory: Optional[str] = None) -> KnowledgeBase:
+    """Read, merge and validate every YAML/JSON file of the knowledge base"""
+    # Parsing and validation are only needed when no current snapshot exists
+    import yaml
+    from pydantic import ValidationError
+    from app.kb_schema import KnowledgeBaseDocument
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # libyaml when available
+    directory = kb_directory(directory)
+    document: Dict[str, Any] = {}
+    try:
+        files, digest = _read_sources(directory)
+        for path, raw in files:
+            data = json.loads(raw) if path.endswith(".json") else yaml.load(raw, Loader=loader)
+            if not isinstance(data, dict):
+                raise KnowledgeBaseError(f"{path} must map section names to their contents")
+            for key, value in data.items():
+                if key in document:
+                    raise KnowledgeBaseError(f"{key} is defined twice (again in {path})")
+                document[key] = value
+    except (OSError, yaml.YAMLError, json.JSONDecodeError) as e:
+        raise KnowledgeBaseError(f"Cannot read knowledge base in {directory}: {e}") from e
+
+    try:
+        KnowledgeBaseDocument.model_validate(document)
+    except ValidationError as e:
+        raise KnowledgeBaseError(f"Invalid knowledge base in {directory}:\n{e}") from e
+
+    sections = _normalize({name: document[name] if name in document else OPTIONAL_SECTIONS[name]
+                           for name in SECTIONS})
+    return KnowledgeBase(sections, str(document["version"]), digest)
@@ -0,0 +1,161 @@
+# Schema of the knowledge-base files (see app/knowledge). Frames allow extra
+# fields so new attributes need no code change.
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+from app.facts import FACT_ENUMS
+from app.kb_loader import name_key
+
+
+class ChickenFrame(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    Age_Stage: Dict[str, str]
+    Primary_Goal: str
+    Recommended_Feed_Type: str
+    Protein_Requirement_DCP_Range: Dict[str, str]
+    Daily_Feed_Consumption_g: float
+    Recipe: Optional[str] = None        # RECIPE_FRAMES entry fed during this stage
+
+
+class Lifecycle(BaseModel):
+    types: List[str]                    # flock Types that follow this lifecycle
+    stages: List[str]                   # CHICKEN_FRAMES, youngest first
+
+
+class IngredientFrame(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    Type: str
+    Aliases: List[str] = []             # other names recipes use for this ingredient
+    CP: float = Field(alias="CP%", ge=0, le=100)
+    Price_per_kg: float = Field(ge=0)
+    Ca: float = Field(0.0, alias="Ca%", ge=0, le=100)
+    Min_Inclusion: float = Field(0.0, alias="Min_Inclusion%", ge=0, le=100)
+    Max_Inclusion: float = Field(100.0, alias="Max_Inclusion%", ge=0, le=100)
+
+
+class RecipeFrame(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    Target_Type: str
+    Target_DCP: str
+    Feeds: List[str] = []               # RULES "Recommend" names this recipe makes
+    Ingredients: Dict[str, float]
+
+
+class Rule(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    name: str
+    priority: Optional[int] = None
+    conditions: Dict[str, Any] = Field(alias="if")
+    then: Dict[str, Any] = {}
+
+    @field_validator("conditions")
+    @classmethod
+    def _ranges_are_pairs(cls, conditions: Dict[str, Any]) -> Dict[str, Any]:
+        for key, value in conditions.items():
+            if isinstance(value, (list, tuple)):
+                if len(value) != 2 or not all(isinstance(v, (int, float)) for v in value):
+                    raise ValueError(f"range condition {key!r} must be [low, high]")
+            enum = FACT_ENUMS.get(key)
+            if enum is not None and value not in {member.value for member in enum}:
+                # Facts are canonicalized on the way in, so any other spelling could never match
+                raise ValueError(f"condition {key}: {value!r} is not one of {', '.join(m.value for m in enum)}")
+        return conditions
+
+
+class DerivedRule(Rule):
+    asserts: Dict[str, Any] = Field({}, alias="assert")   # facts added to working memory
+
+
+class FuzzyRule(BaseModel):
+    conditions: Dict[str, str] = Field(alias="if")
+    then: str
+    base: float
+    gain: float
+    suitability: str
+
+
+class FuzzyAdjustment(BaseModel):
+    conditions: Dict[str, str] = Field(alias="if")
+    offset: float
+    suitability: str
+
+
+class FuzzyRuleBaseSpec(BaseModel):
+    inputs: Dict[str, str]
+    output: str = "Suitability"
+    defaults: Dict[str, float] = {}
+    rules: List[FuzzyRule]
+    adjustments: List[FuzzyAdjustment] = []
+
+
+class KnowledgeBaseDocument(BaseModel):
+    version: str
+    SEMANTICS: Dict[str, Any]
+    CHICKEN_FRAMES: Dict[str, ChickenFrame]
+    LIFECYCLES: Dict[str, Lifecycle]
+    INGREDIENT_FRAMES: Dict[str, IngredientFrame]
+    CALCIUM_REQUIREMENTS: Dict[str, str]
+    RECIPE_FRAMES: Dict[str, RecipeFrame]
+    RULES: List[Rule]
+    DERIVED_RULES: List[DerivedRule] = []
+    FUZZY_SETS: Dict[str, Dict[str, Tuple[float, float, float]]]
+    FUZZY_RULES: Dict[str, FuzzyRuleBaseSpec]
+
+    @model_validator(mode="after")
+    def _references_resolve(self) -> "KnowledgeBaseDocument":
+        names = Counter(rule.name for rule in self.RULES + self.DERIVED_RULES)
+        duplicates = sorted(n for n, count in names.items() if count > 1)
+        if duplicates:
+            raise ValueError(f"duplicate rule names: {', '.join(duplicates)}")
+        seen_types = set()
+        for name, lifecycle in self.LIFECYCLES.items():
+            for stage in lifecycle.stages:
+                frame = self.CHICKEN_FRAMES.get(stage)
+                if frame is None:
+                    raise ValueError(f"LIFECYCLES[{name!r}] has unknown stage {stage!r}")
+                if frame.Recipe is not None and frame.Recipe not in self.RECIPE_FRAMES:
+                    raise ValueError(f"CHICKEN_FRAMES[{stage!r}] names unknown recipe {frame.Recipe!r}")
+            repeated = seen_types.intersection(lifecycle.types)
+            if repeated:
+                raise ValueError(f"flock types in more than one lifecycle: {', '.join(sorted(repeated))}")
+            seen_types.update(lifecycle.types)
+        ingredients: Dict[str, str] = {}
+        for name, frame in self.INGREDIENT_FRAMES.items():
+            for alias in [name] + frame.Aliases:
+                other = ingredients.setdefault(name_key(alias), name)
+                if other != name:
+                    raise ValueError(f"ingredient name {alias!r} is used by both {other!r} and {name!r}")
+        feeds: Dict[str, str] = {}
+        for name, recipe in self.RECIPE_FRAMES.items():
+            unknown = [i for i in recipe.Ingredients if name_key(i) not in ingredients]
+            if unknown:
+                raise ValueError(f"RECIPE_FRAMES[{name!r}] uses ingredients with no frame or alias: "
+                                 f"{', '.join(unknown)}")
+            if sum(recipe.Ingredients.values()) <= 0:
+                raise ValueError(f"RECIPE_FRAMES[{name!r}] has no ingredients")
+            for feed in recipe.Feeds:
+                other = feeds.setdefault(name_key(feed), name)
+                if other != name:
+                    raise ValueError(f"feed {feed!r} is made by both {other!r} and {name!r}")
+        for base_name, spec in self.FUZZY_RULES.items():
+            for variable, group in list(spec.inputs.items()) + [("output", spec.output)]:
+                if group not in self.FUZZY_SETS:
+                    raise ValueError(f"FUZZY_RULES[{base_name!r}] uses unknown fuzzy set group {group!r}")
+            for rule in list(spec.rules) + list(spec.adjustments):
+                for variable, label in rule.conditions.items():
+                    if variable not in spec.inputs or label not in self.FUZZY_SETS[spec.inputs[variable]]:
+                        raise ValueError(f"FUZZY_RULES[{base_name!r}] has unknown condition {variable}={label}")
+                if rule.suitability not in self.FUZZY_SETS[spec.output]:
+                    raise ValueError(f"FUZZY_RULES[{base_name!r}] has unknown suitability {rule.suitability!r}")
+        return self
+
+
+class TenantOverlayDocument(BaseModel):
+    """A tenant's delta over the shared knowledge base (see app.tenants); other sections are not allowed"""
+    model_config = ConfigDict(extra="forbid")
+    INGREDIENT_FRAMES: Dict[str, Dict[str, Any]] = {}   # fields merged into the shared frame, or a new frame
+    RECIPE_FRAMES: Dict[str, RecipeFrame] = {}          # whole recipes, replacing or added
+    RULES: List[Rule] = []                              # replace the shared rule of the same name, or added
+    REMOVE_RULES: List[str] = []                        # shared rule names this tenant does not use
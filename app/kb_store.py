@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+from app.compiled_kb import CompiledKnowledgeBase, load_compiled
+from app.kb_loader import KnowledgeBaseError, kb_directory, source_signature
+
+logger = logging.getLogger(__name__)
+
+
+class KnowledgeBaseStore:
+    """Holds the knowledge base being served and swaps in new releases atomically.
+
+    Readers take `current` once per request and keep using that object, so a
+    reload never mixes two releases inside one request. A release that fails
+    validation is rejected and the previous one keeps serving.
+    """
+
+    def __init__(self, directory: Optional[str] = None, snapshot_path: Optional[str] = None):
+        self.directory = kb_directory(directory)
+        self.snapshot_path = snapshot_path if snapshot_path is not None else os.environ.get("FEED_KB_SNAPSHOT")
+        self.last_error: Optional[str] = None
+        self._current: Optional[CompiledKnowledgeBase] = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[CompiledKnowledgeBase], None]] = []
+        self._pollers: List[Callable[[], Any]] = []
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def current(self) -> CompiledKnowledgeBase:
+        kb = self._current
+        if kb is None:
+            with self._lock:
+                if self._current is None:
+                    self._signature = source_signature(self.directory)
+                    self._current = self._build()
+                kb = self._current
+        return kb
+
+    def add_listener(self, callback: Callable[[CompiledKnowledgeBase], None]) -> None:
+        """Call callback(new_kb) after every swap"""
+        self._listeners.append(callback)
+
+    def add_poller(self, callback: Callable[[], Any]) -> None:
+        """Call callback() on every watcher tick too, e.g. to pick up edited tenant overlays"""
+        self._pollers.append(callback)
+
+    @contextmanager
+    def _snapshot_lock(self):
+        """Serialize compile-and-publish between workers sharing one snapshot file"""
+        if not self.snapshot_path or fcntl is None:
+            yield
+            return
+        with open(self.snapshot_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _build(self) -> CompiledKnowledgeBase:
+        # The first worker through the lock compiles and publishes; the others find
+        # a current snapshot when they get the lock and only load it
+        with self._snapshot_lock():
+            return load_compiled(self.snapshot_path, self.directory)
+
+    def reload(self) -> bool:
+        """Load, validate and compile the files, then swap; False when the release is unchanged"""
+        signature = source_signature(self.directory)
+        try:
+            kb = self._build()
+        except KnowledgeBaseError as e:
+            self.last_error = str(e)
+            serving = self._current.version if self._current is not None else None
+            logger.error("Knowledge-base reload rejected, still serving %s: %s", serving, e)
+            raise
+        self.last_error = None
+        with self._lock:
+            self._signature = signature
+            if self._current is not None and kb.version == self._current.version:
+                return False
+            old = self._current
+            self._current = kb
+        logger.info("Knowledge base %s -> %s", old.version if old else None, kb.version)
+        for callback in self._listeners:
+            callback(kb)
+        return True
+
+    def poll(self) -> bool:
+        """Reload when the files changed since the last load; True when a new release was swapped in"""
+        try:
+            signature = source_signature(self.directory)
+        except OSError as e:
+            self.last_error = str(e)
+            return False
+        if signature == self._signature:
+            return False
+        try:
+            return self.reload()
+        except KnowledgeBaseError:
+            self._signature = signature  # don't re-validate the same broken files every tick
+            return False
+
+    def start_watching(self, interval: float) -> None:
+        """Poll the knowledge-base directory every `interval` seconds in a daemon thread"""
+        if self._watcher is not None:
+            return
+        self.current  # load before the first tick so the watcher only sees real edits
+        self._stop.clear()
+
+        def _watch():
+            while not self._stop.wait(interval):
+                for poll in [self.poll] + self._pollers:
+                    try:
+                        poll()
+                    except Exception:
+                        logger.exception("Knowledge-base watcher error")
+
+        self._watcher = threading.Thread(target=_watch, name="kb-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+
+STORE = KnowledgeBaseStore()
@@ -1,17 +1,112 @@
-from fastapi import FastAPI
-from app.data_models import FeedQuery
-from app.inference_engine import apply_rules, get_feed_recipe
+import os
+from contextlib import asynccontextmanager
+from datetime import date
+from functools import partial
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from starlette.concurrency import run_in_threadpool
+from app.data_models import FeedQuery, ChainQuery, FuzzyBatchQuery, FormulationQuery, PriceUpdate, ProjectionQuery, SweepQuery
+from app.compiled_kb import get_knowledge_base
+from app.kb_loader import KnowledgeBaseError
+from app.kb_store import STORE
+from app.cache import ResponseCache
+from app.audit import AUDIT
+from app import pool
+from app.pool import POOL, PoolBusy
+from app.tenants import TENANTS, UnknownTenant
+from app import metrics
+from app.ui import web
+
+# NumPy-backed modules (batch, fuzzy, formulation, recipe figures) are imported
+# inside their handlers so that starting a worker only loads the crisp engine.
+# Light handlers are async and run on the event loop; heavy ones hand their work
+# to app.pool (a process pool under app.serve, the threadpool otherwise).
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # FEED_KB_WATCH=<seconds> polls the knowledge-base files and hot-swaps valid edits
+    interval = float(os.environ.get("FEED_KB_WATCH", "0"))
+    POOL.start()  # forks, so before any other thread starts
+    if interval > 0:
+        STORE.start_watching(interval)
+    AUDIT.start()
+    metrics.SHARED.start(RESPONSE_CACHE.stats)  # under app.serve, /metrics sums every worker's counts
+    yield
+    metrics.SHARED.stop()
+    AUDIT.stop()
+    STORE.stop_watching()
+    POOL.stop()
+
+
+app = FastAPI(title="Chicken Feed Expert System", lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Results keyed on normalized facts; most traffic is a few hundred distinct flocks
+RESPONSE_CACHE = ResponseCache.from_env(get_knowledge_base().version)
+STORE.add_listener(lambda kb: RESPONSE_CACHE.set_version(kb.version))
+
+
+@app.exception_handler(PoolBusy)
+async def pool_busy(request: Request, exc: PoolBusy):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
 
-app = FastAPI(title="Chicken Feed Expert System")
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Welcome to the Chicken Feed Expert System API"}
 
+async def _tenant_kb(tenant: str):
+    """A tenant's compiled knowledge base (app.tenants); the first request of a tenant builds it off the loop"""
+    try:
+        kb = TENANTS.cached(tenant)
+        if kb is None:
+            kb = await run_in_threadpool(TENANTS.get, tenant)
+    except UnknownTenant:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant: {tenant}")
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=503, detail=f"Knowledge base of tenant {tenant} is invalid: {e}")
+    return kb
+
+
+async def _cache_get(key):
+    """The shared SQLite backend (FEED_CACHE_PATH) waits on disk and on other workers' writes,
+    so with one configured the cache is read and written from the threadpool, off the loop"""
+    if RESPONSE_CACHE.backend is None:
+        return RESPONSE_CACHE.get(key)
+    return await run_in_threadpool(RESPONSE_CACHE.get, key)
+
+
+async def _cache_put(key, value) -> None:
+    if RESPONSE_CACHE.backend is None:
+        RESPONSE_CACHE.put(key, value)
+    else:
+        await run_in_threadpool(RESPONSE_CACHE.put, key, value)
+
+
 @app.post("/recommend")
-def recommend_feed(query: FeedQuery):
+async def recommend_feed(query: FeedQuery, trace: bool = False, tenant: Optional[str] = None):
+    """?trace=true adds per-stage timings and a condition-by-condition rule trace (bypasses the cache);
+    ?tenant= answers from that tenant's overlay of the knowledge base"""
+    timer = metrics.StageTimer()
     facts = query.dict()
-    recommendations = apply_rules(facts)
+    # One release for the whole request, even if a reload lands mid-way
+    kb = get_knowledge_base() if tenant is None else await _tenant_kb(tenant)
+    key = kb.rule_index.normalize(facts)
+    if key is not None:
+        key = (kb.version, key)
+    cached = await _cache_get(key) if key is not None and not trace else None
+    timer.stage("cache")
+    if cached is not None:
+        AUDIT.record("recommend", kb, facts, cached.get("fired", ()), cached["recommendations"])
+        return _with_analysis({"facts": facts, "recommendations": cached["recommendations"],
+                               "recipe": cached["recipe"]}, kb)
+
+    ids = metrics.match(kb, facts)
+    recommendations = [kb.rules[i].get("then", {}) for i in ids]
+    fired = [kb.rules[i]["name"] for i in ids]
+    timer.stage("inference")
 
     # Attach feed formulation if available
     feed_type = None
@@ -20,5 +115,291 @@ def recommend_feed(query: FeedQuery):
             feed_type = rec["Recommend"]
             break
 
-    recipe = get_feed_recipe(feed_type) if feed_type else {}
-    return {"facts": facts, "recommendations": recommendations, "recipe": recipe}
+    recipe = kb.get_recipe(feed_type) if feed_type else {}
+    timer.stage("recipe")
+    if key is not None:
+        await _cache_put(key, {"recommendations": recommendations, "recipe": recipe, "fired": fired})
+    AUDIT.record("recommend", kb, facts, fired, recommendations)
+    response = _with_analysis({"facts": facts, "recommendations": recommendations, "recipe": recipe}, kb)
+    if trace:
+        response["trace"] = {"knowledge_base": kb.version, "stages_ms": timer.as_ms(),
+                             "rules": metrics.trace_rules(kb.rule_index, facts)}
+    return response
+
+
+def _with_analysis(response: dict, kb) -> dict:
+    """Achieved CP%, cost per kg and batch cost of the recipe at the live prices (not cached,
+    so a price update shows up at once)"""
+    from app.recipe_matrix import add_analysis
+
+    return add_analysis([response], kb)[0]
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return RESPONSE_CACHE.stats()
+
+
+@app.get("/audit/stats")
+async def audit_stats():
+    return AUDIT.stats()
+
+
+@app.get("/pool/stats")
+async def pool_stats():
+    return POOL.stats()
+
+
+@app.get("/tenants/stats")
+async def tenant_stats():
+    return TENANTS.stats()
+
+
+def _audit_log():
+    if not AUDIT.enabled:
+        raise HTTPException(status_code=404, detail="The audit log is off (set FEED_AUDIT_PATH)")
+    return AUDIT
+
+
+@app.get("/audit/rules")
+def audit_rule_rates(since: Optional[date] = None, until: Optional[date] = None, kb_version: Optional[str] = None):
+    """Weekly fire rate of every rule over the recommendations issued (until is exclusive)"""
+    return _audit_log().rule_fire_rates(since, until, kb_version)
+
+
+@app.get("/audit/types")
+def audit_types(since: Optional[date] = None, until: Optional[date] = None, kb_version: Optional[str] = None):
+    """Recommendations issued per flock Type, split by recommended feed"""
+    return _audit_log().recommendations_by_type(since, until, kb_version)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text format: rule counters, stage/route latency, batch sizes, cache stats
+    (of all the workers under app.serve, see metrics.SharedMetrics)"""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (FEED_METRICS=0)")
+    text = metrics.render(RESPONSE_CACHE.stats(), get_knowledge_base().version)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/kb/version")
+async def kb_version(tenant: Optional[str] = None):
+    kb = get_knowledge_base() if tenant is None else await _tenant_kb(tenant)
+    return {
+        "version": kb.version,
+        "rules": len(kb.rules),
+        "directory": STORE.directory,
+        "last_error": STORE.last_error,
+    }
+
+
+@app.post("/kb/reload")
+def kb_reload():
+    """Reload the knowledge-base files now; an invalid edit is rejected and the current release kept"""
+    try:
+        reloaded = STORE.reload()
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    TENANTS.clear()  # overlays are re-read on each tenant's next request
+    return {"reloaded": reloaded, "version": get_knowledge_base().version}
+
+
+@app.post("/recommend/batch")
+async def recommend_feed_batch(queries: List[FeedQuery]):
+    """Same output as one /recommend call per query, evaluated column-wise in one pass"""
+    from app.recipe_matrix import PRICES
+
+    kb = get_knowledge_base()
+    # Scoring, recipe analysis and the JSON body are all built by the job, off the event loop
+    body, rows, fires, audit = await POOL.run(pool.score_records, kb.version, [query.record() for query in queries],
+                                              AUDIT.enabled, PRICES.live(kb)[1])
+    await run_in_threadpool(_record_batch, kb, rows, fires, audit)
+    return Response(body, media_type="application/json")
+
+
+def _record_batch(kb, rows: int, fires: List[int], audit: Optional[tuple]) -> None:
+    if rows:
+        metrics.count_batch(kb, "recommend_batch", rows, fires)
+    if audit is not None:
+        results, fired = audit
+        AUDIT.record_many("recommend_batch", kb, [r["facts"] for r in results], fired, results)
+
+
+@app.post("/recommend/chain")
+def recommend_feed_chain(query: ChainQuery):
+    """Forward chaining: derived facts, and the agenda's pick (priority, then specificity) decides
+
+    Each entry of Changes is applied to the same working memory in turn, so only
+    the rules on the changed facts are re-evaluated; one result per step.
+    """
+    from pydantic import ValidationError
+    from app.forward_chaining import Session, rule_network
+
+    kb = get_knowledge_base()
+    facts = query.Facts.dict()
+    session = Session(rule_network(kb), facts)
+    result = session.result(kb.get_recipe)
+    AUDIT.record("recommend_chain", kb, result["facts"], result["fired"], result["recommendations"])
+    response = {"knowledge_base": kb.version, **_with_analysis(result, kb), "what_if": []}
+    for step, change in enumerate(query.Changes, 1):
+        unknown = [key for key in change if key not in FeedQuery.model_fields]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Changes[{step - 1}]: unknown facts: {', '.join(unknown)}")
+        try:
+            facts = FeedQuery(**{**facts, **change}).dict()
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Changes[{step - 1}]: {e.errors()[0]['msg']}")
+        tests = session.tests
+        session.update({key: facts[key] for key in change})
+        response["what_if"].append({**_with_analysis(session.result(kb.get_recipe), kb),
+                                    "condition_tests": session.tests - tests})
+    return response
+
+
+@app.post("/sweep")
+def sweep_outcomes(query: SweepQuery):
+    """What-if sweep: regions of identical outcome along Axes, cut at the rule boundaries
+
+    Points are answered from the same precomputed cells with one bisect per axis.
+    """
+    from app.sweep import partition
+
+    kb = get_knowledge_base()
+    try:
+        cells = partition(query.Facts, query.Axes, query.Ranges, kb=kb)
+    except ValueError as e:  # an axis no rule tests, bad range, too many cells
+        raise HTTPException(status_code=422, detail=str(e))
+    return JSONResponse(cells.as_response(kb, query.Points))
+
+
+@app.post("/recommend/stream")
+async def recommend_feed_stream(request: Request, format: Optional[str] = None,
+                                chunk_size: int = Query(1000, ge=1, le=50000)):
+    """Score a CSV or NDJSON upload of FeedQuery rows, streaming one NDJSON result per row
+
+    The body is parsed line by line and evaluated in chunks, so memory stays flat
+    however large the upload is. Rows that fail validation come back as
+    {"row": n, "error": ...} in their place.
+    """
+    from app.bulk import FORMATS, format_for, stream_scores, upload_stream_response
+
+    if format is not None and format not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {FORMATS}")
+    fmt = format or format_for(request.headers.get("content-type"))
+    kb = get_knowledge_base()  # the whole upload is scored against one release
+    return upload_stream_response(stream_scores(request.stream(), kb, fmt, chunk_size),
+                                  media_type="application/x-ndjson",
+                                  headers={"X-Knowledge-Base-Version": kb.version})
+
+
+@app.websocket("/ws/telemetry")
+async def telemetry_stream(websocket: WebSocket):
+    """Live fact deltas for many flocks in, recommendation changes out (see app.telemetry)"""
+    from app import telemetry
+
+    await telemetry.serve(websocket)
+
+
+@app.post("/fuzzy/batch")
+async def fuzzy_batch(query: FuzzyBatchQuery):
+    """Evaluate a fuzzy rule base over arrays of inputs in one vectorized pass"""
+    from app.fuzzy_engine import TNORMS
+
+    kb = get_knowledge_base()
+    if query.rule_base not in kb.source.FUZZY_RULES:
+        raise HTTPException(status_code=404, detail=f"Unknown fuzzy rule base: {query.rule_base}")
+    if query.tnorm not in TNORMS:
+        raise HTTPException(status_code=422, detail=f"tnorm must be one of {TNORMS}")
+    try:
+        result = await POOL.run(pool.fuzzy_batch, kb.version, query.rule_base, query.inputs,
+                                query.tnorm, query.defuzzify)
+    except ValueError as e:  # inputs of different lengths
+        raise HTTPException(status_code=422, detail=str(e))
+    return JSONResponse(result)
+
+
+@app.post("/formulate")
+async def formulate_feed(query: FormulationQuery):
+    """Least-cost batch for a protein target from INGREDIENT_FRAMES"""
+    job = partial(pool.formulate, get_knowledge_base().version, query.Target_DCP, query.Batch_kg,
+                  calcium=query.Calcium, target_type=query.Target_Type, prices=query.Prices,
+                  ingredients=query.Ingredients)
+    try:
+        return await POOL.run(job)
+    except ValueError as e:  # InfeasibleFormulation or an unparsable range
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/formulate/recipes")
+async def reformulate_recipes(update: PriceUpdate):
+    """Re-optimize every RECIPE_FRAMES target after a price change (warm-started)"""
+    return await POOL.run(pool.reformulate_recipes, get_knowledge_base().version, update.Prices)
+
+
+@app.get("/recipes/analysis")
+def recipes_analysis(batch_kg: Optional[float] = Query(None, gt=0)):
+    """Achieved CP%/Ca%, cost per kg and batch cost of every recipe at the live prices"""
+    from app.recipe_matrix import PRICES, recipe_matrix
+
+    kb = get_knowledge_base()
+    if batch_kg is None:
+        figures = PRICES.figures(kb)
+    else:
+        figures = recipe_matrix(kb).figures(PRICES.prices(kb), batch_kg)
+    return JSONResponse({"knowledge_base": kb.version, "price_revision": PRICES.revision, "recipes": figures})
+
+
+@app.get("/prices")
+def live_prices():
+    from app.recipe_matrix import PRICES, recipe_matrix
+
+    kb = get_knowledge_base()
+    prices = PRICES.prices(kb)
+    return {"price_revision": PRICES.revision, "overrides": PRICES.overrides,
+            "prices": dict(zip(recipe_matrix(kb).ingredients, prices.tolist()))}
+
+
+@app.post("/prices")
+def update_prices(update: PriceUpdate):
+    """Price feed: merge new ingredient prices and recompute every recipe's figures in one pass"""
+    from app.recipe_matrix import PRICES
+
+    kb = get_knowledge_base()
+    try:
+        revision = PRICES.update(update.Prices, kb)
+    except ValueError as e:  # unknown ingredient
+        raise HTTPException(status_code=422, detail=str(e))
+    return JSONResponse({"price_revision": revision, "recipes": PRICES.figures(kb)})
+
+
+@app.delete("/prices")
+def reset_prices():
+    """Back to the INGREDIENT_FRAMES prices"""
+    from app.recipe_matrix import PRICES
+
+    return {"price_revision": PRICES.reset()}
+
+
+@app.post("/projection")
+async def project_demand(query: ProjectionQuery):
+    """Day-by-day feed, ingredient and cost demand of a set of flocks, with reorder dates"""
+    from app.recipe_matrix import PRICES
+
+    if query.Granularity not in ("day", "week"):
+        raise HTTPException(status_code=422, detail="Granularity must be 'day' or 'week'")
+    flocks = query.Flocks
+    kb = get_knowledge_base()
+    revision, prices = PRICES.live(kb)
+    try:
+        response = await POOL.run(pool.project, kb.version, [f.Type for f in flocks],
+                                  [f.Age_Weeks for f in flocks], [f.Birds for f in flocks],
+                                  round(query.Horizon_Weeks * 7), prices, revision, query.Start_Date,
+                                  query.Granularity, query.Stock, query.Lead_Time_Days)
+        return JSONResponse(response)
+    except ValueError as e:  # unknown flock type or stock name
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+# Server-rendered pages (/ui) and static assets (/static); Streamlit is optional
+web.mount(app)
@@ -0,0 +1,430 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+from app.rule_index import LT, parse_percent
+
+logger = logging.getLogger(__name__)
+
+# FEED_METRICS=0 turns all instrumentation off (and /metrics with it)
+ENABLED = os.environ.get("FEED_METRICS", "1").lower() not in ("0", "false", "no", "off")
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+
+# perf_counter() when the current request reached the app, set by MetricsMiddleware
+REQUEST_START: ContextVar[Optional[float]] = ContextVar("request_start", default=None)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def empty(self) -> "Counter":
+        return Counter(self.name, self.help, self.labels)
+
+    def state(self) -> list:
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+    def merge(self, state: list) -> None:
+        """Add the counts of another process's state()"""
+        for key, value in state:
+            self.inc(*key, amount=value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels"""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def empty(self) -> "Histogram":
+        return Histogram(self.name, self.help, self.labels, self.buckets)
+
+    def state(self) -> list:
+        with self._lock:
+            return [[list(k), list(v[0]), v[1], v[2]] for k, v in self._series.items()]
+
+    def merge(self, state: list) -> None:
+        """Add the counts of another process's state()"""
+        with self._lock:
+            for key, counts, total, count in state:
+                series = self._series.setdefault(tuple(key), [[0] * (len(self.buckets) + 1), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else repr(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class RuleCounters:
+    """Evaluation and fire counts per rule name, kept across knowledge-base reloads"""
+
+    def __init__(self):
+        self._by_name: Dict[str, List[int]] = {}   # name -> [evaluated, fired]
+        self._slots: Dict[str, List[List[int]]] = {}  # kb rules_version -> entries in RULES order
+        self._lock = threading.Lock()
+
+    def slots(self, kb) -> List[List[int]]:
+        slots = self._slots.get(kb.rules_version)
+        if slots is None:
+            with self._lock:
+                slots = [self._by_name.setdefault(rule.get("name", f"#{i}"), [0, 0])
+                         for i, rule in enumerate(kb.rules)]
+                self._slots[kb.rules_version] = slots
+        return slots
+
+    def forget(self, version: str) -> None:
+        """Drop the slots of a release no longer served (the counts stay)"""
+        with self._lock:
+            self._slots.pop(version, None)
+
+    def count(self, kb, evaluated: Iterable[int], fired: Iterable[int]) -> None:
+        slots = self.slots(kb)
+        with self._lock:
+            for i in evaluated:
+                slots[i][0] += 1
+            for i in fired:
+                slots[i][1] += 1
+
+    def count_columns(self, kb, rows: int, fired_per_rule: List[int]) -> None:
+        """Batch evaluation checks every rule against every row"""
+        slots = self.slots(kb)
+        with self._lock:
+            for entry, fired in zip(slots, fired_per_rule):
+                entry[0] += rows
+                entry[1] += fired
+
+    def state(self) -> Dict[str, List[int]]:
+        with self._lock:
+            return {name: list(v) for name, v in self._by_name.items()}
+
+    def merge(self, state: Dict[str, List[int]]) -> None:
+        """Add the counts of another process's state()"""
+        with self._lock:
+            for name, (evaluated, fired) in state.items():
+                entry = self._by_name.setdefault(name, [0, 0])
+                entry[0] += evaluated
+                entry[1] += fired
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((name, list(v)) for name, v in self._by_name.items())
+        lines = ["# HELP feed_rule_evaluations_total Times a rule's conditions were checked",
+                 "# TYPE feed_rule_evaluations_total counter"]
+        lines += [f'feed_rule_evaluations_total{{rule="{_escape(n)}"}} {v[0]}' for n, v in items]
+        lines += ["# HELP feed_rule_fires_total Times a rule's conditions all held",
+                  "# TYPE feed_rule_fires_total counter"]
+        lines += [f'feed_rule_fires_total{{rule="{_escape(n)}"}} {v[1]}' for n, v in items]
+        return lines
+
+
+RULE_COUNTERS = RuleCounters()
+THRESHOLD_PARSE_FAILURES = Counter(
+    "feed_threshold_parse_failures_total",
+    "Requests whose fact could not be read as a number for a \"<N%\" rule", ("key",))
+STAGE_SECONDS = Histogram("feed_stage_seconds", "Time per /recommend stage", ("stage",))
+REQUEST_SECONDS = Histogram("feed_request_seconds", "Request latency by route", ("path",))
+BATCH_ROWS = Histogram("feed_batch_rows", "Rows per batch evaluation", ("endpoint",), SIZE_BUCKETS)
+METRICS = (THRESHOLD_PARSE_FAILURES, STAGE_SECONDS, REQUEST_SECONDS, BATCH_ROWS)
+CACHE_FIELDS = (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"),
+                ("shared_hits", "counter"), ("entries", "gauge"))
+
+
+class SharedMetrics:
+    """Counts of all the workers of app.serve, for a /metrics that any one of them answers
+
+    Each worker writes its own counts to <directory>/<pid>.json every interval
+    seconds (and on shutdown); /metrics adds up every file, so the totals are
+    at most one interval behind for the other workers. Files of workers that
+    exited are kept, as their requests still count; only the cache-entries
+    gauge is limited to live workers.
+    """
+
+    def __init__(self, directory: Optional[str], interval: float = 5.0):
+        self.directory = directory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "SharedMetrics":
+        """FEED_METRICS_DIR (app.serve sets one; unset keeps /metrics per process) and FEED_METRICS_INTERVAL"""
+        return cls(os.environ.get("FEED_METRICS_DIR") or None,
+                   float(os.environ.get("FEED_METRICS_INTERVAL", "5")))
+
+    @property
+    def enabled(self) -> bool:
+        return ENABLED and self.directory is not None
+
+    def write(self, cache_stats: Optional[Dict[str, Any]] = None) -> None:
+        """This worker's counts, replacing its previous file atomically"""
+        state = {"rules": RULE_COUNTERS.state(), "metrics": {m.name: m.state() for m in METRICS},
+                 "cache": {field: cache_stats[field] for field, _ in CACHE_FIELDS} if cache_stats else None}
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    def collect(self) -> Dict[int, Dict[str, Any]]:
+        """pid -> counts of every worker that wrote a file"""
+        states = {}
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext != ".json" or not stem.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    states[int(stem)] = json.load(f)
+            except (OSError, ValueError):  # removed meanwhile
+                continue
+        return states
+
+    def clear(self) -> None:
+        """Remove the files of an earlier run"""
+        for pid in self.collect():
+            try:
+                os.remove(os.path.join(self.directory, f"{pid}.json"))
+            except FileNotFoundError:
+                pass
+
+    def start(self, cache_stats: Callable[[], Dict[str, Any]]) -> None:
+        if not self.enabled or self._writer is not None:
+            return
+        self._stop.clear()
+
+        def _write():
+            while True:
+                stopping = self._stop.wait(self.interval)
+                try:
+                    self.write(cache_stats())
+                except OSError as e:
+                    logger.warning("Cannot write metrics to %s: %s", self.directory, e)
+                if stopping:
+                    return
+
+        self._writer = threading.Thread(target=_write, name="metrics-writer", daemon=True)
+        self._writer.start()
+
+    def stop(self) -> None:
+        if self._writer is not None:
+            self._stop.set()
+            self._writer.join()
+            self._writer = None
+
+
+SHARED = SharedMetrics.from_env()
+
+
+def match(kb, facts: Dict[str, Any]) -> List[int]:
+    """kb.rule_index.match_ids, counting rule evaluations, fires and threshold parse failures"""
+    index = kb.rule_index
+    if not ENABLED:
+        return index.match_ids(facts)
+    candidates = index.candidate_ids(facts)
+    ids = index.match_ids(facts, candidates)
+    RULE_COUNTERS.count(kb, candidates, ids)
+    for key in index.threshold_keys:
+        if key in facts and facts[key] is not None and parse_percent(facts[key]) is None:
+            if any(check[0] == LT and check[1] == key for i in candidates for check in index.compiled[i]):
+                THRESHOLD_PARSE_FAILURES.inc(key)
+    return ids
+
+
+def batch_observer(kb, endpoint: str):
+    """observe= callback for evaluate_batch that feeds the rule counters and batch-size histogram"""
+    if not ENABLED:
+        return None
+
+    def _observe(masks):
+        count_batch(kb, endpoint, len(masks[0]) if masks else 0, [int(mask.sum()) for mask in masks])
+
+    return _observe
+
+
+def count_batch(kb, endpoint: str, rows: int, fires: List[int]) -> None:
+    """Rule counters and batch-size histogram for a batch scored elsewhere (fires: rows matched per rule)"""
+    if ENABLED:
+        RULE_COUNTERS.count_columns(kb, rows, fires)
+        BATCH_ROWS.observe(rows, endpoint)
+
+
+class StageTimer:
+    """Splits one request into stages; validation is the time before the handler started"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._last = time.perf_counter()
+        start = REQUEST_START.get()
+        if start is not None:
+            self._record("validation", self._last - start)
+
+    def _record(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = seconds
+        if ENABLED:
+            STAGE_SECONDS.observe(seconds, stage)
+
+    def stage(self, name: str) -> None:
+        now = time.perf_counter()
+        self._record(name, now - self._last)
+        self._last = now
+
+    def as_ms(self) -> Dict[str, float]:
+        return {stage: round(seconds * 1e3, 4) for stage, seconds in self.stages.items()}
+
+
+def trace_rules(index, facts: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Every rule, condition by condition, as apply_rules would check it (stops at the first failure)"""
+    candidates = set(index.candidate_ids(facts))
+    parsed: Dict[str, Optional[float]] = {}
+    trace = []
+    for i, (rule, checks) in enumerate(zip(index.rules, index.compiled)):
+        conditions = []
+        fired = True
+        for check in checks:
+            kind, key, a, _ = check
+            t0 = time.perf_counter_ns()
+            held = index._verify([check], facts, parsed)
+            elapsed = time.perf_counter_ns() - t0
+            if held:
+                result = "pass"
+            elif key not in facts:
+                result = "missing"
+            elif kind == LT and (a is None or parsed.get(key) is None):
+                result = "unparsable"
+            else:
+                result = "fail"
+            conditions.append({"key": key, "condition": rule["if"][key], "fact": facts.get(key),
+                               "result": result, "ns": elapsed})
+            if not held:
+                fired = False
+                break
+        trace.append({"rule": rule.get("name", f"#{i}"), "indexed_candidate": i in candidates,
+                      "fired": fired, "conditions": conditions})
+    return trace
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: stamps REQUEST_START and records latency per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        token = REQUEST_START.set(start)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            REQUEST_START.reset(token)
+            # Label by the matched route's template (set in the scope by the router);
+            # unknown paths share one series so scanners cannot blow up the label set
+            path = getattr(scope.get("route"), "path", None) or "other"
+            REQUEST_SECONDS.observe(time.perf_counter() - start, path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _summed(cache_stats: Optional[Dict[str, Any]]):
+    """Rule counters, METRICS and cache stats added up over the SHARED files of all workers"""
+    SHARED.write(cache_stats)
+    states = SHARED.collect()
+    rules, metrics = RuleCounters(), [metric.empty() for metric in METRICS]
+    for state in states.values():
+        rules.merge(state["rules"])
+        for metric in metrics:
+            metric.merge(state["metrics"].get(metric.name, ()))
+    if cache_stats is not None:
+        cache_stats = {field: sum(state["cache"][field] for pid, state in states.items() if state["cache"]
+                                  and (kind == "counter" or _alive(pid)))
+                       for field, kind in CACHE_FIELDS}
+    return rules, metrics, cache_stats
+
+
+def render(cache_stats: Optional[Dict[str, Any]] = None, kb_version: Optional[str] = None) -> str:
+    """Everything in Prometheus text exposition format, for all workers when SHARED is enabled"""
+    lines: List[str] = []
+    if kb_version is not None:
+        lines += ["# HELP feed_knowledge_base_info Knowledge-base release being served",
+                  "# TYPE feed_knowledge_base_info gauge",
+                  f'feed_knowledge_base_info{{version="{_escape(kb_version)}"}} 1']
+    rules, metrics = RULE_COUNTERS, METRICS
+    if SHARED.enabled:
+        rules, metrics, cache_stats = _summed(cache_stats)
+    lines += rules.render()
+    for metric in metrics:
+        lines += metric.render()
+    if cache_stats is not None:
+        for field, kind in CACHE_FIELDS:
+            suffix = "_total" if kind == "counter" else ""
+            name = f"feed_response_cache_{field}{suffix}"
+            lines += [f"# TYPE {name} {kind}", f"{name} {cache_stats[field]}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,196 @@
+"""Bounded process pool for the CPU-heavy endpoints (batch, fuzzy batch, formulation, projection).
+
+With FEED_POOL_WORKERS > 0 the pool's processes are forked from the serving
+worker when it starts, before its watcher and audit threads, so they share its
+compiled knowledge base copy-on-write. Jobs run there and the event loop stays
+free for the light requests. With 0 (the default) the same jobs run on the
+threadpool, as sync handlers did.
+
+Either way at most FEED_POOL_QUEUE jobs are queued or running per worker;
+past that, requests get 503 with Retry-After instead of piling up.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.compiled_kb import get_knowledge_base
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBusy(RuntimeError):
+    """Too many heavy jobs queued on this worker"""
+
+
+def _kb(version: str):
+    """The release the request was accepted on; a child that missed a reload catches up first"""
+    kb = get_knowledge_base()
+    if kb.version != version:
+        from app.kb_store import STORE
+
+        STORE.reload()
+        kb = get_knowledge_base()
+    return kb
+
+
+def exit_with_parent(sig: int = signal.SIGTERM, interval: float = 1.0) -> None:
+    """Send sig to this process once its parent is gone (a forked child must not outlive it)"""
+    parent = os.getppid()
+
+    def _watch():
+        while os.getppid() == parent:
+            time.sleep(interval)
+        os.kill(os.getpid(), sig)
+
+    threading.Thread(target=_watch, name="parent-watch", daemon=True).start()
+
+
+def _child_init() -> None:
+    # The serving worker's signal handlers (and their wakeup fd) were forked too;
+    # shutdown is the parent's job, it stops the pool explicitly
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    exit_with_parent()
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+class HeavyPool:
+    """Runs heavy jobs off the event loop, with a cap on how many may wait"""
+
+    def __init__(self, workers: int = 0, max_pending: int = 64):
+        self.workers = workers if "fork" in multiprocessing.get_all_start_methods() else 0
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._restarting = False
+
+    @classmethod
+    def from_env(cls) -> "HeavyPool":
+        """FEED_POOL_WORKERS processes per serving worker (0: threadpool), FEED_POOL_QUEUE jobs"""
+        return cls(int(os.environ.get("FEED_POOL_WORKERS", "0")), int(os.environ.get("FEED_POOL_QUEUE", "64")))
+
+    def start(self) -> None:
+        """Fork the pool now; with the fork start method every process is created on the first submit"""
+        if self.workers <= 0 or self._executor is not None:
+            return
+        self._executor = self._fork()
+
+    def _fork(self) -> ProcessPoolExecutor:
+        """A new executor, returned once all its processes are up"""
+        executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("fork"),
+                                       initializer=_child_init)
+        pids = {executor.submit(_ready).result() for _ in range(self.workers)}
+        logger.info("Heavy-job pool started: %d processes %s", self.workers, sorted(pids))
+        return executor
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        """fn(*args) in the pool (or the threadpool); PoolBusy when the queue is full"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolBusy(f"{self.pending} heavy jobs already queued on this worker")
+        self.pending += 1  # only touched on the event loop
+        try:
+            from starlette.concurrency import run_in_threadpool
+
+            if self._executor is None:
+                return await run_in_threadpool(fn, *args)
+            try:
+                return await asyncio.wrap_future(self._executor.submit(fn, *args))
+            except BrokenProcessPool:
+                # A child died (e.g. OOM-killed). The new pool is forked on a thread, as waiting for
+                # its processes would block the loop; jobs meanwhile get PoolBusy from the broken one
+                if not self._restarting:
+                    logger.error("Heavy-job pool broke; restarting it")
+                    self._restarting = True
+                    try:
+                        broken, self._executor = self._executor, await run_in_threadpool(self._fork)
+                        broken.shutdown(wait=False)
+                    finally:
+                        self._restarting = False
+                raise PoolBusy("Heavy-job pool restarting")
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers if self._executor is not None else 0, "pending": self.pending,
+                "max_pending": self.max_pending, "rejected": self.rejected}
+
+
+POOL = HeavyPool.from_env()
+
+
+# Jobs: plain functions of picklable arguments, so they run the same in either mode
+
+def score_records(version: str, records: list, want_fired: bool,
+                  prices: List[float]) -> Tuple[bytes, int, List[int], Optional[tuple]]:
+    """/recommend/batch as a JSON body, with the recipe analysis at the serving worker's prices
+
+    Also returns the row count and per-rule fire counts for the metrics, and
+    for the audit log (want_fired) the facts, recommendations and fired rule
+    names of every row.
+    """
+    from app.batch import evaluate_records
+    from app.recipe_matrix import add_analysis
+
+    kb = _kb(version)
+    counts: List[int] = []
+    fired = [] if want_fired else None
+    results = evaluate_records(records, kb.rule_index, kb.get_recipe,
+                               observe=lambda masks: counts.extend(int(mask.sum()) for mask in masks), fired=fired)
+    audit = None
+    if fired is not None:
+        audit = ([{"facts": r["facts"], "recommendations": r["recommendations"]} for r in results],
+                 [[kb.rules[i]["name"] for i in ids] for ids in fired])
+    add_analysis(results, kb, prices)
+    # As JSONResponse renders it; the results are already JSON-native
+    body = json.dumps(results, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return body, len(results), counts, audit
+
+
+def fuzzy_batch(version: str, rule_base: str, inputs: Dict[str, Any], tnorm: str, defuzzify: bool) -> Dict[str, Any]:
+    from app.fuzzy_engine import batch_response
+
+    engine = _kb(version).fuzzy_engines[rule_base]
+    return batch_response(engine, engine.evaluate(inputs, tnorm=tnorm, defuzzify=defuzzify))
+
+
+def formulate(version: str, *args, **kwargs) -> Dict[str, Any]:
+    from app.formulation import FORMULATOR
+
+    _kb(version)
+    return FORMULATOR.formulate(*args, **kwargs)
+
+
+def reformulate_recipes(version: str, prices: Optional[Dict[str, float]]) -> Dict[str, Dict[str, Any]]:
+    from app.formulation import FORMULATOR
+
+    _kb(version)
+    return FORMULATOR.reformulate_recipes(prices)
+
+
+def project(version: str, types, ages, birds, horizon_days: int, prices: List[float], price_revision: int,
+            start, granularity, stock, lead_time_days):
+    """Live prices come from the serving worker: a pool child's own PRICES never sees POST /prices"""
+    from app.projection import DemandProjection
+
+    projection = DemandProjection(types, ages, birds, horizon_days=horizon_days, kb=_kb(version),
+                                  prices=prices, price_revision=price_revision)
+    return projection.as_response(start, granularity, stock, lead_time_days)
@@ -0,0 +1,195 @@
+import datetime
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+from app.compiled_kb import get_knowledge_base
+from app.kb_loader import parse_range
+from app.kb_store import STORE
+from app.recipe_matrix import RecipeMatrix
+
+MAX_HORIZON_DAYS = 76 * 7
+
+
+class ProjectionTables:
+    """Lifecycle stages of one knowledge-base release as arrays, stage s = row s"""
+
+    def __init__(self, source):
+        frames, recipes = source.CHICKEN_FRAMES, source.RECIPE_FRAMES
+        self.lifecycle_of: Dict[str, int] = {}
+        stage_lifecycle, lo, hi, daily_kg, stage_recipe = [], [], [], [], []
+        self.recipes = list(recipes)
+        for n, (name, lifecycle) in enumerate(source.LIFECYCLES.items()):
+            for flock_type in lifecycle["types"]:
+                self.lifecycle_of[flock_type.lower()] = n
+            for stage in lifecycle["stages"]:
+                frame = frames[stage]
+                start, end = parse_range(next(iter(frame["Age_Stage"].values())))
+                stage_lifecycle.append(n)
+                lo.append(start * 7)
+                hi.append(end * 7)
+                daily_kg.append(frame["Daily_Feed_Consumption_g"] / 1000)
+                stage_recipe.append(self.recipes.index(frame["Recipe"]) if frame.get("Recipe") else -1)
+        self.lifecycles = list(source.LIFECYCLES)
+        self.stage_lifecycle = np.array(stage_lifecycle)
+        self.lo_days = np.array(lo, dtype=float)
+        self.hi_days = np.array(hi, dtype=float)
+        self.daily_kg = np.array(daily_kg)
+
+        # stage -> recipe (R x S) and recipe -> ingredient fractions (I x R), ingredient
+        # names resolved through the ingredient index (aliases included)
+        self.stage_to_recipe = np.zeros((len(self.recipes), len(stage_recipe)))
+        for s, r in enumerate(stage_recipe):
+            if r >= 0:
+                self.stage_to_recipe[r, s] = 1.0
+        self.matrix = RecipeMatrix(source)
+        self.ingredients = self.matrix.ingredients
+        self.fractions = self.matrix.fractions.T
+
+
+_TABLES: Dict[str, ProjectionTables] = {}
+
+
+def projection_tables(kb=None) -> ProjectionTables:
+    kb = kb or get_knowledge_base()
+    tables = _TABLES.get(kb.version)
+    if tables is None:
+        tables = _TABLES[kb.version] = ProjectionTables(kb.source)
+    return tables
+
+
+def _drop_replaced(kb) -> None:
+    """After a reload, drop the tables of every earlier release"""
+    for version in list(_TABLES):
+        if version != kb.version:
+            _TABLES.pop(version, None)
+
+
+STORE.add_listener(_drop_replaced)
+
+
+def stage_demand(lifecycle: np.ndarray, age_days: np.ndarray, birds: np.ndarray,
+                 tables: ProjectionTables, horizon_days: int) -> np.ndarray:
+    """Daily feed (kg) per lifecycle stage, summed over flocks: S x horizon_days
+
+    A flock's demand is constant within a stage, so each (flock, stage) pair adds
+    birds * daily_kg on one interval of days. The intervals go into a difference
+    array and one cumulative sum turns them into the series: O(flocks x stages)
+    work, independent of the horizon. Flocks past their last stage drop out.
+    """
+    S, D = len(tables.daily_kg), horizon_days
+    # Day index (from today) at which each flock enters / leaves each stage; N x S
+    start = np.clip(np.ceil(tables.lo_days[None, :] - age_days[:, None]), 0, D)
+    end = np.clip(np.ceil(tables.hi_days[None, :] - age_days[:, None]), 0, D)
+    active = (lifecycle[:, None] == tables.stage_lifecycle[None, :]) & (end > start)
+    weight = (birds[:, None] * tables.daily_kg[None, :])[active]
+    stage = np.broadcast_to(np.arange(S), active.shape)[active]
+    width = D + 1
+    diff = np.bincount(stage * width + start[active].astype(np.int64), weights=weight, minlength=S * width)
+    diff -= np.bincount(stage * width + end[active].astype(np.int64), weights=weight, minlength=S * width)
+    return np.cumsum(diff.reshape(S, width), axis=1)[:, :D]
+
+
+def reorder_dates(demand: np.ndarray, stock: float, lead_time_days: int) -> Dict[str, Optional[int]]:
+    """First day stock no longer covers the lead time (reorder) and first day it runs out"""
+    cumulative = np.cumsum(demand)
+    remaining = stock - cumulative
+    ahead = np.concatenate([cumulative[lead_time_days:], np.full(min(lead_time_days, len(demand)), cumulative[-1])])
+    # Order when what is left after today cannot cover the days until a delivery arrives
+    short = remaining < (ahead - cumulative)
+    out = np.flatnonzero(remaining < 0)
+    return {
+        "reorder_day": int(np.argmax(short)) if short.any() else None,
+        "stockout_day": int(out[0]) if out.size else None,
+    }
+
+
+class DemandProjection:
+    """Day-by-day feed and ingredient demand for a set of flocks
+
+    prices are per ingredient column (app.recipe_matrix.PriceBook.live); None
+    costs the demand at the knowledge-base prices.
+    """
+
+    def __init__(self, types: Sequence[str], age_weeks, birds, horizon_days: int = MAX_HORIZON_DAYS,
+                 kb=None, prices: Optional[Sequence[float]] = None, price_revision: int = 0):
+        if not 0 < horizon_days <= MAX_HORIZON_DAYS:
+            raise ValueError(f"horizon must be 1 to {MAX_HORIZON_DAYS} days")
+        kb = kb or get_knowledge_base()
+        tables = projection_tables(kb)
+        lifecycle = np.fromiter((tables.lifecycle_of.get(str(t).lower(), -1) for t in types),
+                                dtype=np.int64, count=len(types))
+        unknown = sorted({str(t) for t, n in zip(types, lifecycle.tolist()) if n < 0})
+        if unknown:
+            raise ValueError(f"Unknown flock types: {', '.join(unknown)}; "
+                             f"expected one of {', '.join(sorted(tables.lifecycle_of))}")
+        age_days = np.asarray(age_weeks, dtype=float) * 7
+        birds = np.asarray(birds, dtype=float)
+        if (age_days < 0).any() or (birds < 0).any():
+            raise ValueError("Ages and flock sizes must not be negative")
+
+        self.version = kb.version
+        self.tables = tables
+        self.horizon_days = horizon_days
+        self.flocks = len(lifecycle)
+        self.birds = float(birds.sum())
+        self.stages = stage_demand(lifecycle, age_days, birds, tables, horizon_days)
+        self.feeds = tables.stage_to_recipe @ self.stages        # R x D
+        self.ingredients = tables.fractions @ self.feeds         # I x D
+        self.prices = tables.matrix.base_prices if prices is None else np.asarray(prices, dtype=float)
+        self.price_revision = price_revision
+        self.cost = self.prices @ self.ingredients
+
+    def series(self, name: str) -> Optional[np.ndarray]:
+        """Demand of one feed (recipe name) or ingredient"""
+        for names, values in ((self.tables.recipes, self.feeds), (self.tables.ingredients, self.ingredients)):
+            if name in names:
+                return values[names.index(name)]
+        return None
+
+    def as_response(self, start: Optional[datetime.date] = None, granularity: str = "day",
+                    stock: Optional[Dict[str, float]] = None, lead_time_days: int = 7,
+                    decimals: int = 2) -> Dict[str, Any]:
+        """JSON-ready aggregated series plus reorder dates for every stocked feed or ingredient"""
+        start = start or datetime.date.today()
+        step = {"day": 1, "week": 7}[granularity]
+        periods = -(-self.horizon_days // step)
+
+        def _bucket(values: np.ndarray) -> List[float]:
+            padded = np.zeros(periods * step)
+            padded[:len(values)] = values
+            return np.round(padded.reshape(periods, step).sum(axis=1), decimals).tolist()
+
+        def _named(names: List[str], rows: np.ndarray) -> Dict[str, List[float]]:
+            return {name: _bucket(row) for name, row in zip(names, rows) if row.any()}
+
+        def _date(day: Optional[int]) -> Optional[str]:
+            return (start + datetime.timedelta(days=day)).isoformat() if day is not None else None
+
+        reorder = {}
+        for name, kg in (stock or {}).items():
+            demand = self.series(name)
+            if demand is None:
+                raise ValueError(f"Unknown feed or ingredient in stock: {name}")
+            days = reorder_dates(demand, kg, lead_time_days)
+            reorder[name] = {"stock_kg": kg, "reorder_date": _date(days["reorder_day"]),
+                             "stockout_date": _date(days["stockout_day"])}
+        return {
+            "knowledge_base": self.version,
+            "start_date": start.isoformat(),
+            "granularity": granularity,
+            "periods": [(start + datetime.timedelta(days=i * step)).isoformat() for i in range(periods)],
+            "flocks": self.flocks,
+            "birds": self.birds,
+            "feeds_kg": _named(self.tables.recipes, self.feeds),
+            "ingredients_kg": _named(self.tables.ingredients, self.ingredients),
+            "cost": _bucket(self.cost),
+            "price_revision": self.price_revision,
+            "totals": {
+                "feeds_kg": {n: round(float(v), decimals) for n, v in zip(self.tables.recipes, self.feeds.sum(axis=1)) if v},
+                "ingredients_kg": {n: round(float(v), decimals)
+                                   for n, v in zip(self.tables.ingredients, self.ingredients.sum(axis=1)) if v},
+                "cost": round(float(self.cost.sum()), decimals),
+            },
+            "reorder": reorder,
+        }
@@ -0,0 +1,294 @@
+import threading
+from functools import cached_property
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from app.compiled_kb import get_knowledge_base
+from app.kb_loader import name_key, parse_range
+
+
+class RecipeMatrix:
+    """RECIPE_FRAMES as a dense recipe x ingredient matrix over INGREDIENT_FRAMES columns
+
+    Recipe ingredient names are resolved once through the ingredient index (frame
+    names and their Aliases, ignoring case and spacing), so "Fishmeal" and
+    "Fishmeal (Omena)" land in the same column. The NumPy arrays are built for
+    the first table of every recipe (figures); the one recipe a /recommend
+    reports comes from its sparse row in plain Python (recipe_figures), so
+    neither starting a worker nor its first request imports NumPy.
+    """
+
+    def __init__(self, source):
+        frames = source.INGREDIENT_FRAMES
+        self.ingredients: List[str] = list(frames)
+        self.index: Dict[str, int] = {}
+        for column, (name, frame) in enumerate(frames.items()):
+            for alias in [name] + list(frame.get("Aliases", ())):
+                self.index.setdefault(name_key(alias), column)
+        self.recipes: List[str] = list(source.RECIPE_FRAMES)
+        self.positions = {name: r for r, name in enumerate(self.recipes)}
+        # Per recipe: {column: kg} in recipe order, and the batch it makes
+        self.rows: List[Dict[int, float]] = []
+        for recipe in source.RECIPE_FRAMES.values():
+            row: Dict[int, float] = {}
+            for name, kg in recipe["Ingredients"].items():
+                column = self.column(name)
+                row[column] = row.get(column, 0.0) + kg
+            self.rows.append(row)
+        # Ingredients each recipe lists, for the per-recipe batch amounts
+        self.row_columns = [[column for column in sorted(row) if row[column]] for row in self.rows]
+        self.nutrient_rows = [(f.get("CP%", 0.0), f.get("Ca%", 0.0)) for f in frames.values()]
+        self.base_price_list = [float(f["Price_per_kg"]) for f in frames.values()]
+        self.target_dcp = [parse_range(recipe["Target_DCP"]) for recipe in source.RECIPE_FRAMES.values()]
+        self.target_labels = [f"{lo:g}-{hi:g}%" if lo != hi else f"{lo:g}%" for lo, hi in self.target_dcp]
+
+    @cached_property
+    def kg(self):
+        import numpy as np
+
+        kg = np.zeros((len(self.recipes), len(self.ingredients)))
+        for r, row in enumerate(self.rows):
+            for column, amount in row.items():
+                kg[r, column] = amount
+        return kg
+
+    @cached_property
+    def batch_kg(self):
+        return self.kg.sum(axis=1)
+
+    @cached_property
+    def fractions(self):
+        return self.kg / self.batch_kg[:, None]                 # R x I, rows sum to 1
+
+    @cached_property
+    def nutrients(self):
+        import numpy as np
+
+        # I x 2 nutrient table; price is the third column, added per evaluation
+        return np.array(self.nutrient_rows, dtype=float)
+
+    @cached_property
+    def base_prices(self):
+        import numpy as np
+
+        return np.array(self.base_price_list, dtype=float)
+
+    @cached_property
+    def dcp_bounds(self):
+        import numpy as np
+
+        return np.array(self.target_dcp, dtype=float).reshape(-1, 2)
+
+    def column(self, name: str) -> int:
+        column = self.index.get(name_key(name))
+        if column is None:
+            raise ValueError(f"Unknown ingredient: {name}")
+        return column
+
+    def price_list(self, prices: Optional[Dict[str, float]] = None) -> List[float]:
+        """Knowledge-base prices with overrides applied (names or aliases), by column"""
+        out = list(self.base_price_list)
+        for name, price in (prices or {}).items():
+            out[self.column(name)] = float(price)
+        return out
+
+    def price_vector(self, prices: Optional[Dict[str, float]] = None):
+        import numpy as np
+
+        return np.array(self.price_list(prices), dtype=float)
+
+    def evaluate(self, prices):
+        """CP%, Ca% and cost per kg of every recipe: one R x I by I x 3 product"""
+        import numpy as np
+
+        return self.fractions @ np.column_stack([self.nutrients, prices])
+
+    def figures(self, prices: Sequence[float], batch_kg: Optional[float] = None,
+                decimals: int = 2) -> Dict[str, Dict[str, Any]]:
+        """Per recipe: achieved protein and calcium, cost per kg and per batch, batch ingredients"""
+        import numpy as np
+
+        totals = self.evaluate(np.asarray(prices, dtype=float))
+        batch = self.batch_kg if batch_kg is None else np.full(len(self.recipes), float(batch_kg))
+        # Rounded as whole arrays; only the dict building below is per recipe
+        rounded = np.round(np.column_stack([totals, batch, totals[:, 2] * batch]), decimals).tolist()
+        amounts = np.round(self.fractions * batch[:, None], decimals).tolist()
+        lo, hi = self.dcp_bounds[:, 0], self.dcp_bounds[:, 1]
+        meets = ((lo - 0.05 <= totals[:, 0]) & (totals[:, 0] <= hi + 0.05)).tolist()
+        out = {}
+        for r, name in enumerate(self.recipes):
+            cp, ca, cost, size, batch_cost = rounded[r]
+            out[name] = {
+                "recipe": name,
+                "batch_kg": size,
+                "CP%": cp,
+                "Ca%": ca,
+                "cost_per_kg": cost,
+                "batch_cost": batch_cost,
+                "target_dcp": self.target_labels[r],
+                "meets_target_dcp": meets[r],
+                "Ingredients": {self.ingredients[c]: amounts[r][c] for c in self.row_columns[r]},
+            }
+        return out
+
+    def recipe_figures(self, r: int, prices: Sequence[float], batch_kg: Optional[float] = None,
+                       decimals: int = 2) -> Dict[str, Any]:
+        """figures() of one recipe, summed over its own ingredients only"""
+        row = self.rows[r]
+        total = sum(row.values())
+        cp = ca = cost = 0.0
+        for column, kg in row.items():
+            share = kg / total
+            cp += share * self.nutrient_rows[column][0]
+            ca += share * self.nutrient_rows[column][1]
+            cost += share * float(prices[column])
+        batch = total if batch_kg is None else float(batch_kg)
+        lo, hi = self.target_dcp[r]
+        return {
+            "recipe": self.recipes[r],
+            "batch_kg": round(batch, decimals),
+            "CP%": round(cp, decimals),
+            "Ca%": round(ca, decimals),
+            "cost_per_kg": round(cost, decimals),
+            "batch_cost": round(cost * batch, decimals),
+            "target_dcp": self.target_labels[r],
+            "meets_target_dcp": lo - 0.05 <= cp <= hi + 0.05,
+            "Ingredients": {self.ingredients[c]: round(row[c] / total * batch, decimals) for c in self.row_columns[r]},
+        }
+
+
+_MATRICES: Dict[str, RecipeMatrix] = {}
+
+
+def recipe_matrix(kb=None) -> RecipeMatrix:
+    kb = kb or get_knowledge_base()
+    matrix = _MATRICES.get(kb.recipes_version)
+    if matrix is None:
+        matrix = _MATRICES[kb.recipes_version] = RecipeMatrix(kb.source)
+    return matrix
+
+
+def forget(version: str) -> None:
+    """Drop the matrix and figures of a release no longer served (an evicted tenant)"""
+    _MATRICES.pop(version, None)
+    PRICES.forget(version)
+
+
+class PriceBook:
+    """Live ingredient prices over the knowledge-base defaults (per process)
+
+    Every update bumps the revision. The table of all recipes, and the figures
+    of each recipe a /recommend reported, are computed once per revision and
+    shared by every response until the next update.
+    """
+
+    def __init__(self):
+        self.overrides: Dict[str, float] = {}
+        self.revision = 0
+        self._lock = threading.Lock()
+        self._figures: Dict[str, Dict[str, Dict[str, Any]]] = {}  # recipes_version -> figures
+        self._analyses: Dict[Tuple[str, str], Dict[str, Any]] = {}  # (recipes_version, recipe) -> figures
+        self._figures_revision = 0
+
+    def update(self, prices: Dict[str, float], kb=None) -> int:
+        """Merge new prices (ingredient names or aliases); unknown names reject the whole update"""
+        matrix = recipe_matrix(kb)
+        resolved = {matrix.ingredients[matrix.column(name)]: float(price) for name, price in prices.items()}
+        with self._lock:
+            self.overrides = {**self.overrides, **resolved}
+            self.revision += 1
+            return self.revision
+
+    def reset(self) -> int:
+        with self._lock:
+            self.overrides = {}
+            self.revision += 1
+            return self.revision
+
+    def price_list(self, kb=None, overrides: Optional[Dict[str, float]] = None) -> List[float]:
+        matrix = recipe_matrix(kb)
+        overrides = self.overrides if overrides is None else overrides
+        # Overrides for ingredients a reloaded knowledge base dropped are skipped
+        return matrix.price_list({n: p for n, p in overrides.items() if name_key(n) in matrix.index})
+
+    def live(self, kb=None) -> Tuple[int, List[float]]:
+        """Revision and live price list read together, e.g. to hand to another process"""
+        with self._lock:
+            revision, overrides = self.revision, self.overrides
+        return revision, self.price_list(kb, overrides)
+
+    def prices(self, kb=None):
+        """Live prices as a NumPy vector over the matrix columns"""
+        import numpy as np
+
+        return np.array(self.price_list(kb), dtype=float)
+
+    def figures(self, kb=None) -> Dict[str, Dict[str, Any]]:
+        """Figures of every recipe at the current prices, keyed by recipe name"""
+        kb = kb or get_knowledge_base()
+        with self._lock:
+            self._drop_stale()
+            revision, overrides = self.revision, self.overrides
+            figures = self._figures.get(kb.recipes_version)
+        if figures is None:
+            figures = recipe_matrix(kb).figures(self.price_list(kb, overrides))
+            with self._lock:
+                if self._figures_revision == revision:  # an update meanwhile makes these stale
+                    self._figures[kb.recipes_version] = figures
+        return figures
+
+    def _drop_stale(self) -> None:
+        # Only the latest revision is ever asked for again; tenants each keep their own figures
+        if self._figures_revision != self.revision:
+            self._figures, self._analyses, self._figures_revision = {}, {}, self.revision
+
+    def forget(self, version: str) -> None:
+        with self._lock:
+            self._figures.pop(version, None)
+            self._analyses = {key: value for key, value in self._analyses.items() if key[0] != version}
+
+    def analysis(self, kb, feed_type: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Figures of the recipe that makes a recommended feed, None when there is none"""
+        name = kb.recipe_name(feed_type) if feed_type else None
+        if name is None:
+            return None
+        key = (kb.recipes_version, name)
+        with self._lock:
+            self._drop_stale()
+            revision, overrides = self.revision, self.overrides
+            figures = self._analyses.get(key)
+        if figures is None:
+            matrix = recipe_matrix(kb)
+            figures = matrix.recipe_figures(matrix.positions[name], self.price_list(kb, overrides))
+            with self._lock:
+                if self._figures_revision == revision:
+                    self._analyses[key] = figures
+        return figures
+
+
+PRICES = PriceBook()
+
+
+def first_feed(recommendations: List[Dict[str, Any]]) -> Optional[str]:
+    return next((rec["Recommend"] for rec in recommendations if "Recommend" in rec), None)
+
+
+def add_analysis(results: List[Dict[str, Any]], kb, prices: Optional[Sequence[float]] = None) -> List[Dict[str, Any]]:
+    """Attach "recipe_analysis" to /recommend-shaped results, in place
+
+    prices (a PriceBook.live list) stand in for this process's live prices,
+    e.g. in a pool child, whose own PriceBook never sees a POST /prices.
+    """
+    analysis = PRICES.analysis
+    if prices is not None:
+        matrix, figures = recipe_matrix(kb), {}
+
+        def analysis(kb, feed_type):
+            name = kb.recipe_name(feed_type) if feed_type else None
+            if name is not None and name not in figures:
+                figures[name] = matrix.recipe_figures(matrix.positions[name], prices)
+            return figures.get(name)
+
+    for result in results:
+        if "recommendations" in result:
+            result["recipe_analysis"] = analysis(kb, first_feed(result["recommendations"]))
+    return results
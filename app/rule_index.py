@@ -0,0 +1,268 @@
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+# Compiled condition kinds
+EQ, RANGE, LT = 0, 1, 2
+
+
+def _is_number(value: Any) -> bool:
+    """True for plain ints/floats (and bools) that can be ordered safely, NaN excluded"""
+    return type(value) in (int, float, bool) and value == value
+
+
+def _is_hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return value == value  # NaN never equals itself, so it cannot be looked up
+
+
+def parse_percent(value: Any) -> Optional[float]:
+    """Parse a fact such as "45%" or 45 into a float, None if it is not numeric"""
+    if type(value) in (int, float):
+        return float(value)  # typed facts (app.facts) are already numbers
+    try:
+        return float(str(value).strip("%"))
+    except Exception:
+        return None
+
+
+def compile_conditions(conditions: Dict[str, Any]) -> List[Tuple[int, str, Any, Any]]:
+    """Turn a rule's "if" dict into (kind, key, a, b) checks with thresholds pre-parsed"""
+    checks = []
+    for key, value in conditions.items():
+        if key == "Any":  # global rules
+            continue
+        if isinstance(value, tuple):  # age ranges
+            checks.append((RANGE, key, value[0], value[1]))
+        elif isinstance(value, str) and value.startswith("<"):
+            # e.g. "<50%", parsed once here instead of on every request
+            try:
+                threshold = float(value.strip("<%"))
+            except Exception:
+                threshold = None
+            checks.append((LT, key, threshold, None))
+        else:
+            checks.append((EQ, key, value, None))
+    return checks
+
+
+class _IntervalIndex:
+    """Centered interval tree over closed [lo, hi] ranges of one numeric fact
+
+    Each node keeps the ranges that contain its center, sorted by lo and by hi,
+    and passes the ranges wholly below or above it to its two children. Building
+    is O(n log n) and a query O(log n + matches) however much the ranges overlap.
+    """
+
+    def __init__(self, items: List[Tuple[Any, Any, int]]):
+        self.root = self._build([item for item in items if item[0] <= item[1]])
+
+    @classmethod
+    def _build(cls, items: List[Tuple[Any, Any, int]]) -> Optional[tuple]:
+        if not items:
+            return None
+        ends = sorted(b for lo, hi, _ in items for b in (lo, hi))
+        center = ends[len(ends) // 2]
+        below, above, here = [], [], []
+        for item in items:
+            if item[1] < center:
+                below.append(item)
+            elif item[0] > center:
+                above.append(item)
+            else:
+                here.append(item)
+        by_lo = sorted(here, key=lambda item: item[0])
+        by_hi = sorted(here, key=lambda item: item[1])
+        # (center, lows, ids by lo, highs, ids by hi, below, above)
+        return (center, [lo for lo, _, _ in by_lo], [rule_id for _, _, rule_id in by_lo],
+                [hi for _, hi, _ in by_hi], [rule_id for _, _, rule_id in by_hi],
+                cls._build(below), cls._build(above))
+
+    def query(self, value: Any, out: List[int]) -> None:
+        """Append the ids of every range containing value"""
+        node = self.root
+        while node is not None:
+            center, lows, low_ids, highs, high_ids, below, above = node
+            if value < center:
+                out.extend(low_ids[:bisect_right(lows, value)])
+                node = below
+            elif value > center:
+                out.extend(high_ids[bisect_left(highs, value):])
+                node = above
+            else:
+                out.extend(low_ids)
+                return
+
+
+class _Node:
+    """One level of the rule network: hash buckets, then interval indexes, then a scan list"""
+
+    def __init__(self, rule_ids: List[int], compiled: List[list], key_rank: Dict[str, int], used: frozenset):
+        self.buckets: Dict[str, Dict[Any, "_Node"]] = {}
+        self.intervals: Dict[str, _IntervalIndex] = {}
+        self.scan: List[int] = []
+
+        grouped: Dict[str, Dict[Any, List[int]]] = {}
+        ranged: Dict[str, List[Tuple[Any, Any, int]]] = {}
+        for rule_id in rule_ids:
+            checks = compiled[rule_id]
+            exact = {key: a for kind, key, a, _ in checks if kind == EQ and key not in used}
+            # The rule's own exact keys, ranked (derived facts can make the key list as long as RULES)
+            hashed = min((k for k in exact if _is_hashable(exact[k])), key=key_rank.__getitem__, default=None)
+            if hashed is not None:
+                grouped.setdefault(hashed, {}).setdefault(exact[hashed], []).append(rule_id)
+                continue
+            span = next(((key, a, b) for kind, key, a, b in checks
+                         if kind == RANGE and key not in used and _is_number(a) and _is_number(b)), None)
+            if span is not None:
+                ranged.setdefault(span[0], []).append((span[1], span[2], rule_id))
+                continue
+            self.scan.append(rule_id)
+
+        for key, by_value in grouped.items():
+            self.buckets[key] = {value: _Node(ids, compiled, key_rank, used | {key})
+                                 for value, ids in by_value.items()}
+        for key, items in ranged.items():
+            self.intervals[key] = _IntervalIndex(items)
+
+    def collect(self, facts: Dict[str, Any], out: List[int]) -> None:
+        for key, by_value in self.buckets.items():
+            if key in facts:
+                child = by_value.get(facts[key])
+                if child is not None:
+                    child.collect(facts, out)
+        for key, index in self.intervals.items():
+            if key in facts:
+                index.query(facts[key], out)
+        out.extend(self.scan)
+
+
+class RuleIndex:
+    """Rule network compiled once from RULES.
+
+    Exact-match conditions (Type, FeedCost, Health, ...) are hashed, numeric
+    ranges such as Age_Weeks go into an interval index and "<50%" style
+    thresholds are parsed up front, so a query only verifies rules that can
+    still match. Results are identical to apply_rules, in RULES order.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = rules
+        self.compiled = [compile_conditions(rule.get("if", {})) for rule in rules]
+
+        # Prefer the most widely used exact keys (usually Type) as the first hash level
+        usage = Counter(key for checks in self.compiled for kind, key, _, _ in checks if kind == EQ)
+        key_order = [key for key, _ in usage.most_common()]
+        key_rank = {key: rank for rank, key in enumerate(key_order)}
+        self.root = _Node(list(range(len(rules))), self.compiled, key_rank, frozenset())
+
+        self.range_keys = frozenset(key for checks in self.compiled for kind, key, _, _ in checks if kind == RANGE)
+        self.exact_keys = frozenset(key_order)
+        self.threshold_keys = frozenset(key for checks in self.compiled for kind, key, _, _ in checks if kind == LT)
+        self._plan = self._normalization_plan()
+
+    def _normalization_plan(self) -> List[Tuple[str, Optional[list], Optional[list]]]:
+        """Per fact key: raw value (bounds None), or the range bounds / thresholds that split it"""
+        bounds: Dict[str, set] = {}
+        thresholds: Dict[str, set] = {}
+        for checks in self.compiled:
+            for kind, key, a, b in checks:
+                if kind == RANGE:
+                    bounds.setdefault(key, set()).update((a, b))
+                elif kind == LT and a is not None:
+                    thresholds.setdefault(key, set()).add(a)
+        plan = []
+        for key in sorted(self.exact_keys | self.range_keys | self.threshold_keys):
+            key_bounds = bounds.get(key, set())
+            if key in self.exact_keys or not all(_is_number(v) for v in key_bounds):
+                plan.append((key, None, None))
+            else:
+                plan.append((key, sorted(key_bounds), sorted(thresholds.get(key, ()))))
+        return plan
+
+    def normalize(self, facts: Dict[str, Any]) -> Optional[tuple]:
+        """Reduce facts to what the rules can tell apart, or None if they cannot be keyed.
+
+        Age_Weeks becomes its segment between rule boundaries and EggProduction
+        is parsed and placed among the "<x%" thresholds, so facts with the same
+        key always match the same rules.
+        """
+        key = []
+        for name, bounds, thresholds in self._plan:
+            if name not in facts:
+                key.append((name,))
+                continue
+            value = facts[name]
+            if bounds is None:
+                if not _is_hashable(value):
+                    return None
+                key.append((name, value))
+                continue
+            part = [name, None, None]
+            if bounds:
+                if not _is_number(value):
+                    return None
+                i = bisect_left(bounds, value)
+                part[1] = 2 * i + 1 if i < len(bounds) and bounds[i] == value else 2 * i
+            if thresholds:
+                number = parse_percent(value)
+                # NaN or unparsable fails every "<x%" check, like a number above all thresholds
+                part[2] = bisect_right(thresholds, number) if number is not None and number == number else len(thresholds)
+            key.append(tuple(part))
+        return tuple(key)
+
+    def _needs_reference(self, facts: Dict[str, Any]) -> bool:
+        """Facts the index cannot order or hash are left to the reference matcher"""
+        for key in self.range_keys:
+            if key in facts and not _is_number(facts[key]):
+                return True
+        for key in self.exact_keys:
+            if key in facts:
+                try:
+                    hash(facts[key])
+                except TypeError:
+                    return True
+        return False
+
+    def _verify(self, checks: list, facts: Dict[str, Any], parsed: Dict[str, Optional[float]]) -> bool:
+        for kind, key, a, b in checks:
+            if key not in facts:
+                return False
+            fact_value = facts[key]
+            if kind == RANGE:
+                if not (a <= fact_value <= b):
+                    return False
+            elif kind == LT:
+                if key not in parsed:
+                    parsed[key] = parse_percent(fact_value)
+                fact_num = parsed[key]
+                if a is None or fact_num is None or not fact_num < a:
+                    return False
+            elif fact_value != a:
+                return False
+        return True
+
+    def candidate_ids(self, facts: Dict[str, Any]) -> List[int]:
+        """Rules whose conditions must be checked for facts, in RULES order"""
+        if self._needs_reference(facts):
+            # Plain scan in RULES order, raising wherever apply_rules would
+            return list(range(len(self.compiled)))
+        candidates: List[int] = []
+        self.root.collect(facts, candidates)
+        candidates.sort()
+        return candidates
+
+    def match_ids(self, facts: Dict[str, Any], candidates: Optional[List[int]] = None) -> List[int]:
+        """Positions in RULES of every rule whose conditions hold for facts"""
+        parsed: Dict[str, Optional[float]] = {}
+        compiled = self.compiled
+        if candidates is None:
+            candidates = self.candidate_ids(facts)
+        return [i for i in candidates if self._verify(compiled[i], facts, parsed)]
+
+    def match(self, facts: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Indexed equivalent of apply_rules"""
+        return [self.rules[i].get("then", {}) for i in self.match_ids(facts)]
@@ -0,0 +1,170 @@
+"""Production server: build everything once in a master process, then fork uvicorn workers.
+
+    python -m app.serve --host 0.0.0.0 --port 8000 --workers 4
+
+The master compiles the knowledge base (or loads its snapshot), imports
+app.main and warms what requests use (recipe figures, NumPy matrices, fuzzy
+tables, the chaining network). gc.freeze() then moves all of it out of the
+collector's reach, so a collection in a worker never writes to those pages.
+The master binds the listening socket and forks the workers. They accept on
+the shared socket and share the knowledge base copy-on-write instead of each
+building its own, as `uvicorn --workers` does.
+
+Each worker runs the app's lifespan itself. That forks its heavy-job pool
+(FEED_POOL_WORKERS, see app.pool) and starts the knowledge-base watcher, the
+audit writer and the metrics writer. Workers share their counts through
+FEED_METRICS_DIR (a temporary directory unless set), so /metrics reports the
+whole server whichever worker answers. The master only supervises: it
+restarts workers that die and passes SIGTERM/SIGINT on for a graceful shutdown.
+"""
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict
+
+logger = logging.getLogger("app.serve")
+
+
+def preload():
+    """Import and warm everything the workers will share; returns the ASGI app"""
+    import app.main
+    from app.metrics import SHARED
+    from app.compiled_kb import get_knowledge_base
+    from app.forward_chaining import rule_network
+    from app.recipe_matrix import PRICES
+    import app.batch  # noqa: F401
+    import app.formulation  # noqa: F401
+    import app.projection  # noqa: F401
+    import app.sweep  # noqa: F401
+
+    kb = get_knowledge_base()
+    PRICES.figures(kb)  # builds the NumPy arrays
+    kb.fuzzy_engines
+    rule_network(kb)
+    if app.main.RESPONSE_CACHE.backend is not None:
+        app.main.RESPONSE_CACHE.backend.close()  # SQLite connections must not cross a fork
+    if SHARED.enabled:
+        SHARED.clear()  # counts left by an earlier run
+    return app.main.app
+
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(asgi_app, sock: socket.socket, args) -> None:
+    import uvicorn
+    from app.pool import exit_with_parent
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    exit_with_parent()  # SIGTERM (a graceful stop) if the master is killed
+    config = uvicorn.Config(asgi_app, lifespan="on", log_level=args.log_level, access_log=args.access_log,
+                            timeout_keep_alive=args.keep_alive, backlog=args.backlog)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Master:
+    """Forks and supervises the workers"""
+
+    def __init__(self, asgi_app, sock: socket.socket, args):
+        self.app, self.sock, self.args = asgi_app, sock, args
+        self.children: Dict[int, float] = {}  # pid -> start time
+        self.stopping = False
+        self.deadline = 0.0
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.app, self.sock, self.args)
+            except BaseException:
+                logger.exception("Worker %d failed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+
+    def stop(self, signum, frame) -> None:
+        if not self.stopping:
+            logger.info("Stopping %d workers", len(self.children))
+            self.stopping = True
+            self.deadline = time.monotonic() + self.args.graceful_timeout
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.args.workers):
+            self.spawn()
+        logger.info("Serving on %s:%d with %d workers (master %d)", self.args.host, self.args.port,
+                    self.args.workers, os.getpid())
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if self.stopping and time.monotonic() > self.deadline:
+                    for child in self.children:
+                        os.kill(child, signal.SIGKILL)
+                time.sleep(0.2)
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            logger.error("Worker %d exited (status %d); starting a new one", pid, status)
+            if time.monotonic() - started < 1.0:
+                time.sleep(1.0)  # a worker that dies at start-up would otherwise spin
+            self.spawn()
+        return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Prefork server for app.main")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("FEED_WORKERS", "0")) or os.cpu_count() or 1)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=5, help="seconds an idle keep-alive connection stays open")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(process)d %(name)s %(message)s")
+
+    metrics_dir = None
+    if not os.environ.get("FEED_METRICS_DIR"):
+        os.environ["FEED_METRICS_DIR"] = metrics_dir = tempfile.mkdtemp(prefix="feed-metrics-")
+    try:
+        started = time.perf_counter()
+        asgi_app = preload()
+        sock = bind(args.host, args.port, args.backlog)
+        gc.collect()
+        gc.freeze()  # everything built so far stays shared; workers only collect their own objects
+        logger.info("Preloaded in %.2fs", time.perf_counter() - started)
+        return Master(asgi_app, sock, args).run()
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""Decision-boundary partition of the numeric fact axes for what-if sweeps.
+
+Every numeric condition in RULES is a closed range or a "<x%" threshold, so for
+fixed categorical facts the matched rules only change at rule boundaries. Each
+swept axis is cut at those boundaries into elementary cells, the rules are
+evaluated once per cell (at a representative value) and neighbouring cells
+with the same outcome are merged into regions. The cells also make an
+O(log n) lookup table for point queries.
+"""
+import itertools
+import math
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from app.compiled_kb import get_knowledge_base
+from app.rule_index import EQ, RANGE, LT, parse_percent, _is_hashable, _is_number
+
+MAX_CELLS = 100000        # cell combinations evaluated for one partition
+MAX_PARTITIONS = 256      # partitions kept per process
+
+INF = math.inf
+
+
+class _Interval:
+    __slots__ = ("lo", "lo_closed", "hi", "hi_closed")
+
+    def __init__(self, lo: float, lo_closed: bool, hi: float, hi_closed: bool):
+        self.lo, self.lo_closed, self.hi, self.hi_closed = lo, lo_closed, hi, hi_closed
+
+    def contains(self, x: float) -> bool:
+        above = x > self.lo or (self.lo_closed and x == self.lo)
+        below = x < self.hi or (self.hi_closed and x == self.hi)
+        return above and below
+
+    def representative(self) -> float:
+        if self.lo_closed:
+            return self.lo
+        if self.hi_closed:
+            return self.hi
+        if self.lo > -INF and self.hi < INF:
+            return (self.lo + self.hi) / 2
+        if self.lo > -INF:
+            return self.lo + 1
+        return self.hi - 1 if self.hi < INF else 0.0
+
+    def describe(self, last: Optional["_Interval"] = None) -> Dict[str, Any]:
+        """This cell, or the run from this cell to last, as JSON (None for an open end)"""
+        last = last or self
+        return {"from": self.lo if self.lo > -INF else None, "from_inclusive": self.lo_closed,
+                "to": last.hi if last.hi < INF else None, "to_inclusive": last.hi_closed}
+
+
+class Axis:
+    """One swept fact cut into elementary cells at the rules' boundaries"""
+
+    def __init__(self, key: str, kb, clip: Optional[Tuple[float, float]] = None):
+        kinds, points = set(), set()
+        for checks in kb.rule_index.compiled:
+            for kind, check_key, a, b in checks:
+                if check_key != key:
+                    continue
+                if kind == RANGE:
+                    kinds.add(RANGE)
+                    points.update((a, b))
+                elif kind == LT:
+                    kinds.add(LT)
+                    if a is not None:
+                        points.add(a)
+                elif _is_number(a) and not isinstance(a, bool):
+                    kinds.add(RANGE)  # an exact numeric value cuts like a zero-width range
+                    points.add(a)
+                else:
+                    kinds.add(EQ)
+                    if _is_hashable(a):
+                        points.add(a)
+        if len(kinds) > 1:
+            raise ValueError(f"{key} is tested both as a number and as a category; it cannot be swept")
+        if not kinds:
+            raise ValueError(f"No rule tests {key}")
+        self.key = key
+        self.kind = kinds.pop()
+        if self.kind == EQ:
+            self.values = sorted(points, key=repr) + [None]    # None: absent or any other value
+            self._index = {value: i for i, value in enumerate(self.values[:-1])}
+            self.cells = self.values
+            self.reps = self.values
+            return
+
+        if not all(_is_number(p) for p in points):
+            raise ValueError(f"{key} has non-numeric bounds; it cannot be swept")
+        lo, hi = clip if clip is not None else (-INF, INF)
+        if lo > hi:
+            raise ValueError(f"Range of {key} must be [low, high]")
+        edges = [lo] + sorted(p for p in points if lo < p < hi) + [hi]
+        self.cells: List[Any] = []
+        if self.kind == RANGE:
+            # Boundaries are cells of their own: a closed range can start or end exactly there
+            for i, edge in enumerate(edges):
+                if -INF < edge < INF and (i == 0 or edge != edges[i - 1]):
+                    self.cells.append(_Interval(edge, True, edge, True))
+                if i + 1 < len(edges) and edge < edges[i + 1]:
+                    self.cells.append(_Interval(edge, False, edges[i + 1], False))
+        else:
+            # "<t" holds left of t, so cells are [t_i, t_i+1); a missing or unparsable value fails every threshold
+            for i in range(len(edges) - 1):
+                if edges[i] < edges[i + 1] or i == 0:
+                    last = i == len(edges) - 2
+                    self.cells.append(_Interval(edges[i], edges[i] > -INF, edges[i + 1], last and edges[i + 1] < INF))
+            self.cells.append(None)
+        intervals = [c for c in self.cells if c is not None]
+        self._starts = [(c.lo, 0 if c.lo_closed else 1) for c in intervals]
+        self.reps = [self._fact_value(c.representative()) if c is not None else None for c in self.cells]
+
+    def _fact_value(self, x: float) -> Any:
+        # EggProduction-style facts are percentages written as text
+        return f"{x:g}%" if self.kind == LT else x
+
+    def locate(self, value: Any) -> Optional[int]:
+        """Cell holding a fact value, None when it is outside the swept range"""
+        if self.kind == EQ:
+            other = len(self.values) - 1
+            if value is None or not _is_hashable(value):
+                return other
+            return self._index.get(value, other)
+        if self.kind == LT:
+            number = parse_percent(value) if value is not None else None
+            if number is None or number != number:
+                return len(self.cells) - 1
+            value = number
+        elif not _is_number(value):
+            return None
+        i = bisect_right(self._starts, (value, 0)) - 1
+        if i >= 0 and self.cells[i].contains(value):
+            return i
+        return None
+
+    def describe(self, first: int, last: int) -> Dict[str, Any]:
+        """JSON for the consecutive cells first..last"""
+        if self.kind == EQ:
+            return {"values": self.values[first:last + 1]}
+        if self.cells[first] is None:
+            return {"missing": True}
+        return self.cells[first].describe(self.cells[last])
+
+    def same_kind(self, i: int, j: int) -> bool:
+        """Whether cells i and j can be merged into one region"""
+        return self.kind == EQ or (self.cells[i] is None) == (self.cells[j] is None)
+
+
+class Partition:
+    """Regions of identical outcome over the swept axes, for fixed categorical facts.
+
+    The first axis is the primary one: each combination of the other axes gets
+    runs along it, and combinations with identical runs are merged too.
+    """
+
+    def __init__(self, kb, facts: Dict[str, Any], axes: Sequence[str],
+                 ranges: Optional[Dict[str, Tuple[float, float]]] = None):
+        ranges = ranges or {}
+        self.version = kb.version
+        self.axes = [Axis(key, kb, ranges.get(key)) for key in axes]
+        total = math.prod(len(axis.cells) for axis in self.axes)
+        if total > MAX_CELLS:
+            raise ValueError(f"Sweep has {total} cells, more than {MAX_CELLS}; fix more facts or narrow the ranges")
+
+        # Outcome id of every cell combination, axis 0 varying slowest
+        self.outcome_of: Dict[tuple, int] = {}
+        self.outcomes: List[Tuple[int, ...]] = []
+        self.grid: List[int] = []
+        base = dict(facts)
+        for combo in itertools.product(*(axis.reps for axis in self.axes)):
+            probe = dict(base)
+            for axis, value in zip(self.axes, combo):
+                if value is None:
+                    probe.pop(axis.key, None)
+                else:
+                    probe[axis.key] = value
+            matched = tuple(kb.rule_index.match_ids(probe))
+            outcome = self.outcome_of.get(matched)
+            if outcome is None:
+                outcome = self.outcome_of[matched] = len(self.outcomes)
+                self.outcomes.append(matched)
+            self.grid.append(outcome)
+        self._strides = [math.prod(len(a.cells) for a in self.axes[i + 1:]) for i in range(len(self.axes))]
+        self.regions = self._regions()
+
+    def lookup(self, values: Dict[str, Any]) -> Optional[int]:
+        """Outcome id for one point: one bisect per axis"""
+        flat = 0
+        for axis, stride in zip(self.axes, self._strides):
+            cell = axis.locate(values.get(axis.key))
+            if cell is None:
+                return None
+            flat += cell * stride
+        return self.grid[flat]
+
+    def _runs(self, outer: tuple) -> List[Tuple[int, int, int]]:
+        """(first cell, last cell, outcome) runs along the primary axis"""
+        primary = self.axes[0]
+        runs: List[Tuple[int, int, int]] = []
+        for cell in range(len(primary.cells)):
+            flat = cell * self._strides[0] + sum(i * s for i, s in zip(outer, self._strides[1:]))
+            outcome = self.grid[flat]
+            if runs and runs[-1][2] == outcome and primary.same_kind(runs[-1][1], cell):
+                runs[-1] = (runs[-1][0], cell, outcome)
+            else:
+                runs.append((cell, cell, outcome))
+        return runs
+
+    def _regions(self) -> List[Dict[str, Any]]:
+        primary, others = self.axes[0], self.axes[1:]
+        groups: List[list] = []      # [outer first, outer last, runs]
+        for outer in itertools.product(*(range(len(a.cells)) for a in others)):
+            runs = self._runs(outer)
+            if groups:
+                first, last, prev = groups[-1]
+                # Merge along the last secondary axis when nothing else differs
+                if prev == runs and last[:-1] == outer[:-1] and others[-1].same_kind(last[-1], outer[-1]):
+                    groups[-1][1] = outer
+                    continue
+            groups.append([outer, outer, runs])
+        regions = []
+        for first, last, runs in groups:
+            where = {}
+            for n, axis in enumerate(others):
+                where[axis.key] = axis.describe(first[n], last[n])
+            for start, end, outcome in runs:
+                regions.append({primary.key: primary.describe(start, end), **where, "outcome": outcome})
+        return regions
+
+    def as_response(self, kb, points: Sequence[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        outcomes = []
+        for matched in self.outcomes:
+            thens = [kb.rules[i].get("then", {}) for i in matched]
+            feed_type = next((t["Recommend"] for t in thens if "Recommend" in t), None)
+            outcomes.append({"rules": [kb.rules[i].get("name") for i in matched], "recommendations": thens,
+                             "recipe": kb.get_recipe(feed_type) if feed_type else {}})
+        response = {"knowledge_base": self.version, "axes": [a.key for a in self.axes],
+                    "regions": self.regions, "outcomes": outcomes}
+        if points:
+            response["points"] = [{**point, "outcome": self.lookup(point)} for point in points]
+        return response
+
+
+_PARTITIONS: "OrderedDict[tuple, Partition]" = OrderedDict()
+
+
+def partition(facts: Dict[str, Any], axes: Sequence[str], ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+              kb=None) -> Partition:
+    """Partition for fixed facts and swept axes, computed once per knowledge-base release"""
+    kb = kb or get_knowledge_base()
+    fixed = {k: v for k, v in facts.items() if k not in axes}
+    if not all(_is_hashable(v) or v is None for v in fixed.values()):
+        raise ValueError("Fixed facts must be plain values")
+    ranges = {k: tuple(v) for k, v in (ranges or {}).items() if k in axes}
+    key = (kb.version, tuple(sorted(fixed.items(), key=repr)), tuple(axes), tuple(sorted(ranges.items())))
+    found = _PARTITIONS.get(key)
+    if found is not None:
+        _PARTITIONS.move_to_end(key)
+        return found
+    found = _PARTITIONS[key] = Partition(kb, fixed, axes, ranges)
+    if len(_PARTITIONS) > MAX_PARTITIONS:
+        _PARTITIONS.popitem(last=False)
+    return found
@@ -0,0 +1,186 @@
+"""Live flock telemetry over a WebSocket, pushing recommendations only when they change.
+
+Clients send fact deltas for any number of flocks, as one JSON object or a list:
+
+    {"flock": "house-3", "facts": {"EggProduction": "46%"}}
+    {"flock": "house-3", "close": true}
+
+A flock's first message must include Type and Age_Weeks. Every flock keeps its
+own forward-chaining session (app.forward_chaining), so a delta only re-tests
+the rules on the changed facts. An update is pushed only when the flock's
+recommendations, warnings or advice change; updates go out in batches of
+{"updates": [...]}.
+
+Backpressure: unsent updates are conflated per flock (a slow client gets the
+latest state, not every step in between), and once OUTBOX_HIGH_WATER flocks
+are waiting the server stops reading until the client catches up.
+"""
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.audit import AUDIT
+from app.compiled_kb import get_knowledge_base
+
+MAX_FLOCKS = int(os.environ.get("FEED_WS_MAX_FLOCKS", "10000"))          # per connection
+OUTBOX_HIGH_WATER = int(os.environ.get("FEED_WS_HIGH_WATER", "1000"))    # flocks with unsent updates
+OUTBOX_LOW_WATER = OUTBOX_HIGH_WATER // 2
+MAX_BATCH = 500                                                           # updates per frame
+
+
+class Outbox:
+    """Pending outbound messages, one slot per key; a newer message for a key replaces the older"""
+
+    def __init__(self, high_water: int = OUTBOX_HIGH_WATER, low_water: int = OUTBOX_LOW_WATER):
+        self.pending: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self.high_water, self.low_water = high_water, low_water
+        self.ready = asyncio.Event()
+        self.space = asyncio.Event()
+        self.space.set()
+        self.conflated = 0
+
+    def put(self, key: Any, message: Dict[str, Any]) -> None:
+        if key in self.pending:
+            self.conflated += 1
+        self.pending[key] = message  # keeps its place in line, so busy flocks cannot starve the rest
+        self.ready.set()
+        if len(self.pending) >= self.high_water:
+            self.space.clear()
+
+    def take(self, limit: int = MAX_BATCH) -> List[Dict[str, Any]]:
+        batch = []
+        while self.pending and len(batch) < limit:
+            batch.append(self.pending.popitem(last=False)[1])
+        if not self.pending:
+            self.ready.clear()
+        if len(self.pending) <= self.low_water:
+            self.space.set()
+        return batch
+
+
+class FlockState:
+    __slots__ = ("version", "session", "signature", "seq")
+
+    def __init__(self, version: str, session, signature: Optional[tuple] = None, seq: int = 0):
+        self.version, self.session, self.signature, self.seq = version, session, signature, seq
+
+
+class FlockStreams:
+    """Per-connection working memory of every flock the client reports on"""
+
+    def __init__(self, max_flocks: int = MAX_FLOCKS):
+        self.flocks: Dict[str, FlockState] = {}
+        self.max_flocks = max_flocks
+
+    def apply(self, flock: str, delta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update one flock; returns the message to push, or None when nothing visible changed"""
+        from pydantic import ValidationError
+        from app.data_models import FeedQuery
+        from app.forward_chaining import Session, rule_network
+        from app.recipe_matrix import add_analysis
+
+        kb = get_knowledge_base()
+        state = self.flocks.get(flock)
+        if state is None and len(self.flocks) >= self.max_flocks:
+            raise ValueError(f"More than {self.max_flocks} flocks on one connection")
+        given = state.session.given if state is not None else {}
+        try:
+            facts = FeedQuery(**{**given, **delta}).dict()
+        except ValidationError as e:
+            error = e.errors()[0]
+            raise ValueError(f"{'.'.join(map(str, error['loc']))}: {error['msg']}")
+
+        if state is None or state.version != kb.version:
+            # New flock, or the knowledge base was reloaded: start from the full facts
+            session = Session(rule_network(kb), facts)
+            state = self.flocks[flock] = FlockState(kb.version, session,
+                                                     state.signature if state else None, state.seq if state else 0)
+        else:
+            state.session.update({key: value for key, value in facts.items() if given.get(key, ...) != value})
+
+        session = state.session
+        thens = session.network.thens
+        signature = tuple(session.network.names[r] for r in session.fired_ids() if thens[r])
+        if signature == state.signature:
+            return None
+        state.signature = signature
+        state.seq += 1
+        result = session.result(kb.get_recipe)
+        AUDIT.record("ws_telemetry", kb, result["facts"], result["fired"], result["recommendations"])
+        add_analysis([result], kb)
+        result["warnings"] = [rec["Warning"] for rec in result["recommendations"] if "Warning" in rec]
+        return {"flock": flock, "seq": state.seq, "knowledge_base": kb.version, **result}
+
+    def close(self, flock: str) -> None:
+        self.flocks.pop(flock, None)
+
+
+def parse_messages(text: str) -> List[Tuple[Optional[str], Dict[str, Any]]]:
+    """(flock, message) pairs from one frame; a malformed entry becomes (flock or None, {"error": ...})"""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        return [(None, {"error": f"Invalid JSON: {e}"})]
+    out = []
+    for item in data if isinstance(data, list) else [data]:
+        flock = item.get("flock") if isinstance(item, dict) else None
+        if not isinstance(flock, (str, int)) or isinstance(flock, bool):
+            out.append((None, {"error": 'Each message needs a "flock" id'}))
+        elif item.get("close"):
+            out.append((str(flock), {"close": True}))
+        elif not isinstance(item.get("facts"), dict):
+            out.append((str(flock), {"error": 'Expected "facts": {...}'}))
+        else:
+            out.append((str(flock), {"facts": item["facts"]}))
+    return out
+
+
+async def _send_loop(websocket, outbox: Outbox) -> None:
+    while True:
+        await outbox.ready.wait()
+        batch = outbox.take()
+        if batch:
+            # Waits for the socket to drain, which is what lets the outbox fill up and stop the reader
+            await websocket.send_text(json.dumps({"updates": batch}))
+
+
+async def serve(websocket) -> None:
+    """Run one telemetry connection until the client goes away"""
+    from starlette.websockets import WebSocketDisconnect
+
+    await websocket.accept()
+    streams = FlockStreams()
+    outbox = Outbox()
+    sender = asyncio.create_task(_send_loop(websocket, outbox))
+    errors = 0
+    try:
+        while True:
+            if not outbox.space.is_set():
+                space = asyncio.ensure_future(outbox.space.wait())
+                await asyncio.wait({sender, space}, return_when=asyncio.FIRST_COMPLETED)
+                space.cancel()
+                if sender.done():  # the client stopped reading for good
+                    break
+            text = await websocket.receive_text()
+            for flock, message in parse_messages(text):
+                if "close" in message:
+                    streams.close(flock)
+                    continue
+                if "facts" in message:
+                    try:
+                        update = streams.apply(flock, message["facts"])
+                    except ValueError as e:
+                        message = {"error": str(e)}
+                    else:
+                        if update is not None:
+                            outbox.put(flock, update)
+                        continue
+                errors += 1
+                outbox.put(("error", errors), {"flock": flock, **message})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
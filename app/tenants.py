@@ -0,0 +1,231 @@
+"""Per-tenant knowledge-base overlays: the shared release plus a small delta document per tenant.
+
+A tenant (a cooperative, a farm) is one file in FEED_TENANT_DIR named after
+its id, e.g. tenants/coop-nyeri.yaml:
+
+    INGREDIENT_FRAMES:            # fields merged into the shared frame (or a new ingredient)
+      Whole Maize: {Price_per_kg: 42}
+    RECIPE_FRAMES:                # whole recipes, replacing the shared one of that name (or added)
+      70kg Layers Mash: {Target_Type: Layer, Target_DCP: 16-18%, Feeds: [...], Ingredients: {...}}
+    RULES:                        # replace the shared rule of the same name (or added at the end)
+      - {name: R_Layer_Feed, if: {...}, then: {...}}
+    REMOVE_RULES: [R_Feed_Hygiene]
+
+The merged knowledge base is validated like the shared one and compiled on
+the tenant's first request, then kept in an LRU of FEED_TENANT_CACHE tenants.
+Merging copies only the sections the delta touches, and only the entries in
+them are new; everything else, including the compiled rule index, recipe
+lookup and fuzzy engines, is the shared release's own objects.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.compiled_kb import CompiledKnowledgeBase
+from app.kb_loader import KnowledgeBase, KnowledgeBaseError
+from app.kb_store import STORE, KnowledgeBaseStore
+
+logger = logging.getLogger(__name__)
+
+TENANT_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+EXTENSIONS = (".yaml", ".yml", ".json")
+
+
+class UnknownTenant(KeyError):
+    """No overlay file for this tenant id"""
+
+
+def merge_overlay(base: KnowledgeBase, delta: Dict[str, Any], tenant: str, digest: str) -> KnowledgeBase:
+    """The shared sections with a tenant's delta applied; sections the delta leaves alone are not copied"""
+    sections = dict(base.sections)
+    if delta.get("INGREDIENT_FRAMES"):
+        frames = sections["INGREDIENT_FRAMES"] = dict(base.INGREDIENT_FRAMES)
+        for name, fields in delta["INGREDIENT_FRAMES"].items():
+            frames[name] = {**frames.get(name, {}), **fields}
+    if delta.get("RECIPE_FRAMES"):
+        sections["RECIPE_FRAMES"] = {**base.RECIPE_FRAMES, **delta["RECIPE_FRAMES"]}
+    if delta.get("RULES") or delta.get("REMOVE_RULES"):
+        removed = set(delta.get("REMOVE_RULES", ()))
+        missing = removed.difference(rule["name"] for rule in base.RULES)
+        if missing:
+            raise KnowledgeBaseError(f"REMOVE_RULES names unknown rules: {', '.join(sorted(missing))}")
+        overrides = {}
+        for rule in delta.get("RULES", ()):
+            # YAML has no tuples: ranges become (low, high) as in the shared rules
+            conditions = {k: tuple(v) if isinstance(v, list) else v for k, v in rule.get("if", {}).items()}
+            overrides[rule["name"]] = {**rule, "if": conditions}
+        # Replaced rules keep their place, so file-order tie-breaks stay as in the shared release
+        rules = [overrides.pop(rule["name"], rule) for rule in base.RULES if rule["name"] not in removed]
+        sections["RULES"] = rules + list(overrides.values())
+    return KnowledgeBase(sections, base.version, f"{base.digest}+{tenant}.{digest}")
+
+
+class TenantKnowledgeBases:
+    """Compiled knowledge bases of the tenants, built on first use and kept in a bounded LRU
+
+    Entries are tied to the shared release they were merged over, so a reload
+    of the shared files rebuilds each tenant on its next request. An overlay
+    that fails validation is remembered too (and raised again) until its file
+    changes, so a broken tenant does not re-validate on every request.
+    """
+
+    def __init__(self, directory: Optional[str], store: KnowledgeBaseStore = STORE, max_tenants: int = 256):
+        self.directory = directory
+        self.store = store
+        self.max_tenants = max_tenants
+        self.builds = self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[str, Tuple, Any]]" = OrderedDict()  # id -> (base, signature, kb)
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TenantKnowledgeBases":
+        """FEED_TENANT_DIR (overlay files; unset disables tenants) and FEED_TENANT_CACHE (compiled tenants kept)"""
+        return cls(os.environ.get("FEED_TENANT_DIR") or None,
+                   max_tenants=int(os.environ.get("FEED_TENANT_CACHE", "256")))
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def path(self, tenant: str) -> str:
+        if self.directory is None or not TENANT_ID.fullmatch(tenant):
+            raise UnknownTenant(tenant)
+        for extension in EXTENSIONS:
+            path = os.path.join(self.directory, tenant + extension)
+            if os.path.exists(path):
+                return path
+        raise UnknownTenant(tenant)
+
+    def cached(self, tenant: str) -> Optional[CompiledKnowledgeBase]:
+        """The tenant's compiled knowledge base when it is current, without touching the disk"""
+        base = self.store.current
+        with self._lock:
+            entry = self._entries.get(tenant)
+            if entry is None or entry[0] != base.version:
+                return None
+            self._entries.move_to_end(tenant)
+        if isinstance(entry[2], KnowledgeBaseError):
+            raise entry[2]
+        return entry[2]
+
+    def get(self, tenant: str) -> CompiledKnowledgeBase:
+        """Compiled knowledge base for a tenant; UnknownTenant, or KnowledgeBaseError for a bad overlay"""
+        kb = self.cached(tenant)
+        if kb is not None:
+            return kb
+        path = self.path(tenant)
+        with self._build_lock:  # one build per tenant even when its first requests arrive together
+            kb = self.cached(tenant)
+            if kb is not None:
+                return kb
+            base = self.store.current
+            signature = _signature(path)
+            try:
+                kb = self._build(base, tenant, path)
+            except KnowledgeBaseError as e:
+                logger.error("Tenant %s overlay rejected: %s", tenant, e)
+                self._put(tenant, (base.version, signature, e))
+                raise
+            self._put(tenant, (base.version, signature, kb))
+            return kb
+
+    def _build(self, base: CompiledKnowledgeBase, tenant: str, path: str) -> CompiledKnowledgeBase:
+        import yaml
+        from pydantic import ValidationError
+        from app.kb_schema import KnowledgeBaseDocument, TenantOverlayDocument
+
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            delta = json.loads(raw) if path.endswith(".json") else yaml.load(
+                raw, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+        except (OSError, yaml.YAMLError, json.JSONDecodeError) as e:
+            raise KnowledgeBaseError(f"Cannot read tenant overlay {path}: {e}") from e
+        if delta is None:
+            delta = {}
+        try:
+            TenantOverlayDocument.model_validate(delta)
+            source = merge_overlay(base.source, delta, tenant, hashlib.sha1(raw).hexdigest()[:12])
+            # The shared rules were validated with their release; only the overlay's own rules are
+            # checked again (a large rule set would otherwise make every tenant build slow).
+            # Merging keeps names unique among RULES, so clashes can only be with DERIVED_RULES
+            KnowledgeBaseDocument.model_validate({**source.sections, "version": source.version,
+                                                  "RULES": delta.get("RULES", [])})
+        except ValidationError as e:
+            raise KnowledgeBaseError(f"Invalid tenant overlay {path}:\n{e}") from e
+        self.builds += 1
+        return CompiledKnowledgeBase(source, base)
+
+    def _put(self, tenant: str, entry: tuple) -> None:
+        evicted = []
+        with self._lock:
+            old = self._entries.pop(tenant, None)
+            if old is not None:
+                evicted.append(old)
+            self._entries[tenant] = entry
+            while len(self._entries) > self.max_tenants:
+                evicted.append(self._entries.popitem(last=False)[1])
+                self.evictions += 1
+        for _, _, kb in evicted:
+            _release_tables(kb)
+
+    def poll(self) -> int:
+        """Forget tenants whose overlay file changed or went away; returns how many"""
+        with self._lock:
+            entries = list(self._entries.items())
+        stale = []
+        for tenant, (_, signature, _) in entries:
+            try:
+                current = _signature(self.path(tenant))
+            except (UnknownTenant, OSError):
+                current = None
+            if current != signature:
+                stale.append(tenant)
+        self._drop(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            tenants = list(self._entries)
+        self._drop(tenants)
+
+    def _drop(self, tenants: List[str]) -> None:
+        with self._lock:
+            dropped = [self._entries.pop(tenant) for tenant in tenants if tenant in self._entries]
+        for _, _, kb in dropped:
+            _release_tables(kb)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            failed = sum(isinstance(entry[2], KnowledgeBaseError) for entry in self._entries.values())
+            return {"enabled": self.enabled, "directory": self.directory, "tenants": len(self._entries),
+                    "failed": failed, "max_tenants": self.max_tenants, "builds": self.builds,
+                    "evictions": self.evictions}
+
+
+def _signature(path: str) -> Tuple:
+    st = os.stat(path)
+    return path, st.st_mtime_ns, st.st_size
+
+
+def _release_tables(kb) -> None:
+    """Drop the per-release tables built for a tenant that is no longer cached"""
+    if isinstance(kb, CompiledKnowledgeBase):
+        from app import forward_chaining, metrics, recipe_matrix
+
+        metrics.RULE_COUNTERS.forget(kb.version)
+        recipe_matrix.forget(kb.version)
+        forward_chaining.forget(kb.version)
+
+
+TENANTS = TenantKnowledgeBases.from_env()
+# Tenants merged over a replaced release are rebuilt on their next request
+STORE.add_listener(lambda kb: TENANTS.clear())
+if TENANTS.enabled:
+    STORE.add_poller(TENANTS.poll)  # with FEED_KB_WATCH, edited overlays are picked up too
@@ -0,0 +1,93 @@
+import os
+from typing import Dict, Any, List, Optional
+
+# FEED_DASHBOARD_MODE=embedded runs the engine inside the dashboard process;
+# remote calls the API at FEED_API_URL over one pooled keep-alive session
+DASHBOARD_MODE = os.environ.get("FEED_DASHBOARD_MODE", "embedded")
+API_URL = os.environ.get("FEED_API_URL", "http://localhost:8000").rstrip("/")
+API_TIMEOUT = float(os.environ.get("FEED_API_TIMEOUT", "10"))
+API_RETRIES = int(os.environ.get("FEED_API_RETRIES", "3"))
+
+MODES = ("embedded", "remote")
+
+
+class DashboardError(Exception):
+    """A query the engine or the API rejected, with a message fit for the page"""
+
+
+class EmbeddedClient:
+    """Scores queries in-process against the compiled knowledge base, same output as the API"""
+
+    mode = "embedded"
+
+    def __init__(self):
+        from app.compiled_kb import get_knowledge_base
+
+        self._kb = get_knowledge_base
+        self._kb()  # compile (or load the snapshot) now rather than on the first click
+
+    def recommend_batch(self, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        from pydantic import ValidationError
+        from app.batch import evaluate_records
+        from app.data_models import FeedQuery
+
+        records = []
+        for row, query in enumerate(queries, 1):
+            try:
+                records.append(FeedQuery(**query).record())
+            except ValidationError as e:
+                raise DashboardError(f"Flock {row}: {e.errors()[0]['msg']}")
+        kb = self._kb()
+        return evaluate_records(records, kb.rule_index, kb.get_recipe)
+
+    def recommend(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        return self.recommend_batch([query])[0]
+
+
+class RemoteClient:
+    """Calls a running API; one keep-alive session with retries and timeouts for every request"""
+
+    mode = "remote"
+
+    def __init__(self, base_url: str = API_URL, timeout: float = API_TIMEOUT, retries: int = API_RETRIES):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (min(3.05, timeout), timeout)  # (connect, read)
+        # The scoring endpoints have no side effects, so POSTs are safe to retry
+        retry = Retry(total=retries, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                      allowed_methods=None, raise_on_status=False)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=8)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._errors = requests.RequestException
+
+    def _post(self, path: str, payload) -> Any:
+        try:
+            response = self.session.post(self.base_url + path, json=payload, timeout=self.timeout)
+        except self._errors as e:
+            raise DashboardError(f"Could not reach the API at {self.base_url}: {e}")
+        if response.status_code == 422:
+            detail = response.json().get("detail")
+            if isinstance(detail, list) and detail:  # pydantic errors: report the first one
+                detail = f"{' / '.join(map(str, detail[0]['loc'][1:]))}: {detail[0]['msg']}"
+            raise DashboardError(f"Rejected by the API: {detail}")
+        if response.status_code != 200:
+            raise DashboardError(f"API error {response.status_code} from {path}")
+        return response.json()
+
+    def recommend(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        return self._post("/recommend", query)
+
+    def recommend_batch(self, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._post("/recommend/batch", queries)
+
+
+def make_client(mode: Optional[str] = None):
+    mode = mode or DASHBOARD_MODE
+    if mode not in MODES:
+        raise ValueError(f"FEED_DASHBOARD_MODE must be one of {MODES}, got {mode!r}")
+    return EmbeddedClient() if mode == "embedded" else RemoteClient()
@@ -1,23 +1,37 @@
 import streamlit as st
-import requests
 import sys, os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-from app.inference_engine import fuzzy_recommend_broiler  # import fuzzy function
+from app.inference_engine import fuzzy_recommend_broiler, fuzzy_recommend_feed  # import fuzzy functions
+from app.ui.client import DashboardError, make_client
 
-API_URL = "http://localhost:8000/recommend"  # Update when deploying
+CHICKEN_TYPES = ["Chick", "Pullets / Growers", "Layer", "Broiler Starter", "Broiler Grower", "Broiler Finisher"]
+
+
+@st.cache_resource
+def get_client():
+    """Built once per dashboard process: the compiled engine (embedded) or a pooled session (remote)"""
+    return make_client()
+
+
+def clean_row(row) -> dict:
+    """Table row -> FeedQuery payload; blank cells (None, NaN, "") are left out"""
+    return {k: v for k, v in row.items() if v is not None and v == v and v != ""}
+
+
+client = get_client()
 
 st.title("🐓 Chicken Feed Expert System")
 st.write("Get feed recommendations based on chicken type, age, and conditions.")
+st.caption(f"Engine: {client.mode}" + (f" ({client.base_url})" if client.mode == "remote" else ""))
 
 # Mode selector
 mode = st.radio("Select Reasoning Mode:", ["Crisp (Rule-Based)", "Fuzzy Logic"])
 
 # User input form
 with st.form("feed_form"):
-    chicken_type = st.selectbox("Chicken Type", ["Chick", "Pullets / Growers", "Layer", 
-                                                 "Broiler Starter", "Broiler Grower", "Broiler Finisher"])
+    chicken_type = st.selectbox("Chicken Type", CHICKEN_TYPES)
     age_weeks = st.number_input("Age (weeks)", min_value=0.0, step=0.5)
     egg_production = st.text_input("Egg Production (%) (optional)")
     feed_cost = st.selectbox("Feed Cost (optional)", ["", "High", "Low"])
@@ -27,7 +41,6 @@ with st.form("feed_form"):
 
 if submitted:
     if mode == "Crisp (Rule-Based)":
-        # Call API (existing behavior)
         payload = {
             "Type": chicken_type,
             "Age_Weeks": age_weeks,
@@ -35,10 +48,11 @@ if submitted:
             "FeedCost": feed_cost if feed_cost else None,
             "Health": health if health else None
         }
-        response = requests.post(API_URL, json=payload)
-
-        if response.status_code == 200:
-            data = response.json()
+        try:
+            data = client.recommend(payload)
+        except DashboardError as e:
+            st.error(f"Error fetching recommendations. {e}")
+        else:
             st.subheader("Recommendations")
             for rec in data["recommendations"]:
                 st.json(rec)
@@ -46,8 +60,6 @@ if submitted:
             if data["recipe"]:
                 st.subheader("Suggested Recipe")
                 st.write(data["recipe"]["Ingredients"])
-        else:
-            st.error("Error fetching recommendations.")
 
     else:
         # Fuzzy Mode – handled locally, no API call
@@ -55,14 +67,57 @@ if submitted:
         
         if "Broiler" in chicken_type:
             result = fuzzy_recommend_broiler(age_weeks)
-            
+        else:
+            result = fuzzy_recommend_feed(age_weeks)
+
+        if "error" in result:
+            st.warning("No fuzzy match found for this age. Use Crisp mode instead.")
+        else:
             st.write("**Age Membership:**", result["age_membership"])
-            st.write("**Protein Membership:**", result["protein_membership"])
+            if "protein_membership" in result:
+                st.write("**Protein Membership:**", result["protein_membership"])
             st.write("**Suitability Scores:**")
             for feed, score in result["options"]:
                 st.write(f"- {feed}: {score}")
-            
+
             st.success(f"Recommended Feed → {result['recommended'][0]} (Score: {result['recommended'][1]})")
-        
+
+
+# Several flocks at once: the whole table goes out as one batch request
+st.header("Multiple flocks")
+flocks = st.data_editor(
+    [{"Type": "Layer", "Age_Weeks": 25.0, "EggProduction": "", "FeedCost": "", "Health": ""},
+     {"Type": "Broiler Starter", "Age_Weeks": 1.0, "EggProduction": "", "FeedCost": "", "Health": ""}],
+    num_rows="dynamic",
+    column_config={
+        "Type": st.column_config.SelectboxColumn("Chicken Type", options=CHICKEN_TYPES, required=True),
+        "Age_Weeks": st.column_config.NumberColumn("Age (weeks)", min_value=0.0, step=0.5, required=True),
+        "FeedCost": st.column_config.SelectboxColumn("Feed Cost", options=["", "High", "Low"]),
+        "Health": st.column_config.SelectboxColumn("Health", options=["", "Healthy", "Sick"]),
+    },
+    key="flocks",
+)
+
+if st.button("Score all flocks"):
+    rows = flocks.to_dict("records") if hasattr(flocks, "to_dict") else list(flocks)
+    queries = [q for q in (clean_row(row) for row in rows) if q.get("Type")]
+    if not queries:
+        st.warning("Add at least one flock with a type.")
+    else:
+        try:
+            results = client.recommend_batch(queries)
+        except DashboardError as e:
+            st.error(f"Error fetching recommendations. {e}")
         else:
-            st.warning("Fuzzy logic currently implemented for Broilers only. Use Crisp mode for other chicken types.")
+            summary = []
+            for n, result in enumerate(results, 1):
+                recs = result["recommendations"]
+                summary.append({
+                    "Flock": n,
+                    "Type": result["facts"]["Type"],
+                    "Age (weeks)": result["facts"]["Age_Weeks"],
+                    "Feed": next((r["Recommend"] for r in recs if "Recommend" in r), None),
+                    "DCP": next((r["DCP"] for r in recs if "DCP" in r), None),
+                    "Warnings": "; ".join(r["Warning"] for r in recs if "Warning" in r),
+                })
+            st.dataframe(summary, hide_index=True)
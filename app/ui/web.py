@@ -0,0 +1,112 @@
+import hashlib
+import os
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Form, HTTPException, Request
+from fastapi.responses import HTMLResponse, Response
+from fastapi.staticfiles import StaticFiles
+from pydantic import ValidationError
+
+from app.audit import AUDIT
+from app.compiled_kb import get_knowledge_base
+from app.data_models import FeedQuery
+from app import metrics
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+
+# FEED_UI_RELOAD=1 re-reads edited templates (development); otherwise each template
+# is compiled once per process and the dashboard page once per knowledge-base release
+TEMPLATE_RELOAD = os.environ.get("FEED_UI_RELOAD", "0") == "1"
+STATIC_MAX_AGE = int(os.environ.get("FEED_STATIC_MAX_AGE", "3600"))
+
+router = APIRouter(prefix="/ui", include_in_schema=False)
+
+_env = None
+_pages: Dict[str, tuple] = {}
+
+
+def templates():
+    """Jinja environment, created on first use so API-only workers never import Jinja"""
+    global _env
+    if _env is None:
+        from jinja2 import Environment, FileSystemLoader, select_autoescape
+        _env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=select_autoescape(["html"]),
+                           auto_reload=TEMPLATE_RELOAD)
+    return _env
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+
+def chicken_types(kb) -> List[str]:
+    """Flock types the rules know about, in rule order"""
+    return list(dict.fromkeys(rule["if"]["Type"] for rule in kb.rules if isinstance(rule.get("if", {}).get("Type"), str)))
+
+
+@router.get("", response_class=HTMLResponse)
+def dashboard_page(request: Request):
+    """The form page; only changes with the knowledge base, so it is rendered once per release"""
+    kb = get_knowledge_base()
+    page = _pages.get(kb.version) if not TEMPLATE_RELOAD else None
+    if page is None:
+        body = templates().get_template("dashboard.html").render(chicken_types=chicken_types(kb)).encode()
+        page = _pages[kb.version] = (body, etag_for(body))
+    body, etag = page
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}  # revalidate, so a reload shows up at once
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(body, headers=headers)
+
+
+@router.post("/recommend", response_class=HTMLResponse)
+def recommend_page(type: str = Form(...), age_weeks: float = Form(..., ge=0),
+                   egg_production: Optional[str] = Form(None), feed_cost: Optional[str] = Form(None),
+                   health: Optional[str] = Form(None)):
+    """Same inference as POST /recommend, rendered with result.html"""
+    from app.recipe_matrix import PRICES
+
+    try:
+        facts = FeedQuery(Type=type, Age_Weeks=age_weeks, EggProduction=egg_production or None,
+                          FeedCost=feed_cost or None, Health=health or None).dict()
+    except ValidationError as e:
+        error = e.errors()[0]
+        raise HTTPException(status_code=422, detail=f"{error['loc'][0]}: {error['msg']}")
+    kb = get_knowledge_base()
+    matched = metrics.match(kb, facts)
+    recommendations = [kb.rules[i].get("then", {}) for i in matched]
+    first = next((rec for rec in recommendations if "Recommend" in rec), {})
+    recipe = kb.get_recipe(first["Recommend"]) if first else {}
+    fired = [kb.rules[i].get("name") for i in matched]
+    AUDIT.record("ui", kb, facts, fired, recommendations)
+    result = {
+        "facts": facts,
+        "rules_matched": fired,
+        "recommendation": {
+            "feed": first.get("Recommend"),
+            "dcp": first.get("DCP"),
+            "warnings": [rec["Warning"] for rec in recommendations if "Warning" in rec],
+        },
+        "recipe": {"name": kb.recipe_name(first["Recommend"]), "target_dcp": recipe["Target_DCP"],
+                   "ingredients": recipe["Ingredients"]} if recipe else None,
+        "analysis": PRICES.analysis(kb, first.get("Recommend")),
+    }
+    body = templates().get_template("result.html").render(result=result)
+    return HTMLResponse(body, headers={"Cache-Control": "no-store"})
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles (ETag / Last-Modified / 304 built in) plus a Cache-Control max-age"""
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}"
+        return response
+
+
+def mount(app) -> None:
+    """Add the HTML pages under /ui and the stylesheet under /static"""
+    app.include_router(router)
+    app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
@@ -0,0 +1,196 @@
+"""Requests per second against the prefork server (app.serve) as the worker count grows.
+
+For every --workers count a server is started on --port, warmed, and driven by
+--clients load-generating processes, each keeping --concurrency requests in
+flight for --duration seconds. The queries are the Zipf-skewed workload of
+benchmarks/synthetic.py; --batch-share of the requests are /recommend/batch
+calls of --batch-size rows, which go through the heavy-job pool.
+
+Besides req/s and p50/p99 latency, each run reports the memory of a worker
+from /proc/<pid>/smaps_rollup: Pss counts shared pages once per sharer, so
+Pss well below Rss means the knowledge base the master built is still shared
+copy-on-write. Scaling stops at the number of cores; keep --clients low
+enough that the load generators do not take the cores the workers need.
+
+    python benchmarks/load_test.py --workers 1 2 4 --duration 10 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import workload  # noqa: E402
+
+
+def start_server(workers: int, port: int, pool_workers: int) -> subprocess.Popen:
+    env = dict(os.environ, FEED_POOL_WORKERS=str(pool_workers), PYTHONPATH=ROOT)
+    server = subprocess.Popen([sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(port),
+                               "--log-level", "warning"], cwd=ROOT, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with status {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/pool/stats").status_code == 200 \
+                    and len(children(server.pid)) == workers:
+                time.sleep(1.0)  # the last workers forked may still be in their lifespan
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError("server did not start within 60s")
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory(pid: int) -> Optional[Dict[str, float]]:
+    """Rss, Pss and Uss (private pages) of one process in MB; None where /proc has no smaps_rollup"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.split()[-1:] == ["kB"]}
+    except OSError:
+        return None
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"rss_mb": round(fields["Rss"] / 1024, 1), "pss_mb": round(fields["Pss"] / 1024, 1),
+            "uss_mb": round(uss / 1024, 1)}
+
+
+async def _drive(url: str, payloads: List[Dict[str, Any]], batches: List[List[Dict[str, Any]]],
+                 batch_share: float, concurrency: int, warmup: float, duration: float, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    counts = {"requests": 0, "errors": 0, "busy": 0}
+    start = time.perf_counter()
+    record_from, stop_at = start + warmup, start + warmup + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def loop(client: httpx.AsyncClient, n: int) -> None:
+        i = n
+        while True:
+            t = time.perf_counter()
+            if t >= stop_at:
+                return
+            i += concurrency
+            if batches and rng.random() < batch_share:
+                request = client.post("/recommend/batch", json=batches[i % len(batches)])
+            else:
+                request = client.post("/recommend", json=payloads[i % len(payloads)])
+            try:
+                status = (await request).status_code
+            except httpx.TransportError:
+                status = 0
+            if t < record_from:
+                continue
+            latencies.append(time.perf_counter() - t)
+            counts["requests"] += 1
+            if status == 503:
+                counts["busy"] += 1
+            elif status != 200:
+                counts["errors"] += 1
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(loop(client, n) for n in range(concurrency)))
+    return {"latencies": latencies, **counts}
+
+
+def _client(job: tuple) -> Dict[str, Any]:
+    return asyncio.run(_drive(*job))
+
+
+def run(workers: int, args, payloads, batches) -> Dict[str, Any]:
+    server = start_server(workers, args.port, args.pool_workers)
+    try:
+        url = f"http://127.0.0.1:{args.port}"
+        jobs = [(url, payloads[n::args.clients], batches, args.batch_share, args.concurrency, args.warmup,
+                 args.duration, n) for n in range(args.clients)]
+        with multiprocessing.get_context("spawn").Pool(args.clients) as clients:
+            parts = clients.map(_client, jobs)
+        worker_pids = children(server.pid)
+        worker_memory = [m for m in map(memory, worker_pids) if m]
+    finally:
+        stop_server(server)
+
+    latencies = sorted(t for part in parts for t in part["latencies"])
+    requests = sum(part["requests"] for part in parts)
+    result = {
+        "workers": workers,
+        "requests": requests,
+        "req_per_s": round(requests / args.duration, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        "p99_ms": round(latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000, 2) if latencies else None,
+        "busy_503": sum(part["busy"] for part in parts),
+        "errors": sum(part["errors"] for part in parts),
+    }
+    if worker_memory:
+        result["worker_memory"] = {key: round(sum(m[key] for m in worker_memory) / len(worker_memory), 1)
+                                   for key in worker_memory[0]}
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--pool-workers", type=int, default=0, help="FEED_POOL_WORKERS for every server")
+    parser.add_argument("--port", type=int, default=8130)
+    parser.add_argument("--clients", type=int, default=max((os.cpu_count() or 2) // 2, 1),
+                        help="load-generating processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight per client")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--batch-share", type=float, default=0.0, help="share of requests sent to /recommend/batch")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    payloads = workload(args.queries, seed=args.seed)
+    batches = [payloads[i:i + args.batch_size] for i in range(0, min(len(payloads), 50 * args.batch_size),
+                                                              args.batch_size)] if args.batch_share > 0 else []
+    results = []
+    for workers in args.workers:
+        results.append(run(workers, args, payloads, batches))
+        results[-1]["speedup"] = round(results[-1]["req_per_s"] / results[0]["req_per_s"], 2) \
+            if results[0]["req_per_s"] else None
+        print(json.dumps(results[-1]), file=sys.stderr)
+    report = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+              "config": {k: v for k, v in vars(args).items() if k != "output"}, "results": results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
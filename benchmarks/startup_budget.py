@@ -0,0 +1,102 @@
+"""Cold-start budget check for the API.
+
+Each measurement runs in a fresh interpreter:
+
+    python benchmarks/startup_budget.py              # compile the knowledge base at start-up
+    python benchmarks/startup_budget.py --snapshot   # load a precompiled snapshot (FEED_KB_SNAPSHOT)
+
+Exits with status 1 when any budget is exceeded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Milliseconds, generous enough for a small cloud VM
+BUDGETS = {
+    "import_crisp_engine_ms": 150,
+    "first_match_ms": 20,
+    "import_app_main_ms": 2000,
+    "first_request_ms": 100,
+}
+# Without a snapshot the knowledge-base files are also parsed and validated at start-up
+COMPILE_BUDGETS = dict(BUDGETS, import_crisp_engine_ms=400)
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.crisp_engine as crisp
+from app.compiled_kb import get_knowledge_base
+get_knowledge_base()
+t1 = time.perf_counter()
+crisp.match_rules({"Type": "Layer", "Age_Weeks": 30.0, "EggProduction": "45%", "FeedCost": None, "Health": None})
+t2 = time.perf_counter()
+import app.main
+t3 = time.perf_counter()
+numpy_loaded = "numpy" in sys.modules
+from fastapi.testclient import TestClient
+client = TestClient(app.main.app)
+t4 = time.perf_counter()
+response = client.post("/recommend", json={"Type": "Layer", "Age_Weeks": 30})
+t5 = time.perf_counter()
+assert response.status_code == 200, response.text
+print(json.dumps({
+    "import_crisp_engine_ms": (t1 - t0) * 1e3,
+    "first_match_ms": (t2 - t1) * 1e3,
+    "import_app_main_ms": (t3 - t0) * 1e3,
+    "first_request_ms": (t5 - t4) * 1e3,
+    "numpy_loaded_at_startup": numpy_loaded,
+}))
+"""
+
+
+def measure(env: dict, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    # Median of each timing; cold starts are noisy
+    result = {}
+    for key in samples[0]:
+        values = sorted(s[key] for s in samples)
+        result[key] = values[len(values) // 2]
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snapshot", action="store_true", help="start from a precompiled snapshot")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    if args.snapshot:
+        snapshot = os.path.join(tempfile.mkdtemp(), "kb_snapshot.pkl")
+        subprocess.run([sys.executable, "-m", "app.compiled_kb", snapshot], cwd=ROOT, env=env,
+                       check=True, capture_output=True)
+        env["FEED_KB_SNAPSHOT"] = snapshot
+
+    budgets = BUDGETS if args.snapshot else COMPILE_BUDGETS
+    result = measure(env, args.runs)
+    failures = [key for key, budget in budgets.items() if result[key] > budget]
+    if result["numpy_loaded_at_startup"]:
+        failures.append("numpy_loaded_at_startup")
+
+    report = {"mode": "snapshot" if args.snapshot else "compile", "results": result,
+              "budgets": budgets, "failures": failures}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
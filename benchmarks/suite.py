@@ -0,0 +1,356 @@
+"""Benchmark suite: crisp engine, fuzzy rule bases, recipe lookup and /recommend.
+
+For every knowledge-base size a synthetic release (benchmarks/synthetic.py) is
+written to a temporary directory, loaded through the real loader and timed on
+one Zipf-skewed workload:
+
+    kb.compile                load, validate and compile the release
+    crisp.apply_rules         reference scan over every rule (--reference-queries)
+    crisp.match               RuleIndex.match, one query at a time
+    crisp.evaluate_records    column-wise batches of --batch-size rows
+    fuzzy.<base>.recommend    scalar reference, one bird at a time
+    fuzzy.<base>.evaluate     vectorized, --batch-size birds per call
+    recipe.lookup             CompiledKnowledgeBase.get_recipe
+    recipe.figures            RecipeMatrix.figures, the full per-recipe response
+    recipe.recipe_figures     one recipe in plain Python, as /recommend reports it
+    recipe.evaluate           its one NumPy product on its own
+    http.recommend            POST /recommend through TestClient, cache included
+
+Each entry reports throughput, p50/p99 latency per call and the peak traced
+memory of a sample of calls. Every fast path is also checked against its
+reference on the first --reference-queries queries ("mismatches"), so the exit
+status is non-zero when a faster path changes an answer.
+
+    python benchmarks/suite.py --rules 10 1000 10000 --output bench.json
+    python benchmarks/suite.py --rules 100000 --paths crisp --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, Any, Callable, List, Optional, Sequence
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import synthetic_sections, workload, write_kb  # noqa: E402
+from app.compiled_kb import CompiledKnowledgeBase  # noqa: E402
+from app.crisp_engine import apply_rules  # noqa: E402
+from app.data_models import FeedQuery  # noqa: E402
+from app.kb_loader import load_knowledge_base, name_key  # noqa: E402
+
+PATHS = ("crisp", "fuzzy", "recipe", "http")
+MEMORY_SAMPLE = 200  # calls traced for peak memory; tracing slows calls, so timing runs untraced
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(path: str, calls: Sequence[Any], fn: Callable[[Any], Any], rows_per_call: int = 1,
+            memory_sample: int = MEMORY_SAMPLE) -> Dict[str, Any]:
+    """Time fn(call) for every call, then trace memory over a sample of them"""
+    latencies = []
+    clock = time.perf_counter
+    for call in calls:
+        t = clock()
+        fn(call)
+        latencies.append(clock() - t)
+    total = sum(latencies)
+    latencies.sort()
+
+    tracemalloc.start()
+    for call in calls[:memory_sample]:
+        fn(call)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rows = len(calls) * rows_per_call
+    return {
+        "path": path,
+        "calls": len(calls),
+        "rows": rows,
+        "seconds": round(total, 4),
+        "throughput_per_s": round(rows / total, 1) if total else None,
+        "p50_us": round(_percentile(latencies, 0.5) * 1e6, 1),
+        "p99_us": round(_percentile(latencies, 0.99) * 1e6, 1),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def _chunks(items: list, size: int) -> List[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def reference_recipe(frames: Dict[str, Any], feed_type: Optional[str]) -> Dict[str, Any]:
+    """Recipe scan in the order CompiledKnowledgeBase documents: Target_Type first, then Feeds"""
+    if not feed_type:
+        return {}
+    key = name_key(feed_type)
+    for recipe in frames.values():
+        if name_key(recipe["Target_Type"]) == key:
+            return recipe
+    for recipe in frames.values():
+        if any(name_key(feed) == key for feed in recipe.get("Feeds", ())):
+            return recipe
+    return {}
+
+
+def reference_figures(source, prices: Dict[str, float]) -> Dict[str, tuple]:
+    """CP%, Ca% and cost per kg of every recipe, summed ingredient by ingredient from the frames"""
+    names = {name_key(alias): name for name, frame in source.INGREDIENT_FRAMES.items()
+             for alias in [name] + list(frame.get("Aliases", ()))}
+    out = {}
+    for recipe_name, recipe in source.RECIPE_FRAMES.items():
+        total = sum(recipe["Ingredients"].values())
+        cp = ca = cost = 0.0
+        for ingredient, kg in recipe["Ingredients"].items():
+            name = names[name_key(ingredient)]
+            frame = source.INGREDIENT_FRAMES[name]
+            cp += kg / total * frame.get("CP%", 0.0)
+            ca += kg / total * frame.get("Ca%", 0.0)
+            cost += kg / total * prices[name]
+        out[recipe_name] = (cp, ca, cost)
+    return out
+
+
+def first_recommend(recommendations: List[Dict[str, Any]]) -> Optional[str]:
+    return next((rec["Recommend"] for rec in recommendations if "Recommend" in rec), None)
+
+
+def crisp_paths(kb: CompiledKnowledgeBase, facts: List[dict], queries: List[FeedQuery], args) -> List[dict]:
+    from app.batch import evaluate_records
+
+    reference = facts[:args.reference_queries]
+    expected = [apply_rules(f, kb.rules) for f in reference]
+    results = [measure("crisp.apply_rules", reference, lambda f: apply_rules(f, kb.rules))]
+
+    entry = measure("crisp.match", facts, kb.rule_index.match)
+    entry["mismatches"] = sum(kb.rule_index.match(f) != e for f, e in zip(reference, expected))
+    results.append(entry)
+
+    records = [query.record() for query in queries]
+    batches = _chunks(records, args.batch_size)
+    entry = measure("crisp.evaluate_records", batches,
+                    lambda batch: evaluate_records(batch, kb.rule_index, kb.get_recipe), args.batch_size)
+    entry["rows"] = len(records)
+    batch = evaluate_records(records[:len(reference)], kb.rule_index, kb.get_recipe)
+    entry["mismatches"] = sum(r["recommendations"] != e or r["recipe"] != kb.get_recipe(first_recommend(e) or "")
+                              for r, e in zip(batch, expected))
+    results.append(entry)
+    return results
+
+
+def fuzzy_paths(kb: CompiledKnowledgeBase, facts: List[dict], args) -> List[dict]:
+    import numpy as np
+
+    rng = random.Random(args.seed)
+    birds = [{"age": f["Age_Weeks"], "protein": round(rng.uniform(14, 26), 2)} for f in facts]
+    results = []
+    for name, engine in kb.fuzzy_engines.items():
+        results.append(measure(f"fuzzy.{name}.recommend", birds, engine.recommend))
+
+        def vectorized(chunk):
+            return engine.evaluate({"age": np.array([b["age"] for b in chunk]),
+                                    "protein": np.array([b["protein"] for b in chunk])})
+
+        entry = measure(f"fuzzy.{name}.evaluate", _chunks(birds, args.batch_size), vectorized, args.batch_size)
+        entry["rows"] = len(birds)
+        reference = birds[:args.reference_queries]
+        out = vectorized(reference)
+        mismatches = 0
+        for i, bird in enumerate(reference):
+            scalar = engine.recommend(bird, decimals=None)
+            best = int(out["recommended"][i])
+            if "error" in scalar:
+                mismatches += best != -1
+            else:
+                option, score = scalar["recommended"]
+                mismatches += best < 0 or engine.options[best] != option or abs(out["score"][i] - score) > 1e-9
+        entry["mismatches"] = int(mismatches)
+        results.append(entry)
+    return results
+
+
+def recipe_paths(kb: CompiledKnowledgeBase, facts: List[dict], args) -> List[dict]:
+    from app.recipe_matrix import RecipeMatrix
+
+    frames = kb.source.RECIPE_FRAMES
+    feeds = [first_recommend(kb.rule_index.match(f)) or f["Type"] for f in facts]
+    entry = measure("recipe.lookup", feeds, kb.get_recipe)
+    reference = feeds[:args.reference_queries]
+    entry["mismatches"] = sum(kb.get_recipe(feed) != reference_recipe(frames, feed) for feed in reference)
+    results = [entry]
+
+    matrix = RecipeMatrix(kb.source)
+    rng = random.Random(args.seed)
+    base = matrix.price_list()
+    price_sets = [[p * rng.uniform(0.8, 1.25) for p in base] for _ in range(max(args.reference_queries // 10, 5))]
+    results.append(measure("recipe.figures", price_sets, matrix.figures, len(matrix.recipes)))
+    mismatches = 0
+    for prices in price_sets:
+        figures = matrix.figures(prices, decimals=12)
+        for name, (cp, ca, cost) in reference_figures(kb.source, dict(zip(matrix.ingredients, prices))).items():
+            row = figures[name]
+            mismatches += max(abs(row["CP%"] - cp), abs(row["Ca%"] - ca), abs(row["cost_per_kg"] - cost)) > 1e-9
+    results[-1]["mismatches"] = int(mismatches)
+    jobs = [(r, prices) for prices in price_sets for r in range(len(matrix.recipes))]
+    results.append(measure("recipe.recipe_figures", jobs, lambda job: matrix.recipe_figures(*job)))
+    results[-1]["mismatches"] = sum(matrix.recipe_figures(r, prices) != matrix.figures(prices)[matrix.recipes[r]]
+                                    for r, prices in jobs[:args.reference_queries])
+    results.append(measure("recipe.evaluate", [matrix.price_vector(dict(zip(matrix.ingredients, prices)))
+                                               for prices in price_sets], matrix.evaluate, len(matrix.recipes)))
+    return results
+
+
+def http_paths(directory: str, payloads: List[dict], args) -> List[dict]:
+    """End to end through FastAPI, with the process-wide store pointed at the synthetic release"""
+    from fastapi.testclient import TestClient
+    from app.kb_store import STORE
+    from app.main import app, RESPONSE_CACHE
+
+    STORE.directory, STORE.snapshot_path = directory, None
+    STORE.reload()
+    RESPONSE_CACHE.clear()
+    kb = STORE.current
+    payloads = payloads[:args.http_queries]
+    # One client for the whole run: its event-loop portal stays up between requests
+    with TestClient(app) as client:
+        before = RESPONSE_CACHE.stats()
+        entry = measure("http.recommend", payloads, lambda p: client.post("/recommend", json=p))
+        after = RESPONSE_CACHE.stats()
+        hits, misses = after["hits"] - before["hits"], after["misses"] - before["misses"]
+        entry["cache_hit_ratio"] = round(hits / (hits + misses), 3) if hits + misses else None
+
+        mismatches = 0
+        for payload in payloads[:args.reference_queries]:
+            response = client.post("/recommend", json=payload).json()
+            response.pop("recipe_analysis", None)
+            facts = FeedQuery(**payload).dict()
+            recommendations = apply_rules(facts, kb.rules)
+            expected = {"facts": facts, "recommendations": recommendations,
+                        "recipe": reference_recipe(kb.source.RECIPE_FRAMES, first_recommend(recommendations))}
+            mismatches += response != json.loads(json.dumps(expected))
+    entry["mismatches"] = mismatches
+    return [entry]
+
+
+def _report(n: int, entries: List[dict]) -> List[dict]:
+    """Tag entries with the rule count and print one line each as they finish"""
+    for entry in entries:
+        entry["rules"] = n
+        print(f"{n:>7} {entry['path']:<28} {entry['throughput_per_s'] or 0:>14,.1f}/s "
+              f"p50 {entry['p50_us']:>12,.1f}us p99 {entry['p99_us']:>12,.1f}us "
+              f"peak {entry['peak_kb']:>10,.1f}KiB" + (f"  mismatches {entry['mismatches']}" if entry.get("mismatches") else ""),
+              file=sys.stderr)
+    return entries
+
+
+def run(n: int, args) -> List[dict]:
+    payloads = workload(args.queries, args.profiles, args.skew, args.seed)
+    queries = [FeedQuery(**payload) for payload in payloads]
+    facts = [query.dict() for query in queries]
+    with tempfile.TemporaryDirectory(prefix="feed-bench-") as directory:
+        sections = synthetic_sections(n, args.recipes, args.fuzzy_labels, args.seed)
+        write_kb(sections, directory, f"synthetic-{n}")
+        del sections
+
+        def compile_kb(_):
+            return CompiledKnowledgeBase(load_knowledge_base(directory))
+
+        results = _report(n, [measure("kb.compile", [None] * 3, compile_kb, memory_sample=1)])
+        kb = compile_kb(None)
+        if "crisp" in args.paths:
+            results += _report(n, crisp_paths(kb, facts, queries, args))
+        if "fuzzy" in args.paths:
+            results += _report(n, fuzzy_paths(kb, facts, args))
+        if "recipe" in args.paths:
+            results += _report(n, recipe_paths(kb, facts, args))
+        if "http" in args.paths:
+            results += _report(n, http_paths(directory, payloads, args))
+    return results
+
+
+def compare(results: List[dict], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Entries whose p50 grew or throughput fell by more than `tolerance` against the baseline"""
+    before = {(e["rules"], e["path"]): e for e in baseline["results"]}
+    regressions = []
+    for entry in results:
+        old = before.get((entry["rules"], entry["path"]))
+        if old is None:
+            continue
+        p50 = entry["p50_us"] / old["p50_us"] if old["p50_us"] else 1.0
+        throughput = entry["throughput_per_s"] / old["throughput_per_s"] if old["throughput_per_s"] else 1.0
+        entry["baseline"] = {"p50_ratio": round(p50, 3), "throughput_ratio": round(throughput, 3)}
+        if p50 > 1 + tolerance or throughput < 1 - tolerance:
+            regressions.append(f"{entry['rules']} {entry['path']}: p50 x{p50:.2f}, throughput x{throughput:.2f}")
+    return regressions
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 1000, 10000],
+                        help="knowledge-base sizes to run (up to 100000)")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--reference-queries", type=int, default=200,
+                        help="queries timed on the reference scan and used for the differential checks")
+    parser.add_argument("--http-queries", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--profiles", type=int, default=2000, help="distinct flocks in the workload")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of flock popularity")
+    parser.add_argument("--recipes", type=int, default=50)
+    parser.add_argument("--fuzzy-labels", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative slowdown reported as a regression with --compare")
+    args = parser.parse_args(argv)
+
+    results = []
+    for n in args.rules:
+        results += run(n, args)
+    report = {
+        "commit": _commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "tolerance")},
+        "results": results,
+    }
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        report["baseline_commit"] = baseline.get("commit")
+        report["regressions"] = regressions
+    mismatches = sum(entry.get("mismatches", 0) for entry in results)
+    report["mismatches"] = mismatches
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    for line in regressions:
+        print(f"regression: {line}", file=sys.stderr)
+    return 1 if mismatches or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Synthetic knowledge bases and query workloads for the benchmark suite.
+
+synthetic_sections() scales RULES, RECIPE_FRAMES and FUZZY_SETS/FUZZY_RULES up
+from the shipped knowledge base, keeping every other section. The result
+passes the real schema, so it loads through app.kb_loader like a hand-edited
+release. Rules look like hand-written ones: canonical Types, Age_Weeks bounds
+on a half-week grid inside each type's life span, and "<x%" production
+thresholds on layers.
+
+workload() draws API payloads from a pool of flock profiles with Zipf-skewed
+popularity. A few hundred flocks make most of the traffic, as in production,
+and payloads use every accepted spelling ("72%", "72", 72.5, aliases).
+
+    python benchmarks/synthetic.py --rules 10000 --output /tmp/kb-10k
+"""
+import argparse
+import copy
+import itertools
+import json
+import os
+import random
+import sys
+from typing import Dict, Any, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.kb_loader import load_knowledge_base  # noqa: E402
+
+# Flock type -> (youngest, oldest) age in weeks that rules and flocks use
+LIFE_SPANS = {
+    "Chick": (0, 8),
+    "Grower": (8, 20),
+    "Layer": (18, 80),
+    "Broiler Starter": (0, 2),
+    "Broiler Grower": (1.5, 4.5),
+    "Broiler Finisher": (4, 8),
+}
+# Share of the flocks of each type in the workload
+TYPE_WEIGHTS = {"Chick": 0.15, "Grower": 0.2, "Layer": 0.35, "Broiler Starter": 0.1,
+                "Broiler Grower": 0.1, "Broiler Finisher": 0.1}
+# Other spellings the API accepts for each type
+TYPE_SPELLINGS = {"Grower": ["Pullets / Growers", "growers"], "Layer": ["layers", "LAYER"],
+                  "Broiler Starter": ["Broiler_starter"], "Chick": ["chicks"]}
+
+
+def _half(x: float) -> float:
+    return round(x * 2) / 2
+
+
+def synthetic_rules(n: int, feeds: int, rng: random.Random) -> List[Dict[str, Any]]:
+    types = list(LIFE_SPANS)
+    rules = []
+    for i in range(n):
+        roll = rng.random()
+        if roll < 0.02:
+            # General rules, as R_emergency_filler and R_Water_Requirement
+            conditions = rng.choice([{"Any": True}, {"FeedCost": rng.choice(["High", "Low"])},
+                                     {"Health": "Sick"}])
+        else:
+            flock_type = rng.choice(types)
+            young, old = LIFE_SPANS[flock_type]
+            lo = _half(rng.uniform(young, old))
+            hi = min(old, lo + rng.choice([0.5, 1, 2, 4, 8, 20]))
+            conditions = {"Type": flock_type, "Age_Weeks": [lo, hi]}
+            if flock_type == "Layer" and rng.random() < 0.4:
+                conditions["EggProduction"] = f"<{rng.randrange(30, 90, 5)}%"
+            if rng.random() < 0.15:
+                conditions["FeedCost"] = rng.choice(["High", "Low"])
+            if rng.random() < 0.1:
+                conditions["Health"] = rng.choice(["Sick", "Healthy"])
+        if rng.random() < 0.7:
+            low = rng.randrange(14, 23)
+            then = {"Recommend": f"Synthetic Feed {rng.randrange(feeds)}", "DCP": f"{low}-{low + 2}%",
+                    "Advice": f"Synthetic advice {i}"}
+        else:
+            then = {rng.choice(["Warning", "Reminder", "Advice"]): f"Synthetic note {i}"}
+        rule = {"name": f"S_{i:06d}", "if": conditions, "then": then}
+        if rng.random() < 0.1:
+            rule["priority"] = rng.randint(1, 3)
+        rules.append(rule)
+    return rules
+
+
+def synthetic_recipes(n: int, ingredients: List[str], rng: random.Random) -> Dict[str, Any]:
+    recipes = {}
+    for k in range(n):
+        low = rng.randrange(14, 23)
+        recipes[f"Synthetic Recipe {k}"] = {
+            "Target_Type": rng.choice(list(LIFE_SPANS)),
+            "Target_DCP": f"{low}-{low + 2}%",
+            "Feeds": [f"Synthetic Feed {k}"],
+            "Ingredients": {name: round(rng.uniform(0.5, 40), 1)
+                            for name in rng.sample(ingredients, rng.randint(3, min(7, len(ingredients))))},
+        }
+    return recipes
+
+
+def _triangles(labels: int, lo: float, hi: float, prefix: str) -> Dict[str, List[float]]:
+    step = (hi - lo) / max(labels - 1, 1)
+    return {f"{prefix}{i}": [round(lo + (i - 1) * step, 3), round(lo + i * step, 3), round(lo + (i + 1) * step, 3)]
+            for i in range(labels)}
+
+
+def synthetic_fuzzy(labels: int, feeds: int, rng: random.Random):
+    """Two input groups of `labels` triangles each and a rule base over them"""
+    sets = {"Synthetic_Age": _triangles(labels, 0, 80, "A"),
+            "Synthetic_Protein": _triangles(labels, 10, 26, "P")}
+    rules = [{"if": {"age": f"A{i}", "protein": f"P{(i * 7) % labels}"},
+              "then": f"Synthetic Feed {i % feeds}", "base": round(rng.uniform(0.3, 0.7), 2),
+              "gain": round(rng.uniform(0.2, 0.5), 2), "suitability": rng.choice(["Low", "Medium", "High"])}
+             for i in range(labels)]
+    rules += [{"if": {"age": f"A{i}"}, "then": f"Synthetic Feed {(i + 1) % feeds}", "base": 0.4, "gain": 0.3,
+               "suitability": "Medium"} for i in range(labels)]
+    spec = {"inputs": {"age": "Synthetic_Age", "protein": "Synthetic_Protein"}, "defaults": {"protein": 20.0},
+            "output": "Suitability", "rules": rules,
+            "adjustments": [{"if": {"protein": "P0"}, "offset": -0.2, "suitability": "Low"}]}
+    return sets, spec
+
+
+def synthetic_sections(rules: int = 1000, recipes: int = 50, fuzzy_labels: int = 20,
+                       seed: int = 0) -> Dict[str, Any]:
+    """Knowledge-base sections with synthetic RULES, extra recipes and a "Synthetic" fuzzy rule base"""
+    rng = random.Random(seed)
+    sections = copy.deepcopy(load_knowledge_base().sections)
+    recipes = max(recipes, 1)
+    sections["RULES"] = synthetic_rules(rules, recipes, rng)
+    sections["RECIPE_FRAMES"].update(synthetic_recipes(recipes, list(sections["INGREDIENT_FRAMES"]), rng))
+    fuzzy_sets, fuzzy_spec = synthetic_fuzzy(max(fuzzy_labels, 2), recipes, rng)
+    sections["FUZZY_SETS"].update(fuzzy_sets)
+    sections["FUZZY_RULES"]["Synthetic"] = fuzzy_spec
+    return sections
+
+
+def write_kb(sections: Dict[str, Any], directory: str, version: str = "synthetic") -> str:
+    """Write sections as a knowledge-base directory (JSON files) that FEED_KB_DIR can point at"""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith((".yaml", ".yml", ".json")):
+            os.unlink(os.path.join(directory, name))
+    with open(os.path.join(directory, "manifest.yaml"), "w") as f:
+        f.write(f'version: "{version}"\n')
+    with open(os.path.join(directory, "sections.json"), "w") as f:
+        json.dump(sections, f)  # tuples (ranges, fuzzy sets) become lists, as in YAML
+    return directory
+
+
+def flock_profiles(n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """Distinct flocks: type, age, and the optional facts their owners tend to report"""
+    types, weights = list(TYPE_WEIGHTS), list(TYPE_WEIGHTS.values())
+    profiles = []
+    for _ in range(n):
+        flock_type = rng.choices(types, weights)[0]
+        young, old = LIFE_SPANS[flock_type]
+        profile = {"Type": flock_type, "Age_Weeks": round(rng.uniform(young, old), 1)}
+        if flock_type == "Layer" and rng.random() < 0.7:
+            profile["EggProduction"] = round(min(max(rng.gauss(70, 15), 0), 100), 1)
+        if rng.random() < 0.2:
+            profile["FeedCost"] = rng.choice(["High", "Low"])
+        if rng.random() < 0.05:
+            profile["Health"] = "Sick"
+        profiles.append(profile)
+    return profiles
+
+
+def _spelled(profile: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    payload = dict(profile)
+    if rng.random() < 0.05 and profile["Type"] in TYPE_SPELLINGS:
+        payload["Type"] = rng.choice(TYPE_SPELLINGS[profile["Type"]])
+    if "EggProduction" in payload:
+        value = payload["EggProduction"]
+        payload["EggProduction"] = rng.choice([f"{value:g}%", f"{value:g}", value])
+    if "FeedCost" in payload and rng.random() < 0.1:
+        payload["FeedCost"] = payload["FeedCost"].lower()
+    return payload
+
+
+def workload(n: int, profiles: int = 2000, skew: float = 1.1, seed: int = 0) -> List[Dict[str, Any]]:
+    """n /recommend payloads; profile k is picked with weight 1 / k**skew"""
+    rng = random.Random(seed)
+    pool = flock_profiles(profiles, rng)
+    cumulative = list(itertools.accumulate(1 / (k + 1) ** skew for k in range(len(pool))))
+    return [_spelled(profile, rng) for profile in rng.choices(pool, cum_weights=cumulative, k=n)]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Write a synthetic knowledge-base directory")
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--recipes", type=int, default=50)
+    parser.add_argument("--fuzzy-labels", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True, help="directory to write (FEED_KB_DIR)")
+    args = parser.parse_args(argv)
+    sections = synthetic_sections(args.rules, args.recipes, args.fuzzy_labels, args.seed)
+    write_kb(sections, args.output, f"synthetic-{args.rules}")
+    print(f"Wrote {len(sections['RULES'])} rules and {len(sections['RECIPE_FRAMES'])} recipes to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
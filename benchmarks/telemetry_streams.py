@@ -0,0 +1,97 @@
+"""Many concurrent flock streams against /ws/telemetry on one running server.
+
+Each connection reports on its share of the flocks: first the full facts, then
+random deltas (mostly small egg-production and age drifts, as a sensor feed
+would send). Reports deltas sent, updates pushed back and the share of deltas
+that changed nothing visible.
+
+    uvicorn app.main:app --port 8000 &
+    python benchmarks/telemetry_streams.py --url ws://127.0.0.1:8000/ws/telemetry --flocks 5000
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import websockets
+
+TYPES = ["Chick", "Grower", "Layer", "Broiler Starter", "Broiler Grower", "Broiler Finisher"]
+
+
+def first_facts(rng: random.Random) -> dict:
+    return {"Type": rng.choice(TYPES), "Age_Weeks": rng.randint(0, 70), "EggProduction": f"{rng.randint(30, 95)}%"}
+
+
+def delta(rng: random.Random, facts: dict) -> dict:
+    roll = rng.random()
+    if roll < 0.6:
+        production = float(facts["EggProduction"].rstrip("%")) + rng.uniform(-2, 2)
+        facts["EggProduction"] = f"{min(max(production, 0), 100):.1f}%"
+        return {"EggProduction": facts["EggProduction"]}
+    if roll < 0.9:
+        facts["Age_Weeks"] = round(facts["Age_Weeks"] + rng.uniform(0, 0.5), 2)
+        return {"Age_Weeks": facts["Age_Weeks"]}
+    if roll < 0.95:
+        return {"Health": rng.choice([None, "Sick"])}
+    return {"FeedCost": rng.choice([None, "High", "Low"])}
+
+
+async def connection(url: str, flocks: list, steps: int, frame: int, seed: int, stats: dict) -> None:
+    rng = random.Random(seed)
+    async with websockets.connect(url, max_size=None) as ws:
+        async def reader():
+            async for text in ws:
+                for update in json.loads(text)["updates"]:
+                    if update.get("flock") == done:
+                        return
+                    stats["errors" if "error" in update else "updates"] += 1
+
+        done = f"done-{seed}"  # a new flock always gets an update, and it is queued after all the others
+        task = asyncio.create_task(reader())
+        facts = {flock: first_facts(rng) for flock in flocks}
+        messages = [{"flock": flock, "facts": dict(f)} for flock, f in facts.items()]
+        messages += [{"flock": flock, "facts": delta(rng, facts[flock])}
+                     for _ in range(steps) for flock in rng.sample(flocks, len(flocks))]
+        messages.append({"flock": done, "facts": first_facts(rng)})
+        for i in range(0, len(messages), frame):
+            await ws.send(json.dumps(messages[i:i + frame]))
+            stats["sent"] += len(messages[i:i + frame])
+        await task
+
+
+async def run(args) -> dict:
+    stats = {"sent": 0, "updates": 0, "errors": 0}
+    flocks = [f"flock-{i}" for i in range(args.flocks)]
+    per = -(-len(flocks) // args.connections)
+    t = time.perf_counter()
+    await asyncio.gather(*(connection(args.url, flocks[i * per:(i + 1) * per], args.steps, args.frame, i, stats)
+                           for i in range(args.connections)))
+    elapsed = time.perf_counter() - t
+    return {
+        "flocks": args.flocks,
+        "connections": args.connections,
+        "deltas_sent": stats["sent"],
+        "deltas_per_s": round(stats["sent"] / elapsed),
+        "updates_pushed": stats["updates"],
+        "suppressed": round(1 - stats["updates"] / stats["sent"], 3),
+        "errors": stats["errors"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws/telemetry")
+    parser.add_argument("--flocks", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=20, help="deltas per flock after the first facts")
+    parser.add_argument("--frame", type=int, default=100, help="messages per WebSocket frame")
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())